@@ -1,9 +1,19 @@
+# Azure Functions entry point: HttpTrigger1/function.json routes every path
+# here (scriptFile ../__init__.py, entryPoint main), and main() serves
+# app_main.app through the ASGI adapter in azure_asgi.py. Only the adapter
+# is imported when the worker loads the function; the app, its models and
+# the artifact bundle load on the first invocation.
 import os
+import sys
 
-if "PYTEST_CURRENT_TEST" not in os.environ:
-    try:
-        import azure.functions as func
-    except ModuleNotFoundError:
-        func = None
-else:
-    func = None
+_APP_DIR = os.path.dirname(os.path.abspath(__file__))
+if _APP_DIR not in sys.path:
+    sys.path.insert(0, _APP_DIR)
+
+from azure_asgi import AsgiFunction  # noqa: E402
+
+_function = AsgiFunction()
+
+
+async def main(req, context=None):
+    return await _function(req, context)
@@ -0,0 +1,264 @@
+# admission.py
+
+import contextvars
+import heapq
+import hmac
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from typing import Collection, Deque, Dict, List, Optional, Tuple
+
+from metrics import REGISTRY
+
+RATE_LIMITED = REGISTRY.counter("admission_rate_limited_total", "Requests rejected with 429 by the per-client token bucket")
+RATE_LIMIT = REGISTRY.gauge("admission_rate_per_second", "Configured per-client token refill rate (requests/s)")
+BURST_LIMIT = REGISTRY.gauge("admission_burst", "Configured per-client token bucket size")
+
+# who the current request is for; set once per request, read by MatchPool
+current_client: contextvars.ContextVar[str] = contextvars.ContextVar("current_client", default="anonymous")
+
+# scheduling classes, highest priority first
+PRIORITY_CLASSES = ("interactive", "batch")
+current_priority: contextvars.ContextVar[str] = contextvars.ContextVar("current_priority", default="interactive")
+
+
+def _parse_weights(spec: str) -> Dict[str, float]:
+    """"key=weight,key2=weight" -> dict; malformed pairs are ignored."""
+    out: Dict[str, float] = {}
+    for part in (spec or "").split(","):
+        key, _, weight = part.partition("=")
+        try:
+            if key.strip() and float(weight) > 0:
+                out[key.strip()] = float(weight)
+        except ValueError:
+            pass
+    return out
+
+
+class RateLimiter:
+    """
+    One token bucket per client: `burst` requests at once, refilled at
+    `rate` per second. A rate of 0 disables limiting. Idle, refilled buckets
+    are dropped once more than `max_clients` are tracked.
+    """
+
+    def __init__(self, rate: float, burst: float, max_clients: int = 10000):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.max_clients = max_clients
+        self._buckets: Dict[str, Tuple[float, float]] = {}     # client -> (tokens, updated)
+        self._lock = threading.Lock()
+        RATE_LIMIT.set(rate)
+        BURST_LIMIT.set(self.burst)
+
+    def acquire(self, client: str, cost: float = 1.0) -> float:
+        """Take `cost` tokens; returns 0 on success, else seconds until they are available."""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= cost:
+                self._buckets[client] = (tokens - cost, now)
+                if len(self._buckets) > self.max_clients:
+                    self._prune(now)
+                return 0.0
+            self._buckets[client] = (tokens, now)
+        RATE_LIMITED.inc()
+        return (cost - tokens) / self.rate
+
+    def _prune(self, now: float) -> None:
+        full = [c for c, (t, u) in self._buckets.items() if t + (now - u) * self.rate >= self.burst]
+        for c in full:
+            del self._buckets[c]
+
+
+class FairQueue:
+    """
+    Weighted fair queue of waiters (start-time fair queuing). Each push gets
+    a virtual finish tag max(vtime, client's last tag) + cost / weight and
+    pop serves the smallest tag, so clients share the workers in proportion
+    to their weight however many requests each has queued.
+    """
+
+    def __init__(self, weights: Optional[Dict[str, float]] = None, default_weight: float = 1.0):
+        self.weights = weights or {}
+        self.default_weight = default_weight
+        self._heap: List[list] = []            # [finish, seq, start, client, fut, alive]
+        self._entries: Dict[object, list] = {}
+        self._last_finish: Dict[str, float] = {}
+        self._counts: Dict[str, int] = {}
+        self._vtime = 0.0
+        self._seq = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, fut) -> bool:
+        return fut in self._entries
+
+    def count(self, client: str) -> int:
+        return self._counts.get(client, 0)
+
+    @property
+    def clients(self) -> int:
+        return len(self._counts)
+
+    def push(self, client: str, fut, cost: float = 1.0) -> None:
+        weight = self.weights.get(client, self.default_weight)
+        start = max(self._vtime, self._last_finish.get(client, 0.0))
+        finish = start + cost / weight
+        self._last_finish[client] = finish
+        entry = [finish, next(self._seq), start, client, fut, True]
+        heapq.heappush(self._heap, entry)
+        self._entries[fut] = entry
+        self._counts[client] = self._counts.get(client, 0) + 1
+
+    def _forget(self, entry: list) -> None:
+        entry[5] = False
+        del self._entries[entry[4]]
+        client = entry[3]
+        self._counts[client] -= 1
+        if not self._counts[client]:
+            del self._counts[client]
+            if self._last_finish.get(client, 0.0) <= self._vtime:
+                self._last_finish.pop(client, None)
+
+    def remove(self, fut) -> None:
+        entry = self._entries.get(fut)
+        if entry is not None:
+            self._forget(entry)
+
+    def pop(self):
+        """Next waiter's future in fair order, or None when empty."""
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            if entry[5]:
+                self._vtime = max(self._vtime, entry[2])
+                self._forget(entry)
+                return entry[4]
+        return None
+
+
+class PriorityQueue:
+    """
+    One FairQueue per priority class. pop() serves the highest class with
+    waiters, except that a class's oldest waiter gains one class of priority
+    for every `aging_seconds` it has waited, so batch work is never starved
+    by a steady stream of interactive calls.
+    """
+
+    def __init__(self, weights: Optional[Dict[str, float]] = None, aging_seconds: float = 10.0):
+        self.aging_seconds = max(1e-3, aging_seconds)
+        self._queues = {c: FairQueue(weights) for c in PRIORITY_CLASSES}
+        self._arrivals: Dict[str, Deque[Tuple[float, object]]] = {c: deque() for c in PRIORITY_CLASSES}
+        self._class_of: Dict[object, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._class_of)
+
+    def __contains__(self, fut) -> bool:
+        return fut in self._class_of
+
+    def count(self, client: str) -> int:
+        return sum(q.count(client) for q in self._queues.values())
+
+    def depth(self, cls: str) -> int:
+        return len(self._queues[cls])
+
+    @property
+    def clients(self) -> int:
+        return sum(q.clients for q in self._queues.values())
+
+    def push(self, client: str, fut, cls: str = "interactive", cost: float = 1.0) -> None:
+        cls = cls if cls in self._queues else PRIORITY_CLASSES[0]
+        self._queues[cls].push(client, fut, cost)
+        self._arrivals[cls].append((time.monotonic(), fut))
+        self._class_of[fut] = cls
+
+    def remove(self, fut) -> None:
+        cls = self._class_of.pop(fut, None)
+        if cls is not None:
+            self._queues[cls].remove(fut)
+
+    def _oldest(self, cls: str) -> Optional[float]:
+        arrivals = self._arrivals[cls]
+        while arrivals and arrivals[0][1] not in self._queues[cls]:
+            arrivals.popleft()
+        return arrivals[0][0] if arrivals else None
+
+    def pop(self, allowed: Optional[Collection[str]] = None) -> Optional[Tuple[object, str]]:
+        """(future, class) of the next waiter among `allowed` classes, or None."""
+        now = time.monotonic()
+        best: Optional[Tuple[float, str]] = None
+        for rank, cls in enumerate(PRIORITY_CLASSES):
+            if allowed is not None and cls not in allowed:
+                continue
+            oldest = self._oldest(cls)
+            if oldest is None:
+                continue
+            effective = rank - (now - oldest) / self.aging_seconds
+            if best is None or effective < best[0]:
+                best = (effective, cls)
+        if best is None:
+            return None
+        fut = self._queues[best[1]].pop()
+        self._class_of.pop(fut, None)
+        return fut, best[1]
+
+
+def known_api_keys() -> List[str]:
+    """API_KEYS ("key1,key2") plus every key named in CLIENT_WEIGHTS ("key:<key>=w")."""
+    keys = [k.strip() for k in os.getenv("API_KEYS", "").split(",") if k.strip()]
+    keys += [k[len("key:"):] for k in client_weights() if k.startswith("key:")]
+    return keys
+
+
+def client_ip(headers, client_host: Optional[str]) -> str:
+    """
+    The caller's address. Behind TRUSTED_PROXY_HOPS reverse proxies (e.g. 1
+    on Render) that each append to X-Forwarded-For, it is that many entries
+    from the right of the header; entries further left are client-supplied
+    and ignored. With the default of 0 the header is not read at all.
+    """
+    hops = int(os.getenv("TRUSTED_PROXY_HOPS", "0") or 0)
+    if hops > 0:
+        forwarded = [h.strip() for h in (headers.get("x-forwarded-for") or "").split(",") if h.strip()]
+        if forwarded:
+            return forwarded[-min(hops, len(forwarded))]
+    return client_host or "unknown"
+
+
+def client_key(headers, client_host: Optional[str]) -> str:
+    """
+    A configured API key when the caller sends one (X-API-Key), else its IP
+    address (see client_ip). Unknown keys are treated as no key, so a caller
+    cannot get a fresh token bucket, or another client's fair-queue weight,
+    by making one up.
+    """
+    api_key = headers.get("x-api-key")
+    if api_key and any(hmac.compare_digest(api_key.encode(), k.encode()) for k in known_api_keys()):
+        return f"key:{api_key}"
+    return f"ip:{client_ip(headers, client_host)}"
+
+
+@lru_cache(maxsize=1)
+def get_rate_limiter() -> RateLimiter:
+    """
+    Process-wide limiter configured from the environment:
+      CLIENT_RATE_PER_MIN   model-bound requests per client per minute (default 60, 0 = off)
+      CLIENT_BURST          requests a client may send at once (default 10)
+    """
+    return RateLimiter(
+        rate=float(os.getenv("CLIENT_RATE_PER_MIN", "60")) / 60.0,
+        burst=float(os.getenv("CLIENT_BURST", "10")),
+    )
+
+
+def client_weights() -> Dict[str, float]:
+    """CLIENT_WEIGHTS, e.g. "key:recruiter-ui=4,key:bulk-sync=0.5" (default weight 1)."""
+    return _parse_weights(os.getenv("CLIENT_WEIGHTS", ""))
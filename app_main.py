@@ -1,21 +1,78 @@
 from __future__ import annotations
-import io, csv, tempfile, uuid, re
+import asyncio, io, csv, json, logging, math, os, re
+from contextlib import AsyncExitStack, asynccontextmanager
 from pathlib import Path
-from typing import List
+from typing import Iterable, Iterator, List, Optional
 from datetime import date
-from fastapi import FastAPI, UploadFile, File, Request
-from fastapi.responses import HTMLResponse, StreamingResponse
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 
-from matcher import match_resume_to_jds
-from jd_cache import load_or_build_jd_cache, build_jd_cache_from_uploads
+from matcher import LOCATION_SKIPPED, match_uploads, analyze_resume, score_jds, warmup, parse_fields
+from jd_cache import build_jd_cache_from_uploads, default_jd_cache, skills_variant
+from metrics import REGISTRY, PROMETHEUS_CONTENT_TYPE
+from workers import get_pool, PoolSaturated, preload_for_fork
+from result_store import get_result_store
+from uploads import FormError, UploadSession, UploadTooLarge, sweep_spool_dir
+from profiling import profile_requested, run_profiled
+from jobs import JobRunner, TERMINAL, get_job_store
+from admission import client_key, current_client, current_priority, get_rate_limiter
+from cancellation import CancelToken, Cancelled, sweep_markers
+from load_shedding import pick_quality_mode
+from parse_cache import digest
+from singleflight import AsyncSingleFlight
+from cpu_layout import configure as configure_cpu_layout
 
 APP_DIR = Path(__file__).resolve().parent
-UPLOAD_DIR = APP_DIR / "_uploads"
-UPLOAD_DIR.mkdir(exist_ok=True)
+log = logging.getLogger(__name__)
 
-app = FastAPI(title="Resume–JD Matching Plugin")
+JD_COUNT = REGISTRY.histogram(
+    "match_request_jd_count", "JDs matched per resume in a request",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+
+# gunicorn --preload imports this module once in the master; load the shared
+# state there so every forked worker maps the same pages (see gunicorn.conf.py)
+if os.getenv("PRELOAD_MODELS") == "1":
+    preload_for_fork()
+
+# readiness: "warming" until the background warm-up finishes, then "ready" (or "error")
+_readiness = {"status": "warming", "error": None}
+_job_runner: JobRunner | None = None
+
+async def _warm_in_background():
+    try:
+        await get_pool().warm(warmup)
+        _readiness.update(status="ready", error=None)
+        log.info("warm-up finished; ready for traffic")
+    except Exception as e:
+        _readiness.update(status="error", error=str(e))
+        log.exception("warm-up failed")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # bind immediately; models and the JD cache load behind /readyz
+    global _job_runner
+    configure_cpu_layout()      # no-op if gunicorn's post_fork already did it
+    sweep_spool_dir()
+    sweep_markers()
+    if os.getenv("WARM_ON_STARTUP", "1") == "0":
+        # serverless: models load on first use instead of holding up the instance
+        _readiness.update(status="ready", error=None)
+        task = None
+    else:
+        task = asyncio.create_task(_warm_in_background())
+    # picks up jobs left queued/running by a previous process
+    _job_runner = JobRunner(get_job_store(), lambda: get_pool())
+    _job_runner.start()
+    yield
+    if task is not None:
+        task.cancel()
+    await _job_runner.stop()
+    get_pool().shutdown()
+
+app = FastAPI(title="Resume–JD Matching Plugin", lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -24,6 +81,36 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# endpoints that put work on the model pool
+_MODEL_BOUND_PREFIXES = ("/upload", "/download_csv", "/match/", "/jobs")
+# bulk endpoints scheduled behind interactive ones (see MatchPool); not
+# /match/batch, which is how the UI runs a screening; bulk callers of it
+# send X-Priority: batch (or use /jobs)
+_BATCH_PREFIXES = ("/download_csv", "/jobs")
+
+@app.middleware("http")
+async def admission_control(request: Request, call_next):
+    """
+    Tag the request with its client (a known X-API-Key, else IP) for fair queuing in
+    MatchPool and with its priority class, and apply the per-client token
+    bucket to model-bound POSTs. /download_csv and /jobs are always "batch";
+    any caller, e.g. a script driving /match/batch, may also send
+    X-Priority: batch to step aside for the UI.
+    """
+    client = client_key(request.headers, request.client.host if request.client else None)
+    current_client.set(client)
+    batch = request.url.path.startswith(_BATCH_PREFIXES) or request.headers.get("x-priority") == "batch"
+    current_priority.set("batch" if batch else "interactive")
+    if request.method == "POST" and request.url.path.startswith(_MODEL_BOUND_PREFIXES):
+        wait = get_rate_limiter().acquire(client)
+        if wait:
+            return JSONResponse(
+                {"error": "Too many requests for this client, slow down"},
+                status_code=429,
+                headers={"Retry-After": str(max(1, math.ceil(wait))), "Cache-Control": "no-store"},
+            )
+    return await call_next(request)
+
 def _serve_app() -> HTMLResponse:
     return HTMLResponse(
         (APP_DIR / "app.html").read_text(encoding="utf-8"),
@@ -38,10 +125,20 @@ def index():
 def upload_page():
     return _serve_app()
 
-jd_cache_fallback = load_or_build_jd_cache(
-    jd_dir=str(APP_DIR / "Dummy_data" / "JDS"),
-    cache_path=str(APP_DIR / "Dummy_data" / "jd_cache.json"),
-)
+@app.get("/healthz")
+def healthz():
+    """Liveness: the process is up and serving the event loop."""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+def readyz():
+    """Readiness: 200 once models and the JD cache are warm, 503 until then."""
+    ready = _readiness["status"] == "ready"
+    return JSONResponse(dict(_readiness), status_code=200 if ready else 503, headers={"Cache-Control": "no-store"})
+
+@app.get("/metrics")
+def metrics():
+    return Response(REGISTRY.render(), media_type=PROMETHEUS_CONTENT_TYPE)
 
 _DEGREE_WORD_RE = re.compile(
     r"(?i)\b(master|bachelor|b\.?e|b\.?tech|m\.?s|m\.?sc|m\.?tech|bsc|msc|mca|bca|mba|phd|doctor|ms|bs|be|me|mtech|btech)\b"
@@ -76,9 +173,9 @@ def _gaps_html(gaps: List[dict]) -> str:
         )
     return "<ul>" + "".join(items) + "</ul>"
 
-def _table_html(rows_html: str) -> str:
+def _table_html(rows_html: str, match_id: str = "") -> str:
     return f"""
-    <table>
+    <table data-match-id="{match_id}">
       <tr>
         <th>JD File</th><th>Match %</th><th>Resume Location</th><th>JD Location</th>
         <th>Matched Skills</th><th>Missing Skills</th><th>Edu → First Job Gap</th>
@@ -88,6 +185,13 @@ def _table_html(rows_html: str) -> str:
       {rows_html}
     </table>"""
 
+def _skills_text(r: dict, key: str) -> str:
+    # embedding_only rows and rows without the skills group carry no skill
+    # keys; say so rather than leave the cell empty
+    if key not in r:
+        return LOCATION_SKIPPED
+    return ", ".join(r.get(key) or [])
+
 def _build_rows(results: list) -> str:
     rows = []
     for r in results:
@@ -95,10 +199,10 @@ def _build_rows(results: list) -> str:
         <tr>
           <td>{r.get('jd_file','')}</td>
           <td>{r.get('similarity_score_percent','')}%</td>
-          <td>{r.get('resume_location','Not Mentioned')}</td>
-          <td>{r.get('jd_location','Not Mentioned')}</td>
-          <td>{', '.join((r.get('matched_skills', []) or []))}</td>
-          <td>{', '.join((r.get('missing_skills', []) or []))}</td>
+          <td>{r.get('resume_location', LOCATION_SKIPPED)}</td>
+          <td>{r.get('jd_location', LOCATION_SKIPPED)}</td>
+          <td>{_skills_text(r, 'matched_skills')}</td>
+          <td>{_skills_text(r, 'missing_skills')}</td>
           <td>{r.get('education_to_first_job_gap_months','N/A')} months</td>
           <td>{_periods_html(r.get('education_periods') or [])}</td>
           <td>{_periods_html(r.get('experience_periods') or [])}</td>
@@ -107,33 +211,154 @@ def _build_rows(results: list) -> str:
         </tr>""")
     return "".join(rows)
 
-def _safe_save_upload(prefix: str, original_name: str, data: bytes) -> Path:
-    target = UPLOAD_DIR / f"{prefix}-{uuid.uuid4().hex}{Path(original_name).suffix or '.bin'}"
+# ---------- deadlines and cancellation ----------
+
+def _deadline_seconds(request: Request) -> Optional[float]:
+    """X-Deadline-Ms header or ?deadline_ms=, else MATCH_DEADLINE_SECONDS (default 120, 0 = none)."""
+    raw = request.headers.get("x-deadline-ms") or request.query_params.get("deadline_ms")
     try:
-        target.write_bytes(data)
-        return target
-    except PermissionError:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=Path(original_name).suffix or ".bin") as tf:
-            tf.write(data)
-            tf.flush()
-            return Path(tf.name)
-
-# 🔑 FIX: explicitly expect multiple jd_files
+        return int(raw) / 1000.0 if raw else float(os.getenv("MATCH_DEADLINE_SECONDS", "120"))
+    except ValueError:
+        return None
+
+def _allow_partial(request: Request) -> bool:
+    """The caller accepts the rows finished before a deadline/cancel (X-Allow-Partial: 1 or ?partial=1)."""
+    return (request.headers.get("x-allow-partial") or request.query_params.get("partial") or "") in ("1", "true")
+
+@asynccontextmanager
+async def _cancel_scope(request: Request):
+    """
+    A CancelToken carrying this request's deadline, cancelled as soon as
+    the client disconnects; pool workers check it at stage boundaries.
+    """
+    token = CancelToken.after(_deadline_seconds(request))
+
+    async def watch():
+        while not await request.is_disconnected():
+            await asyncio.sleep(0.25)
+        token.cancel()
+
+    watcher = asyncio.create_task(watch())
+    torn_down = False
+    try:
+        yield token
+    except (asyncio.CancelledError, GeneratorExit):
+        torn_down = True        # GeneratorExit: a streamed response closed early
+        token.cancel()          # a worker may still be on it; its marker is swept later
+        raise
+    finally:
+        watcher.cancel()
+        if not torn_down:
+            token.close()
+
+def _cancelled_rows(e: Cancelled, request: Request) -> List[dict]:
+    """Rows to return for a cancelled match, or re-raise if partial results are not wanted."""
+    if e.partial is not None and e.reason == "deadline" and _allow_partial(request):
+        return e.partial
+    raise e
+
+def _cancel_status(e: Cancelled) -> int:
+    return 504 if e.reason == "deadline" else 499    # 499: client closed request
+
+def _quality_mode(request: Request) -> str:
+    """
+    Rung of the quality ladder for this request (see load_shedding): chosen
+    from pool and CPU pressure; X-Quality-Mode may only ask for a cheaper one.
+    """
+    return pick_quality_mode(get_pool(), request.headers.get("x-quality-mode"))
+
+def _requested_fields(request: Request, form_value: str = "") -> frozenset:
+    """Output groups to compute, from the `fields` form field or ?fields= (ValueError if unknown)."""
+    return parse_fields(form_value or request.query_params.get("fields"))
+
+_jd_flights = AsyncSingleFlight()
+
+async def _jd_cache_for(pool, jd_docs, cancel: Optional[CancelToken] = None, fields=None,
+                        mode: str = "full") -> Optional[dict]:
+    """
+    JD cache for uploaded JDs (None if there are none). Concurrent requests
+    uploading the same JD pack, e.g. from a shared requisition link, await
+    one build on the pool instead of each embedding it again. The build runs
+    on the JD bytes, not on any request's spool files, which go away with
+    that request; it is cancelled only once every waiting request has gone.
+    Only what `fields` and the quality `mode` need is computed (JD skills
+    are shed with the resume's), and requests only share a build that
+    computed the same.
+    """
+    if not jd_docs:
+        return None
+    key = "jds:" + digest("".join(f"{u.name}\0{u.sha256}\0" for u in jd_docs)) + ":" + skills_variant(fields, mode)
+    jd_uploads = await asyncio.to_thread(lambda: [(u.name, u.read_bytes()) for u in jd_docs])
+    return await _jd_flights.run(
+        key,
+        lambda shared: pool.run(build_jd_cache_from_uploads, jd_uploads, cancel=shared, fields=fields, mode=mode),
+        cancel=cancel,
+    )
+
+async def _store_results(results: List[dict]) -> str:
+    """Keep a result set exportable via /results/{match_id}.csv (by any worker); returns the match_id."""
+    return await asyncio.to_thread(get_result_store().put, results)
+
 @app.post("/upload", response_class=HTMLResponse)
-async def handle_upload(
-    request: Request,
-    resume: UploadFile = File(...),
-    jd_files: List[UploadFile] = File([]),
-):
+async def handle_upload(request: Request):
+    # multipart form: resume (file) and any number of jd_files, read off the
+    # request stream by UploadSession.ingest_form; `fields` (form field or
+    # ?fields=) limits the columns computed, as for /match/batch
+    # operators can profile a single request: X-Profile-Token (or ?profile=)
+    # set to PROFILE_TOKEN; add X-Profile-Output: inline (or
+    # ?profile_output=inline) to get the summary back instead of the table
+    profile = profile_requested(request.headers, request.query_params)
+    if profile is False:
+        return PlainTextResponse("Invalid profile token", status_code=403, headers={"Cache-Control": "no-store"})
+    partial = prof = None
+    mode = _quality_mode(request)
     try:
-        jd_cache = (
-            build_jd_cache_from_uploads([(f.filename, await f.read()) for f in jd_files])
-            if jd_files else jd_cache_fallback
-        )
-        resume_path = _safe_save_upload("resume", resume.filename, await resume.read())
-        results = match_resume_to_jds(str(resume_path), jd_cache)
+        async with UploadSession() as uploads:
+            form = await uploads.ingest_form(request)
+            try:
+                groups = _requested_fields(request, form.get("fields"))
+            except ValueError as e:
+                return HTMLResponse(f"<pre>{e!s}</pre>", status_code=400, headers={"Cache-Control": "no-store"})
+            jd_docs, doc = form.files("jd_files"), form.file("resume")
+            async with _cancel_scope(request) as token:
+                try:
+                    if profile:
+                        # profiled requests build their JDs on the worker too, so the profile covers them
+                        jd_uploads = [(u.name, u.source) for u in jd_docs]
+                        results, prof = await get_pool().run(
+                            run_profiled, match_uploads, doc.source, doc.name, jd_uploads,
+                            cancel=token, mode=mode, fields=groups)
+                    else:
+                        jd_cache = await _jd_cache_for(get_pool(), jd_docs, token, groups, mode)
+                        results = await get_pool().run(
+                            match_uploads, doc.source, doc.name, None, jd_cache, cancel=token, mode=mode, fields=groups)
+                except Cancelled as e:
+                    results, partial = _cancelled_rows(e, request), e.reason
+        JD_COUNT.observe(len(results))
+        match_id = await _store_results(results)
+        headers = {"Cache-Control": "no-store", "X-Match-Id": match_id, "X-Quality-Mode": mode}
+        if partial:
+            headers["X-Partial-Results"] = partial
+        if prof:
+            log.info("profiled /upload %s: %s", doc.name, prof["path"])
+            headers.update({"X-Profile-Id": prof["id"], "X-Profile-Path": prof["path"]})
+            inline = request.headers.get("x-profile-output") or request.query_params.get("profile_output")
+            if inline == "inline":
+                return PlainTextResponse(prof["summary"], headers=headers)
         rows_html = _build_rows(results) or "<tr><td colspan='11' style='text-align:center;'>No matches found</td></tr>"
-        return HTMLResponse(_table_html(rows_html), headers={"Cache-Control": "no-store"})
+        return HTMLResponse(_table_html(rows_html, match_id), headers=headers)
+    except PoolSaturated as e:
+        return HTMLResponse(
+            f"<pre>{e!s}</pre>",
+            status_code=503,
+            headers={"Retry-After": str(e.retry_after), "Cache-Control": "no-store"},
+        )
+    except UploadTooLarge as e:
+        return HTMLResponse(f"<pre>{e!s}</pre>", status_code=413, headers={"Cache-Control": "no-store"})
+    except FormError as e:
+        return HTMLResponse(f"<pre>{e!s}</pre>", status_code=422, headers={"Cache-Control": "no-store"})
+    except Cancelled as e:
+        return HTMLResponse(f"<pre>{e!s}</pre>", status_code=_cancel_status(e), headers={"Cache-Control": "no-store"})
     except Exception as e:
         return HTMLResponse(
             f"<pre>Upload failed: {e!s}</pre>",
@@ -141,53 +366,358 @@ async def handle_upload(
             headers={"Cache-Control": "no-store"},
         )
 
-@app.post("/download_csv")
-async def download_csv(
-    request: Request,
-    resume: UploadFile = File(...),
-    jd_files: List[UploadFile] = File([]),
-):
-    jd_cache = (
-        build_jd_cache_from_uploads([(f.filename, await f.read()) for f in jd_files])
-        if jd_files else jd_cache_fallback
+@app.post("/match/batch")
+async def match_batch(request: Request):
+    """
+    Match N resumes against M JDs in one request (multipart form: resumes,
+    optional jd_files and fields). The JDs are embedded once, then the
+    resumes run concurrently on the worker pool (at most one per worker at
+    a time, so one big batch cannot fill the whole queue). Once the
+    deadline passes or the client leaves, remaining resumes are skipped.
+    `fields` (e.g. "score,skills") limits the rows to those output groups.
+    """
+    pool = get_pool()
+    mode = _quality_mode(request)
+    async with UploadSession() as uploads:
+        try:
+            form = await uploads.ingest_form(request)
+            groups = _requested_fields(request, form.get("fields"))
+            jd_docs, docs = form.files("jd_files"), form.files("resumes")
+            if not docs:
+                raise FormError("missing required file field 'resumes'")
+        except UploadTooLarge as e:
+            return JSONResponse({"error": str(e)}, status_code=413, headers={"Cache-Control": "no-store"})
+        except FormError as e:
+            return JSONResponse({"error": str(e)}, status_code=422, headers={"Cache-Control": "no-store"})
+        except ValueError as e:
+            return JSONResponse({"error": str(e)}, status_code=400, headers={"Cache-Control": "no-store"})
+        async with _cancel_scope(request) as token:
+            try:
+                jd_cache = await _jd_cache_for(pool, jd_docs, token, groups, mode)
+            except Cancelled as e:
+                return JSONResponse({"error": str(e)}, status_code=_cancel_status(e), headers={"Cache-Control": "no-store"})
+            except PoolSaturated as e:
+                return JSONResponse(
+                    {"error": str(e)},
+                    status_code=503,
+                    headers={"Retry-After": str(e.retry_after), "Cache-Control": "no-store"},
+                )
+
+            slots = asyncio.Semaphore(pool.workers)
+
+            async def one(doc) -> dict:
+                async with slots:
+                    try:
+                        matches = await pool.run(
+                            match_uploads, doc.source, doc.name, None, jd_cache, cancel=token, mode=mode, fields=groups)
+                        JD_COUNT.observe(len(matches))
+                        return {"resume_file": doc.name, "matches": matches}
+                    except Cancelled as e:
+                        out = {"resume_file": doc.name, "error": str(e)}
+                        if e.partial and _allow_partial(request):
+                            out.update(matches=e.partial, partial=e.reason)
+                        return out
+                    except Exception as e:
+                        return {"resume_file": doc.name, "error": str(e)}
+
+            results = await asyncio.gather(*(one(d) for d in docs))
+    match_id = await _store_results([row for r in results for row in r.get("matches", [])])
+    return JSONResponse(
+        {
+            "match_id": match_id,
+            "resume_count": len(docs),
+            "jd_count": len(jd_cache) if jd_cache is not None else None,
+            "quality_mode": mode,
+            "results": results,
+        },
+        headers={"Cache-Control": "no-store", "X-Quality-Mode": mode},
+    )
+
+def _stream_event(kind: str, data, fmt: str) -> str:
+    if fmt == "sse":
+        return f"event: {kind}\ndata: {json.dumps(data, default=str)}\n\n"
+    return json.dumps({"event": kind, "data": data}, default=str) + "\n"
+
+@app.post("/match/stream")
+async def match_stream(request: Request):
+    """
+    Stream MatchResults as each JD is scored instead of after the whole set.
+
+    The resume is analyzed once, then the JDs are scored one per pool task and
+    every row is sent the moment it is ready ("result" events). With top_k > 0
+    a "top_k" event carrying the current best k rows is sent whenever that set
+    changes instead. A final "done" event carries the row count and the
+    match_id for /results/{match_id}.csv and the quality mode, plus
+    "partial" if the request deadline cut scoring short. format is
+    "ndjson" (default, one JSON object per line) or "sse" (text/event-stream).
+    `fields` is as for /match/batch. All of these are multipart form fields
+    next to the resume and jd_files uploads.
+    """
+    pool = get_pool()
+    mode = _quality_mode(request)
+    async with AsyncExitStack() as stack:
+        try:
+            # the uploads are only read up to here; scoring works on the analysis
+            async with UploadSession() as uploads:
+                form = await uploads.ingest_form(request)
+                try:
+                    top_k = int(form.get("top_k") or 0)
+                except ValueError:
+                    raise FormError("top_k must be an integer")
+                fmt = "sse" if form.get("format") == "sse" else "ndjson"
+                try:
+                    groups = _requested_fields(request, form.get("fields"))
+                except ValueError as e:
+                    return JSONResponse({"error": str(e)}, status_code=400, headers={"Cache-Control": "no-store"})
+                jd_docs, doc = form.files("jd_files"), form.file("resume")
+                token = await stack.enter_async_context(_cancel_scope(request))
+                # the default set is loaded once per web process (memory-mapped) rather
+                # than shipped back from a pool worker on every request
+                jd_cache = (await _jd_cache_for(pool, jd_docs, token, groups, mode) if jd_docs
+                            else await asyncio.to_thread(default_jd_cache))
+                analysis = await pool.run(analyze_resume, doc.source, doc.name, mode, groups, cancel=token)
+            JD_COUNT.observe(len(jd_cache))
+        except Cancelled as e:
+            return JSONResponse({"error": str(e)}, status_code=_cancel_status(e), headers={"Cache-Control": "no-store"})
+        except PoolSaturated as e:
+            return JSONResponse(
+                {"error": str(e)},
+                status_code=503,
+                headers={"Retry-After": str(e.retry_after), "Cache-Control": "no-store"},
+            )
+        except UploadTooLarge as e:
+            return JSONResponse({"error": str(e)}, status_code=413, headers={"Cache-Control": "no-store"})
+        except FormError as e:
+            return JSONResponse({"error": str(e)}, status_code=422, headers={"Cache-Control": "no-store"})
+        except Exception as e:
+            return JSONResponse({"error": f"Upload failed: {e!s}"}, status_code=400, headers={"Cache-Control": "no-store"})
+        # the deadline and the disconnect watch last as long as the stream
+        scope = stack.pop_all()
+
+    async def events():
+        slots = asyncio.Semaphore(pool.workers)
+
+        async def score(item):
+            async with slots:
+                return await pool.run(score_jds, analysis, [item], cancel=token)
+
+        async with scope:
+            tasks = [asyncio.ensure_future(score(item)) for item in jd_cache.items()]
+            best: list = []
+            scored: list = []
+            partial = None
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    try:
+                        rows = await next_done
+                    except Cancelled as e:
+                        partial = e.reason          # deadline: finish with the rows scored so far
+                        break
+                    except Exception as e:
+                        yield _stream_event("error", {"message": str(e)}, fmt)
+                        continue
+                    for row in rows:
+                        scored.append(row)
+                        if top_k <= 0:
+                            yield _stream_event("result", row, fmt)
+                            continue
+                        if len(best) < top_k or row["similarity_score_percent"] > best[-1]["similarity_score_percent"]:
+                            best = sorted(best + [row], key=lambda r: r["similarity_score_percent"], reverse=True)[:top_k]
+                            yield _stream_event("top_k", best, fmt)
+                done = {"count": len(scored), "match_id": await _store_results(scored), "quality_mode": mode}
+                if partial:
+                    done["partial"] = partial
+                yield _stream_event("done", done, fmt)
+            finally:
+                for t in tasks:                 # client went away: drop unscored JDs
+                    t.cancel()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream" if fmt == "sse" else "application/x-ndjson",
+        headers={"Cache-Control": "no-store", "X-Quality-Mode": mode},
+    )
+
+@app.post("/jobs", status_code=202)
+async def submit_job(request: Request):
+    """
+    Queue a screening run too large for one request. The uploads are stored
+    with the job (SQLite, see jobs.py) and every resume's result is
+    checkpointed as it finishes, so a restart resumes where it stopped.
+    Poll GET /jobs/{job_id}, read GET /jobs/{job_id}/results, cancel with
+    DELETE /jobs/{job_id}.
+    """
+    store = get_job_store()
+    try:
+        async with UploadSession() as uploads:
+            form = await uploads.ingest_form(request)
+            jd_docs, resume_docs = form.files("jd_files"), form.files("resumes")
+            if not resume_docs:
+                raise FormError("missing required file field 'resumes'")
+            job_id = await asyncio.to_thread(
+                lambda: store.submit([(u.name, u.read_bytes()) for u in resume_docs],
+                                     [(u.name, u.read_bytes()) for u in jd_docs]))
+    except UploadTooLarge as e:
+        return JSONResponse({"error": str(e)}, status_code=413, headers={"Cache-Control": "no-store"})
+    except FormError as e:
+        return JSONResponse({"error": str(e)}, status_code=422, headers={"Cache-Control": "no-store"})
+    if _job_runner is not None:
+        _job_runner.notify()
+    return JSONResponse(await asyncio.to_thread(store.get, job_id), status_code=202, headers={"Location": f"/jobs/{job_id}", "Cache-Control": "no-store"})
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    job = get_job_store().get(job_id)
+    if job is None:
+        return JSONResponse({"error": "Unknown job_id"}, status_code=404, headers={"Cache-Control": "no-store"})
+    return JSONResponse(job, headers={"Cache-Control": "no-store"})
+
+@app.get("/jobs/{job_id}/results")
+async def job_results(job_id: str, after: int = 0, follow: bool = False, format: str = "ndjson"):
+    """
+    Finished items as "result" events (one per resume, in completion order,
+    each with a `seq`); pass after=<last seq> to resume a dropped stream.
+    With follow=true the stream stays open until the job finishes. Ends with
+    a "done" event carrying the job status.
+    """
+    store = get_job_store()
+    if await asyncio.to_thread(store.get, job_id) is None:
+        return JSONResponse({"error": "Unknown job_id"}, status_code=404, headers={"Cache-Control": "no-store"})
+    fmt = "sse" if format == "sse" else "ndjson"
+
+    def page(cursor: int) -> List[dict]:
+        return list(store.results(job_id, cursor, limit=100))
+
+    async def events():
+        cursor = after
+        while True:
+            job = await asyncio.to_thread(store.get, job_id)
+            while True:
+                items = await asyncio.to_thread(page, cursor)
+                for item in items:
+                    cursor = item["seq"]
+                    yield _stream_event("result", item, fmt)
+                if len(items) < 100:
+                    break
+            if job is None or not follow or job["status"] in TERMINAL:
+                break
+            await asyncio.sleep(1.0)
+        yield _stream_event("done", await asyncio.to_thread(store.get, job_id), fmt)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream" if fmt == "sse" else "application/x-ndjson",
+        headers={"Cache-Control": "no-store"},
     )
-    resume_path = _safe_save_upload("resume", resume.filename, await resume.read())
-    results = match_resume_to_jds(str(resume_path), jd_cache)
 
+@app.delete("/jobs/{job_id}")
+def cancel_job(job_id: str):
+    """Stop a queued or running job; resumes already on a worker still finish."""
+    store = get_job_store()
+    if store.get(job_id) is None:
+        return JSONResponse({"error": "Unknown job_id"}, status_code=404, headers={"Cache-Control": "no-store"})
+    store.cancel(job_id)
+    return JSONResponse(store.get(job_id), headers={"Cache-Control": "no-store"})
+
+CSV_HEADER = [
+    "Resume File","JD File","Match %","Resume Location","JD Location","Matched Skills",
+    "Missing Skills","Edu → First Job Gap","Education Periods",
+    "Experience Periods","Education Gaps","Experience Gaps"
+]
+
+def _periods_csv(periods):
+    return "; ".join(f"{p.get('entry','')} ({p.get('start','')} — {p.get('end','')})" for p in (periods or []))
+
+def _gaps_csv(gaps):
+    return "; ".join(f"{g.get('between','')} – {g.get('gap_months','')} months" for g in (gaps or []))
+
+def _csv_row(r: dict) -> list:
+    return [
+        r.get("resume_file",""),
+        r.get("jd_file",""),
+        r.get("similarity_score_percent",""),
+        r.get("resume_location",""),
+        r.get("jd_location",""),
+        _skills_text(r, "matched_skills"),
+        _skills_text(r, "missing_skills"),
+        r.get("education_to_first_job_gap_months",""),
+        _periods_csv(r.get("education_periods")),
+        _periods_csv(r.get("experience_periods")),
+        _gaps_csv(r.get("education_gaps")),
+        _gaps_csv(r.get("experience_gaps")),
+    ]
+
+def _iter_csv(results: Iterable[dict], rows_per_chunk: int = 200) -> Iterator[bytes]:
+    """Encode rows a chunk at a time through one small reusable buffer; `results` is consumed lazily."""
     buf = io.StringIO()
     w = csv.writer(buf)
-    w.writerow([
-        "JD File","Match %","Resume Location","JD Location","Matched Skills",
-        "Missing Skills","Edu → First Job Gap","Education Periods",
-        "Experience Periods","Education Gaps","Experience Gaps"
-    ])
-    def _periods_csv(periods):
-        return "; ".join(f"{p.get('entry','')} ({p.get('start','')} — {p.get('end','')})" for p in (periods or []))
-    def _gaps_csv(gaps):
-        return "; ".join(f"{g.get('between','')} – {g.get('gap_months','')} months" for g in (gaps or []))
-    for r in results:
-        w.writerow([
-            r.get("jd_file",""),
-            r.get("similarity_score_percent",""),
-            r.get("resume_location",""),
-            r.get("jd_location",""),
-            ", ".join((r.get("matched_skills", []) or [])),
-            ", ".join((r.get("missing_skills", []) or [])),
-            r.get("education_to_first_job_gap_months",""),
-            _periods_csv(r.get("education_periods")),
-            _periods_csv(r.get("experience_periods")),
-            _gaps_csv(r.get("education_gaps")),
-            _gaps_csv(r.get("experience_gaps")),
-        ])
-    buf.seek(0)
+    w.writerow(CSV_HEADER)
+    for i, r in enumerate(results, 1):
+        w.writerow(_csv_row(r))
+        if i % rows_per_chunk == 0:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue().encode("utf-8")
+
+def _csv_response(results: Iterable[dict], match_id: str) -> StreamingResponse:
     return StreamingResponse(
-        io.BytesIO(buf.getvalue().encode("utf-8")),
+        _iter_csv(results),
         media_type="text/csv",
         headers={
             "Content-Disposition":"attachment; filename=resume_match_results.csv",
             "Cache-Control":"no-store",
+            "X-Match-Id": match_id,
         },
     )
 
+@app.post("/download_csv")
+async def download_csv(request: Request):
+    # form: resume, jd_files, fields; columns of groups left out of `fields` stay empty
+    partial = None
+    mode = _quality_mode(request)
+    try:
+        async with UploadSession() as uploads:
+            form = await uploads.ingest_form(request)
+            try:
+                groups = _requested_fields(request, form.get("fields"))
+            except ValueError as e:
+                return PlainTextResponse(str(e), status_code=400, headers={"Cache-Control": "no-store"})
+            jd_docs, doc = form.files("jd_files"), form.file("resume")
+            async with _cancel_scope(request) as token:
+                try:
+                    jd_cache = await _jd_cache_for(get_pool(), jd_docs, token, groups, mode)
+                    results = await get_pool().run(
+                        match_uploads, doc.source, doc.name, None, jd_cache, cancel=token, mode=mode, fields=groups)
+                except Cancelled as e:
+                    results, partial = _cancelled_rows(e, request), e.reason
+        JD_COUNT.observe(len(results))
+    except Cancelled as e:
+        return PlainTextResponse(str(e), status_code=_cancel_status(e), headers={"Cache-Control": "no-store"})
+    except PoolSaturated as e:
+        return PlainTextResponse(
+            str(e),
+            status_code=503,
+            headers={"Retry-After": str(e.retry_after), "Cache-Control": "no-store"},
+        )
+    except UploadTooLarge as e:
+        return PlainTextResponse(str(e), status_code=413, headers={"Cache-Control": "no-store"})
+    except FormError as e:
+        return PlainTextResponse(str(e), status_code=422, headers={"Cache-Control": "no-store"})
+
+    response = _csv_response(results, await _store_results(results))
+    response.headers["X-Quality-Mode"] = mode
+    if partial:
+        response.headers["X-Partial-Results"] = partial
+    return response
+
+@app.get("/results/{match_id}.csv")
+def export_results_csv(match_id: str):
+    """CSV export of a result set returned earlier (match_id), streamed from the store without recomputing it."""
+    results = get_result_store().iter_rows(match_id)
+    if results is None:
+        return PlainTextResponse("Unknown or expired match_id", status_code=404, headers={"Cache-Control": "no-store"})
+    return _csv_response(results, match_id)
+
 if __name__ == "__main__":
     uvicorn.run("app_main:app", host="127.0.0.1", port=8000, reload=True)
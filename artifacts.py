@@ -0,0 +1,93 @@
+# artifacts.py
+#
+#   python artifacts.py build [out_dir]     # default: ./artifacts
+#
+# A prebuilt bundle of everything the app would otherwise compute or
+# download on a cold start: the default JD cache (JSON + embedding matrix)
+# and SkillNer's skill DB and token table. Build it at deploy time and ship
+# it with the app; use_bundle() points the loaders at it.
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+from pathlib import Path
+from typing import Dict, Optional
+
+log = logging.getLogger(__name__)
+
+APP_DIR = Path(__file__).resolve().parent
+MANIFEST = "manifest.json"
+SKILLNER_FILES = ("skill_db_relax_20.json", "token_dist.json")
+JD_FILES = ("jd_cache.json", "jd_cache.embeddings.npy")
+
+
+def artifact_dir() -> Path:
+    """ARTIFACT_DIR, default <app>/artifacts."""
+    return Path(os.getenv("ARTIFACT_DIR") or APP_DIR / "artifacts")
+
+
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def build_bundle(out_dir: Optional[str] = None) -> Path:
+    """Build the default JD cache and collect it with the SkillNer data into out_dir."""
+    from extractors import EXTRACTOR_VERSION
+    import jd_cache
+
+    out = Path(out_dir) if out_dir else artifact_dir()
+    out.mkdir(parents=True, exist_ok=True)
+
+    # SkillNer downloads its DBs into the working directory on first import
+    import skillNer.general_params  # noqa: F401
+    for name in SKILLNER_FILES:
+        src = next((d / name for d in (Path.cwd(), APP_DIR) if (d / name).is_file()), None)
+        if src is None:
+            raise FileNotFoundError(f"SkillNer data file {name} not found; run from the directory it was fetched to")
+        shutil.copyfile(src, out / name)
+
+    jd_cache.default_jd_cache.cache_clear()
+    os.environ["JD_CACHE_PATH"] = str(out / JD_FILES[0])
+    jd_cache.default_jd_cache()
+
+    files: Dict[str, str] = {name: _sha256(out / name) for name in SKILLNER_FILES + JD_FILES}
+    (out / MANIFEST).write_text(json.dumps({"extractor_version": EXTRACTOR_VERSION, "files": files}, indent=2))
+    return out
+
+
+def use_bundle(bundle_dir: Optional[str] = None) -> bool:
+    """
+    Point the JD cache and SkillNer loaders at a bundle built by
+    build_bundle(). Nothing is loaded here; that still happens on first use.
+    A missing, incomplete or stale (other EXTRACTOR_VERSION) bundle is
+    ignored and False returned.
+    """
+    from extractors import EXTRACTOR_VERSION
+
+    root = Path(bundle_dir) if bundle_dir else artifact_dir()
+    try:
+        manifest = json.loads((root / MANIFEST).read_text())
+    except (OSError, ValueError):
+        return False
+    if manifest.get("extractor_version") != EXTRACTOR_VERSION:
+        log.warning("ignoring artifact bundle %s built for extractor %s", root, manifest.get("extractor_version"))
+        return False
+    if not all((root / name).is_file() for name in SKILLNER_FILES + JD_FILES):
+        log.warning("ignoring incomplete artifact bundle %s", root)
+        return False
+    os.environ.setdefault("JD_CACHE_PATH", str(root / JD_FILES[0]))
+    os.environ.setdefault("SKILLNER_DATA_DIR", str(root))
+    return True
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "build":
+        sys.exit("usage: python artifacts.py build [out_dir]")
+    print(f"bundle written to {build_bundle(sys.argv[2] if len(sys.argv) > 2 else None)}")
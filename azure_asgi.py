@@ -0,0 +1,248 @@
+# azure_asgi.py
+
+import asyncio
+import logging
+import os
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from metrics import REGISTRY
+
+log = logging.getLogger(__name__)
+
+COLD_START = REGISTRY.gauge("function_cold_start_seconds", "Cold-start time of this function instance, by phase", ["phase"])
+
+# settings for a single-instance serverless host: no process pool, no eager
+# warm-up, writable scratch space outside the (read-only) app directory. A
+# bundle (artifacts.use_bundle) is applied first, so its JD cache wins over
+# the tmp one built here without it.
+_FUNCTION_DEFAULTS = {
+    "MATCH_EXECUTOR": "thread",
+    "MATCH_WORKERS": "1",
+    "WEB_CONCURRENCY": "1",
+    "WARM_ON_STARTUP": "0",
+    "UPLOAD_DIR": os.path.join(tempfile.gettempdir(), "resume-matcher", "uploads"),
+    "PROFILE_DIR": os.path.join(tempfile.gettempdir(), "resume-matcher", "profiles"),
+    "JOBS_DB": os.path.join(tempfile.gettempdir(), "resume-matcher", "jobs.sqlite3"),
+    "JD_CACHE_PATH": os.path.join(tempfile.gettempdir(), "resume-matcher", "jd_cache.json"),
+}
+
+
+class FunctionResponse:
+    """Stand-in for azure.functions.HttpResponse where that package is not installed."""
+
+    def __init__(self, body: bytes = b"", status_code: int = 200, headers: Optional[Dict[str, str]] = None):
+        self.status_code = status_code
+        self.headers = dict(headers or {})
+        self._body = body
+
+    def get_body(self) -> bytes:
+        return self._body
+
+
+class LocalRequest:
+    """
+    The parts of azure.functions.HttpRequest the adapter reads, for running
+    the function locally (tests, benchmarks/measure_cold_start.py).
+    `url` is as the host passes it, e.g. "http://localhost/api/upload?x=1".
+    """
+
+    def __init__(self, method: str, url: str, headers: Optional[Dict[str, str]] = None, body: bytes = b"",
+                 route_params: Optional[Dict[str, str]] = None):
+        self.method = method
+        self.url = url
+        self.headers = dict(headers or {})
+        self.route_params = route_params if route_params is not None else {"route": urlsplit(url).path.split("/api/", 1)[-1]}
+        self._body = body
+
+    def get_body(self) -> bytes:
+        return self._body
+
+
+def _load_app():
+    from app_main import app
+    return app
+
+
+async def call_asgi(app, method: str, path: str, query: str, headers: Dict[str, str], body: bytes,
+                    client: str = "127.0.0.1") -> Tuple[int, List[Tuple[str, str]], bytes]:
+    """
+    One HTTP request through an ASGI app, returning (status, headers, body).
+    The response is buffered (function HTTP outputs do not stream). The
+    client counts as connected until the response is complete.
+    """
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method.upper(),
+        "scheme": "https",
+        "path": path,
+        "raw_path": path.encode("utf-8"),
+        "query_string": query.encode("latin-1"),
+        "root_path": "",
+        "headers": [(k.lower().encode("latin-1"), str(v).encode("latin-1")) for k, v in headers.items()],
+        "client": (client, 0),
+        "server": ("localhost", 443),
+    }
+    finished = asyncio.Event()
+    body_sent = False
+    status = 500
+    out_headers: List[Tuple[str, str]] = []
+    chunks: List[bytes] = []
+
+    async def receive():
+        nonlocal body_sent
+        if not body_sent:
+            body_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            out_headers.extend((k.decode("latin-1"), v.decode("latin-1")) for k, v in message.get("headers", []))
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body"):
+                finished.set()
+
+    try:
+        await app(scope, receive, send)
+    finally:
+        finished.set()
+    return status, out_headers, b"".join(chunks)
+
+
+class AsgiFunction:
+    """
+    Azure Functions HTTP trigger serving an ASGI app (app_main.app by
+    default). The app is imported and started on the first invocation, not
+    when the worker loads the function; models then load lazily on first
+    use, from the prebuilt artifact bundle if one ships with the app (see
+    artifacts.py). The cold-start phases are timed, logged, exported as
+    function_cold_start_seconds{phase} and returned on the first response
+    as X-Cold-Start-Ms.
+    """
+
+    def __init__(self, app_factory: Optional[Callable[[], Any]] = None, bundle_dir: Optional[str] = None):
+        self._factory = app_factory or _load_app
+        self._bundle_dir = bundle_dir
+        self._created = time.perf_counter()
+        self._app = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._lifespan: Optional[asyncio.Task] = None
+        self._lifespan_inbox: Optional[asyncio.Queue] = None
+        self.cold_start: Dict[str, float] = {}
+
+    def _phase(self, name: str, seconds: float) -> None:
+        self.cold_start[name] = seconds
+        COLD_START.set(seconds, phase=name)
+
+    async def _start(self) -> None:
+        t0 = time.perf_counter()
+        from artifacts import use_bundle
+        bundled = use_bundle(self._bundle_dir)
+        for key, value in _FUNCTION_DEFAULTS.items():
+            os.environ.setdefault(key, value)
+        t1 = time.perf_counter()
+        self._phase("bundle", t1 - t0)
+        app = self._factory()
+        t2 = time.perf_counter()
+        self._phase("import", t2 - t1)
+        await self._startup(app)
+        self._phase("startup", time.perf_counter() - t2)
+        self._app = app
+        log.info("function instance started (artifact bundle %s): %s",
+                 "used" if bundled else "not found", self._describe())
+
+    async def _startup(self, app) -> None:
+        """Run the app's lifespan startup; its shutdown is sent by shutdown()."""
+        inbox: asyncio.Queue = asyncio.Queue()
+        started = asyncio.get_running_loop().create_future()
+
+        async def send(message):
+            if message["type"] == "lifespan.startup.complete":
+                started.set_result(None)
+            elif message["type"] == "lifespan.startup.failed":
+                started.set_exception(RuntimeError(message.get("message", "lifespan startup failed")))
+
+        async def run():
+            try:
+                await app({"type": "lifespan", "asgi": {"version": "3.0"}}, inbox.get, send)
+            finally:
+                if not started.done():      # app without lifespan support
+                    started.set_result(None)
+
+        await inbox.put({"type": "lifespan.startup"})
+        self._lifespan_inbox = inbox
+        self._lifespan = asyncio.ensure_future(run())
+        await started
+
+    async def shutdown(self) -> None:
+        """Send lifespan shutdown (local runs and tests; the host just stops the worker)."""
+        if self._lifespan is not None:
+            await self._lifespan_inbox.put({"type": "lifespan.shutdown"})
+            await self._lifespan
+            self._lifespan = None
+        self._app = None
+
+    def _describe(self) -> str:
+        return " ".join(f"{k}={v * 1000:.0f}ms" for k, v in self.cold_start.items())
+
+    async def __call__(self, req, context=None):
+        cold = self._app is None
+        if cold:
+            if self._lock is None:
+                self._lock = asyncio.Lock()
+            async with self._lock:
+                if self._app is None:
+                    await self._start()
+                else:
+                    cold = False
+        t0 = time.perf_counter()
+        url = urlsplit(req.url)
+        route = (getattr(req, "route_params", None) or {}).get("route")
+        path = "/" + route.lstrip("/") if route is not None else url.path
+        headers = dict(req.headers)
+        status, out_headers, body = await call_asgi(
+            self._app, req.method, path, url.query, headers, req.get_body() or b"",
+            client=_forwarded_client(headers),
+        )
+        if cold:
+            self._phase("first_request", time.perf_counter() - t0)
+            self._phase("total", time.perf_counter() - self._created)
+            out_headers.append(("X-Cold-Start-Ms", str(round(self.cold_start["total"] * 1000))))
+            log.info("cold start: %s", self._describe())
+        return _response(status, out_headers, body)
+
+
+def _forwarded_client(headers: Dict[str, str]) -> str:
+    """
+    Caller address as appended by the Functions front end: the rightmost
+    X-Forwarded-For entry (entries left of it are client-supplied), without
+    the port it may carry.
+    """
+    forwarded = next((v for k, v in headers.items() if k.lower() == "x-forwarded-for"), "")
+    last = forwarded.rsplit(",", 1)[-1].strip()
+    if last.count(":") == 1:            # "1.2.3.4:5678"; IPv6 has more colons
+        last = last.split(":")[0]
+    return last or "127.0.0.1"
+
+
+def _response(status: int, headers: List[Tuple[str, str]], body: bytes):
+    try:
+        import azure.functions as func
+    except ModuleNotFoundError:
+        func = None
+    merged: Dict[str, str] = {}
+    for k, v in headers:                 # HttpResponse takes one value per header
+        merged[k] = f"{merged[k]}, {v}" if k in merged else v
+    # content-type travels in the headers, so HttpResponse keeps the app's charset
+    if func is not None:
+        return func.HttpResponse(body=body, status_code=status, headers=merged)
+    return FunctionResponse(body=body, status_code=status, headers=merged)
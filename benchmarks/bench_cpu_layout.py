@@ -0,0 +1,84 @@
+"""
+Sweep worker processes x torch threads for SBERT encoding throughput.
+
+    python benchmarks/bench_cpu_layout.py [--workers 1,2,4] [--threads 1,2,4] [--seconds 10] [--pin]
+
+Every combination starts `workers` processes that each use `threads`
+intra-op threads (laid out by cpu_layout.plan, pinned with --pin) and
+encode resume-sized texts for `seconds`. Combinations using more than twice
+the available cores are skipped. Pick the fastest row for WEB_CONCURRENCY
+(workers) and TORCH_THREADS, or leave TORCH_THREADS unset once the computed
+value (cores / workers / MATCH_WORKERS) matches it.
+"""
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import argparse
+import multiprocessing
+import time
+
+from cpu_layout import available_cpus, plan
+
+_TEXT = (
+    "Senior Data Analyst with 6 years of experience in Python, SQL, Power BI and Tableau. "
+    "Built ETL pipelines on Airflow and Spark, owned KPI dashboards for sales and finance, "
+    "and mentored junior analysts. B.Tech in Computer Science, State University, 2012 - 2016. "
+) * 8
+
+
+def _worker(slot: int, workers: int, threads: int, pin: bool, seconds: float, start, out) -> None:
+    layout = plan(available_cpus(), workers, 1, slot=slot, pin=pin, torch_threads=threads)
+    if layout.pinned:
+        os.sched_setaffinity(0, layout.cpus)
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    import torch
+    torch.set_num_threads(threads)
+    from sentence_transformers import SentenceTransformer
+    sbert = SentenceTransformer("all-MiniLM-L6-v2")
+    sbert.encode(_TEXT)                       # warm-up
+    start.wait()
+    done, t0 = 0, time.perf_counter()
+    while time.perf_counter() - t0 < seconds:
+        sbert.encode(_TEXT)
+        done += 1
+    out.put(done / (time.perf_counter() - t0))
+
+
+def run(workers: int, threads: int, pin: bool, seconds: float) -> float:
+    ctx = multiprocessing.get_context("spawn")
+    start, out = ctx.Barrier(workers), ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(i, workers, threads, pin, seconds, start, out)) for i in range(workers)]
+    for p in procs:
+        p.start()
+    rates = [out.get() for _ in procs]
+    for p in procs:
+        p.join()
+    return sum(rates)
+
+
+def _ints(s: str):
+    return [int(x) for x in s.split(",") if x]
+
+
+if __name__ == "__main__":
+    cores = len(available_cpus())
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=_ints, default=[w for w in (1, 2, 4, 8) if w <= cores] or [1])
+    ap.add_argument("--threads", type=_ints, default=[t for t in (1, 2, 4, 8) if t <= cores] or [1])
+    ap.add_argument("--seconds", type=float, default=10.0)
+    ap.add_argument("--pin", action="store_true")
+    args = ap.parse_args()
+
+    print(f"{cores} usable cores{' (pinned)' if args.pin else ''}")
+    print(f"{'workers':>8}{'threads':>9}{'total thr':>11}{'encodes/s':>12}{'per worker':>12}")
+    best = None
+    for w in args.workers:
+        for t in args.threads:
+            if w * t > 2 * cores:
+                continue
+            rate = run(w, t, args.pin, args.seconds)
+            print(f"{w:>8}{t:>9}{w * t:>11}{rate:>12.1f}{rate / w:>12.1f}")
+            if best is None or rate > best[0]:
+                best = (rate, w, t)
+    if best:
+        print(f"\nbest: WEB_CONCURRENCY={best[1]} TORCH_THREADS={best[2]} ({best[0]:.1f} encodes/s)")
@@ -0,0 +1,54 @@
+"""
+Benchmark extract_periods on long, date-dense resumes.
+
+    python benchmarks/bench_periods.py [n_lines ...]
+"""
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import random
+import time
+
+from extractors import extract_periods, _parse_date
+
+_BLOCK = [
+    "Bachelor of Engineering in Computer Science",
+    "State University",
+    "CGPA 8.4",
+    "2012 - 2016",
+    "",
+    "Senior Software Engineer",
+    "Acme Technologies Pvt Ltd",
+    "Jan 2019 - Present",
+    "• Built data pipelines in Python and SQL",
+    "• Led a team of 4 developers",
+    "Data Analyst at XYZ Solutions (Jul 2016 - Dec 2018)",
+    "M.S. Data Science, Tech Institute Fall 2020 through Spring 2022",
+    "Summer 2015",
+]
+
+
+def make_lines(n: int, seed: int = 0) -> list:
+    rnd = random.Random(seed)
+    out = []
+    while len(out) < n:
+        out.extend(rnd.sample(_BLOCK, len(_BLOCK)))
+    return out[:n]
+
+
+def bench(n: int, repeat: int = 5) -> None:
+    lines = make_lines(n)
+    for mode in ("edu", "exp"):
+        best = float("inf")
+        for _ in range(repeat):
+            _parse_date.cache_clear()
+            t0 = time.perf_counter()
+            periods = extract_periods(lines, mode=mode)
+            best = min(best, time.perf_counter() - t0)
+        print(f"lines={n:>6} mode={mode:<4} periods={len(periods):>5} best={best * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [200, 2000, 20000]
+    for n in sizes:
+        bench(n)
@@ -0,0 +1,76 @@
+"""
+Measure Azure Functions cold starts locally, without the Functions host.
+
+    python benchmarks/measure_cold_start.py [runs] [--bundle DIR]
+
+Each run is a fresh interpreter that loads the function entry point
+(__init__.py) the way the worker does, sends GET /api/healthz (the cold
+start proper: bundle lookup, app import, lifespan startup) and then
+POST /api/match/batch with one resume against the default JDs (the first
+match, when the models load). Build a bundle with
+`python artifacts.py build` to compare against running without one.
+"""
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import json
+import statistics
+import subprocess
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent
+
+_CHILD = r"""
+import asyncio, importlib.util, json, sys, time
+t0 = time.perf_counter()
+spec = importlib.util.spec_from_file_location("function_app", sys.argv[1])
+entry = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(entry)
+t_load = time.perf_counter() - t0
+
+import httpx
+from azure_asgi import LocalRequest
+
+async def run():
+    health = await entry.main(LocalRequest("GET", "http://localhost/api/healthz"))
+    files = [("resumes", ("resume.txt", b"Data analyst, Python, SQL, Power BI. B.Tech 2016 - 2020.", "text/plain"))]
+    built = httpx.Request("POST", "http://localhost/api/match/batch", files=files)
+    t = time.perf_counter()
+    match = await entry.main(LocalRequest("POST", str(built.url), dict(built.headers), built.read()))
+    first_match = time.perf_counter() - t
+    return health, match, first_match
+
+health, match, first_match = asyncio.run(run())
+out = dict(entry._function.cold_start, function_load=t_load, first_match=first_match,
+           health_status=health.status_code, match_status=match.status_code)
+print(json.dumps(out))
+"""
+
+
+def one_run(bundle: str = None) -> dict:
+    env = dict(os.environ)
+    if bundle:
+        env["ARTIFACT_DIR"] = bundle
+    proc = subprocess.run(
+        [sys.executable, "-c", _CHILD, str(APP_DIR / "__init__.py")],
+        cwd=str(APP_DIR), env=env, capture_output=True, text=True, check=True,
+    )
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    bundle = None
+    if "--bundle" in args:
+        i = args.index("--bundle")
+        bundle = args[i + 1]
+        del args[i:i + 2]
+    runs = int(args[0]) if args else 3
+    results = [one_run(bundle) for _ in range(runs)]
+    phases = [k for k in results[0] if not k.endswith("_status")]
+    print(f"{runs} cold starts{' with bundle ' + bundle if bundle else ''}")
+    print(f"{'phase':<16}{'median ms':>12}{'max ms':>10}")
+    for k in phases:
+        values = [r[k] * 1000 for r in results]
+        print(f"{k:<16}{statistics.median(values):>12.0f}{max(values):>10.0f}")
+    print("statuses:", sorted({(r["health_status"], r["match_status"]) for r in results}))
@@ -0,0 +1,74 @@
+"""
+Report per-worker memory for a running gunicorn/uvicorn deployment.
+
+    python benchmarks/measure_worker_rss.py <master_pid>
+    python benchmarks/measure_worker_rss.py            # finds the gunicorn master
+
+USS (Private_Clean + Private_Dirty) is what each worker costs on its own;
+pages shared with the master (the fork-shared models) only show up in RSS and,
+split between sharers, in PSS. Linux only: reads /proc/<pid>/smaps_rollup.
+"""
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+def smaps_rollup(pid: int) -> Dict[str, int]:
+    """kB values from /proc/<pid>/smaps_rollup."""
+    out: Dict[str, int] = {}
+    for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines()[1:]:
+        parts = line.split()
+        if len(parts) >= 2 and parts[1].isdigit():
+            out[parts[0].rstrip(":")] = int(parts[1])
+    return out
+
+
+def children(pid: int) -> List[int]:
+    kids: List[int] = []
+    for task in Path(f"/proc/{pid}/task").iterdir():
+        f = task / "children"
+        if f.exists():
+            kids += [int(c) for c in f.read_text().split()]
+    return sorted(set(kids))
+
+
+def cmdline(pid: int) -> str:
+    return Path(f"/proc/{pid}/cmdline").read_bytes().replace(b"\0", b" ").decode(errors="replace").strip()
+
+
+def find_master() -> Optional[int]:
+    for p in Path("/proc").iterdir():
+        if not p.name.isdigit():
+            continue
+        try:
+            cmd = cmdline(int(p.name))
+            ppid = int((p / "stat").read_text().rsplit(")", 1)[1].split()[1])
+        except OSError:
+            continue
+        if "gunicorn" in cmd and "app_main" in cmd and "gunicorn" not in cmdline(ppid):
+            return int(p.name)
+    return None
+
+
+def report(master: int) -> None:
+    rows = [("master", master)] + [("worker", pid) for pid in children(master)]
+    print(f"{'role':<8}{'pid':>8}{'RSS MB':>10}{'PSS MB':>10}{'USS MB':>10}{'shared MB':>11}")
+    total_uss = 0
+    for role, pid in rows:
+        m = smaps_rollup(pid)
+        uss = m.get("Private_Clean", 0) + m.get("Private_Dirty", 0)
+        shared = m.get("Shared_Clean", 0) + m.get("Shared_Dirty", 0)
+        if role == "worker":
+            total_uss += uss
+        print(f"{role:<8}{pid:>8}{m.get('Rss', 0) / 1024:>10.1f}{m.get('Pss', 0) / 1024:>10.1f}"
+              f"{uss / 1024:>10.1f}{shared / 1024:>11.1f}")
+    n = len(rows) - 1
+    if n:
+        print(f"\n{n} workers, mean unique (USS) per worker: {total_uss / n / 1024:.1f} MB")
+
+
+if __name__ == "__main__":
+    pid = int(sys.argv[1]) if len(sys.argv) > 1 else find_master()
+    if pid is None:
+        sys.exit("no gunicorn master running app_main found; pass its pid")
+    report(pid)
@@ -0,0 +1,120 @@
+# cancellation.py
+
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator, List, Optional, Set
+
+
+class Cancelled(Exception):
+    """
+    Raised at a stage boundary once the request's deadline passed or its
+    client went away. `partial` holds any rows finished before that, for
+    callers that accept partial results.
+    """
+
+    def __init__(self, reason: str, partial: Optional[List[Any]] = None):
+        super().__init__(reason, partial)
+        self.reason = reason
+        self.partial = partial
+
+    def __str__(self) -> str:
+        return f"request cancelled ({self.reason})"
+
+
+# tokens cancelled in this process (thread pools see these directly)
+_CANCELLED: Set[str] = set()
+
+
+def _marker_dir() -> Path:
+    return Path(os.getenv("CANCEL_DIR") or Path(tempfile.gettempdir()) / "resume-matcher-cancel")
+
+
+class CancelToken:
+    """
+    Deadline plus cancel flag for one request, cheap to check and picklable
+    so it can ride along to pool workers. cancel() is seen by threads in this
+    process at once and by worker processes through a marker file, which
+    is only stat()ed at stage boundaries.
+    """
+
+    def __init__(self, deadline: Optional[float] = None):
+        self.id = uuid.uuid4().hex
+        self.deadline = deadline            # time.time() based, valid across processes
+
+    @classmethod
+    def after(cls, seconds: Optional[float]) -> "CancelToken":
+        return cls(time.time() + seconds if seconds and seconds > 0 else None)
+
+    @property
+    def _marker(self) -> Path:
+        return _marker_dir() / self.id
+
+    def cancel(self) -> None:
+        _CANCELLED.add(self.id)
+        try:
+            _marker_dir().mkdir(parents=True, exist_ok=True)
+            self._marker.touch()
+        except OSError:
+            pass
+
+    def close(self) -> None:
+        """Forget the token once its request is finished."""
+        _CANCELLED.discard(self.id)
+        try:
+            self._marker.unlink()
+        except OSError:
+            pass
+
+    def reason(self) -> Optional[str]:
+        if self.deadline is not None and time.time() >= self.deadline:
+            return "deadline"
+        if self.id in _CANCELLED or self._marker.exists():
+            return "disconnected"
+        return None
+
+    def check(self, partial: Optional[List[Any]] = None) -> None:
+        reason = self.reason()
+        if reason:
+            raise Cancelled(reason, partial)
+
+
+def sweep_markers(max_age: float = 3600.0) -> None:
+    """Remove markers of requests whose handler was torn down mid-job."""
+    cutoff = time.time() - max_age
+    for p in _marker_dir().glob("*"):
+        try:
+            if p.stat().st_mtime < cutoff:
+                p.unlink()
+        except OSError:
+            pass
+
+
+_local = threading.local()
+
+
+@contextmanager
+def using(token: Optional[CancelToken]) -> Iterator[None]:
+    """Make `token` the one checkpoint() checks on this thread."""
+    previous = getattr(_local, "token", None)
+    _local.token = token
+    try:
+        yield
+    finally:
+        _local.token = previous
+
+
+def current() -> Optional[CancelToken]:
+    """The token checkpoint() checks on this thread, if any."""
+    return getattr(_local, "token", None)
+
+
+def checkpoint(partial: Optional[List[Any]] = None) -> None:
+    """Stage boundary: raise Cancelled if the current request was cancelled."""
+    token = getattr(_local, "token", None)
+    if token is not None:
+        token.check(partial)
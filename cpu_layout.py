@@ -0,0 +1,134 @@
+# cpu_layout.py
+
+import logging
+import math
+import os
+import sys
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+log = logging.getLogger(__name__)
+
+
+class Layout(NamedTuple):
+    cpus: Tuple[int, ...]        # cores this process may run on
+    pinned: bool                 # cpus was applied with sched_setaffinity
+    torch_threads: int           # intra-op threads per matching job
+    interop_threads: int
+    tokenizers_parallel: bool
+
+    def describe(self) -> str:
+        contiguous = len(self.cpus) > 1 and self.cpus == tuple(range(self.cpus[0], self.cpus[-1] + 1))
+        span = f"{self.cpus[0]}-{self.cpus[-1]}" if contiguous else ",".join(map(str, self.cpus))
+        return (f"cpus={span} ({len(self.cpus)}{', pinned' if self.pinned else ''}) "
+                f"torch_threads={self.torch_threads} interop_threads={self.interop_threads} "
+                f"tokenizers_parallel={self.tokenizers_parallel}")
+
+
+def cgroup_cpu_limit(path: str = "/sys/fs/cgroup/cpu.max") -> Optional[float]:
+    """CPUs allowed by a cgroup v2 quota ("200000 100000" -> 2.0), None if unlimited."""
+    try:
+        quota, period = Path(path).read_text().split()[:2]
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        return None
+
+
+def available_cpus() -> List[int]:
+    """Cores this process may use: its affinity mask, cut down to a cgroup CPU quota."""
+    try:
+        cpus = sorted(os.sched_getaffinity(0))
+    except AttributeError:           # not Linux
+        cpus = list(range(os.cpu_count() or 1))
+    limit = cgroup_cpu_limit()
+    if limit is not None:
+        cpus = cpus[:max(1, math.ceil(limit))]
+    return cpus
+
+
+def plan(
+    cpus: Sequence[int],
+    processes: int,
+    jobs_per_process: int,
+    slot: Optional[int] = None,
+    pin: bool = False,
+    torch_threads: Optional[int] = None,
+) -> Layout:
+    """
+    Split `cpus` between `processes` web workers that each run up to
+    `jobs_per_process` matching jobs at once, so that all of them together
+    use about one thread per core. With `pin`, worker `slot` gets its own
+    contiguous slice of the cores; otherwise it may run anywhere. An
+    explicit `torch_threads` wins over the computed value.
+    """
+    cpus = tuple(cpus) or (0,)
+    processes = max(1, processes)
+    share = len(cpus) / processes
+    own = cpus
+    if pin and slot is not None:
+        if processes <= len(cpus):
+            size = len(cpus) // processes
+            extra = len(cpus) % processes       # first `extra` slices get one core more
+            start = slot % processes * size + min(slot % processes, extra)
+            own = cpus[start:start + size + (1 if slot % processes < extra else 0)]
+        else:
+            own = (cpus[slot % len(cpus)],)
+        share = len(own)
+    threads = torch_threads or max(1, int(share // max(1, jobs_per_process)))
+    return Layout(own, bool(pin and slot is not None), threads, 1, threads > 1)
+
+
+_applied: Optional[Tuple[int, Layout]] = None
+
+
+def configure(slot: Optional[int] = None) -> Layout:
+    """
+    Size this process's thread pools (and optionally pin it) from the host's
+    cores and the deployment shape, once per process; later calls return the
+    layout already applied. Configured from the environment:
+      WEB_CONCURRENCY   web worker processes sharing the cores (default 1)
+      MATCH_WORKERS     matching jobs each of them runs at once (as get_pool)
+      TORCH_THREADS     fixed intra-op threads per job instead of the computed value
+      CPU_AFFINITY      1 = pin web worker `slot` to its own slice of the cores
+    The chosen thread count is exported as TORCH_THREADS, OMP_NUM_THREADS
+    etc., so pool processes started from here, and torch when it is
+    imported later, inherit it.
+    """
+    global _applied
+    if _applied is not None and _applied[0] == os.getpid():
+        return _applied[1]
+    cpus = available_cpus()
+    override = os.getenv("TORCH_THREADS")
+    layout = plan(
+        cpus,
+        processes=int(os.getenv("WEB_CONCURRENCY", "1")),
+        jobs_per_process=int(os.getenv("MATCH_WORKERS", str(min(4, os.cpu_count() or 1)))),
+        slot=slot,
+        pin=os.getenv("CPU_AFFINITY") == "1",
+        torch_threads=int(override) if override else None,
+    )
+    if layout.pinned:
+        try:
+            os.sched_setaffinity(0, layout.cpus)
+        except (AttributeError, OSError) as e:
+            log.warning("could not pin pid %s to cpus %s: %s", os.getpid(), layout.cpus, e)
+            layout = layout._replace(cpus=tuple(cpus), pinned=False)
+
+    n = str(layout.torch_threads)
+    for var in ("TORCH_THREADS", "OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "RAYON_NUM_THREADS"):
+        os.environ[var] = n
+    os.environ["TOKENIZERS_PARALLELISM"] = "true" if layout.tokenizers_parallel else "false"
+    # a torch imported later picks the sizes up from the variables above; only
+    # one already loaded needs telling (importing it here would cost the web
+    # process torch's memory and import time even when models run elsewhere)
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(layout.torch_threads)
+        try:
+            torch.set_num_interop_threads(layout.interop_threads)
+        except RuntimeError:
+            pass                    # inter-op pool already started; keeps its size
+
+    _applied = (os.getpid(), layout)
+    log.info("cpu layout for pid %s%s: %s", os.getpid(), "" if slot is None else f" (worker {slot})", layout.describe())
+    return layout
@@ -1,38 +1,208 @@
 # extractors.py
 
+import io
+import os
 import re
+import sys
 import unicodedata
+import zipfile
+import xml.etree.ElementTree as ET
+from bisect import bisect_left, bisect_right
 from datetime import datetime
 from functools import lru_cache
-from typing import List, Tuple, Dict, Any, Optional
+from pathlib import Path
+from typing import Iterator, List, Tuple, Dict, Any, Optional
 
-import fitz  # PyMuPDF
-import docx
-from dateutil import parser as dparser
+from cancellation import checkpoint
+from metrics import stage
+from parse_cache import MISS, digest, get_parse_cache
 
 # ======================================================================
 # Text readers
 # ======================================================================
 
-def extract_text(path: str) -> str:
-    p = path.lower()
+# Bump whenever a change here alters what extract_text / extract_skills /
+# extract_resume_data return, so stale cached parses are never served.
+EXTRACTOR_VERSION = "3"
+
+
+def _doc_kind(name: Optional[str], raw=b"") -> str:
+    p = (name or "").lower()
     if p.endswith(".pdf"):
-        doc = fitz.open(path)
+        return "pdf"
+    if p.endswith(".docx"):
+        return "docx"
+    if p.endswith(".txt"):
+        return "txt"
+    # unknown or missing extension: sniff the content
+    head = bytes(raw[:4])
+    if head == b"%PDF":
+        return "pdf"
+    if head == b"PK\x03\x04":
+        return "docx"
+    return "txt"
+
+
+def _read_source(source) -> Tuple[bytes, Optional[str]]:
+    """Normalize a path, bytes-like or binary file-like object to (raw, name)."""
+    if isinstance(source, (str, os.PathLike)):
+        return Path(source).read_bytes(), os.fspath(source)
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source), None
+    if hasattr(source, "read"):
+        data = source.read()
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        src_name = getattr(source, "name", None)
+        return bytes(data), src_name if isinstance(src_name, str) else None
+    raise TypeError(f"extract_text: unsupported source type {type(source).__name__}")
+
+
+# ---------- Streaming DOCX reader ----------
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_MC_FALLBACK = "{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback"
+_DOCX_HEADER_RE = re.compile(r"word/header\d*\.xml")
+_DOCX_FOOTER_RE = re.compile(r"word/footer\d*\.xml")
+
+
+def _docx_part_lines(fh) -> Iterator[str]:
+    """
+    Stream one WordprocessingML part and yield one line per paragraph.
+    Table rows come out as a single line with cells joined by " | "
+    (paragraphs inside a cell are joined by spaces).
+    """
+    paras: List[List[str]] = []   # open paragraphs (text boxes can nest them)
+    cells: List[List[str]] = []   # open table cells -> their paragraph texts
+    rows: List[List[str]] = []    # open table rows -> their cell texts
+    skip = 0                      # inside mc:Fallback (duplicate of the main content)
+
+    for event, el in ET.iterparse(fh, events=("start", "end")):
+        tag = el.tag
+        if tag == _MC_FALLBACK:
+            skip += 1 if event == "start" else -1
+            continue
+        if skip:
+            if event == "end":
+                el.clear()
+            continue
+
+        if event == "start":
+            if tag == _W + "p":
+                paras.append([])
+            elif tag == _W + "tc":
+                cells.append([])
+            elif tag == _W + "tr":
+                rows.append([])
+            continue
+
+        if tag == _W + "t":
+            if paras:
+                paras[-1].append(el.text or "")
+        elif tag == _W + "tab":
+            if paras:
+                paras[-1].append("\t")
+        elif tag in (_W + "br", _W + "cr"):
+            if paras:
+                paras[-1].append("\n")
+        elif tag == _W + "p":
+            text = "".join(paras.pop())
+            if paras:
+                paras[-1].append(text)
+            elif cells:
+                cells[-1].append(text)
+            else:
+                yield text
+        elif tag == _W + "tc":
+            cell = " ".join(t.strip() for t in cells.pop() if t.strip())
+            if rows:
+                rows[-1].append(cell)
+        elif tag == _W + "tr":
+            line = " | ".join(c for c in rows.pop() if c)
+            if cells:
+                cells[-1].append(line)
+            elif line:
+                yield line
+        el.clear()
+
+
+def _docx_text(raw: bytes) -> str:
+    """
+    Text of a .docx without building a python-docx object model: headers,
+    then word/document.xml (paragraphs and table rows), then footers.
+    """
+    lines: List[str] = []
+    with zipfile.ZipFile(io.BytesIO(raw)) as zf:
+        names = zf.namelist()
+        headers = sorted(n for n in names if _DOCX_HEADER_RE.fullmatch(n))
+        footers = sorted(n for n in names if _DOCX_FOOTER_RE.fullmatch(n))
+        for group in (headers, ["word/document.xml"], footers):
+            seen = set()
+            for part in group:
+                if part not in names:
+                    continue
+                with zf.open(part) as fh:
+                    for ln in _docx_part_lines(fh):
+                        # the same header/footer is often repeated per section
+                        if part != "word/document.xml":
+                            if not ln.strip() or ln in seen:
+                                continue
+                            seen.add(ln)
+                        lines.append(ln)
+    return "\n".join(lines)
+
+
+def _text_from_bytes(raw: bytes, kind: str) -> str:
+    if kind == "pdf":
+        import fitz  # PyMuPDF
+        doc = fitz.open(stream=raw, filetype="pdf")
         try:
             return "\n".join(page.get_text("text") for page in doc)
         finally:
             doc.close()
-    if p.endswith(".docx"):
-        d = docx.Document(path)
-        return "\n".join(par.text for par in d.paragraphs)
-    with open(path, "r", encoding="utf-8", errors="ignore") as f:
-        return f.read()
+    if kind == "docx":
+        return _docx_text(raw)
+    # same newline handling as text-mode open()
+    return raw.decode("utf-8", errors="ignore").replace("\r\n", "\n").replace("\r", "\n")
+
+
+def extract_text(source, name: Optional[str] = None) -> str:
+    """
+    Extract plain text from a resume/JD. `source` may be a path, bytes,
+    bytearray, memoryview or a binary file-like object; in-memory sources are
+    parsed in memory without touching the filesystem. `name` (the original
+    filename) picks the format; without it the content is sniffed.
+    """
+    checkpoint()
+    with stage("extract_text"):
+        raw, src_name = _read_source(source)
+        kind = _doc_kind(name or src_name, raw)
+        key = f"text:{EXTRACTOR_VERSION}:{kind}:{digest(raw)}"
+        return get_parse_cache().get_or_compute(key, lambda: _text_from_bytes(raw, kind))
 
 
 # ======================================================================
 # Skill extraction (SkillNer first, then morphology-only fallback)
 # ======================================================================
 
+def _import_skillner_params() -> None:
+    """
+    skillNer.general_params loads its skill DB and token table from the
+    working directory, downloading (and writing) them when missing. With
+    SKILLNER_DATA_DIR set (a prebuilt bundle, see artifacts.py) it is
+    imported from there instead, so nothing is fetched or written.
+    """
+    data_dir = os.getenv("SKILLNER_DATA_DIR")
+    if not data_dir or "skillNer.general_params" in sys.modules:
+        return
+    previous = os.getcwd()
+    os.chdir(data_dir)
+    try:
+        import skillNer.general_params  # noqa: F401
+    finally:
+        os.chdir(previous)
+
+
 @lru_cache(maxsize=1)
 def _lazy_skill_extractor():
     """
@@ -41,6 +211,7 @@ def _lazy_skill_extractor():
     """
     import spacy
     from spacy.matcher import PhraseMatcher
+    _import_skillner_params()
     from skillNer.skill_extractor_class import SkillExtractor
     from skillNer.general_params import SKILL_DB
 
@@ -146,58 +317,84 @@ def _fallback_extract_skills(raw: str) -> List[str]:
 
 # ---------- Public skill API ----------
 
-def extract_skills(text: str) -> List[str]:
+def _cached_or_fast(full_key: str, fast_key: str, fast: bool, compute):
+    """
+    Full-quality entries are cached under full_key. In fast (load-shedding)
+    mode an existing full result is still used, but a missing one is only
+    computed the cheap way, under fast_key so it never stands in for it.
+    """
+    cache = get_parse_cache()
+    if not fast:
+        return cache.get_or_compute(full_key, lambda: compute(False))
+    hit = cache.get(full_key)
+    return hit if hit is not MISS else cache.get_or_compute(fast_key, lambda: compute(True))
+
+
+def extract_skills(text: str, fast: bool = False) -> List[str]:
     """
     Return a sorted list of unique skill names found in `text`.
     Tries SkillNer first (no manual list). Results then pass through a
     morphology-only filter. If SkillNer fails or yields very little, use a
     purely pattern-based fallback that also uses the same morphology-only filter.
+    fast=True skips SkillNer and uses only the fallback (degraded mode).
+    Results are cached by text hash (see parse_cache).
     """
+    checkpoint()
+    with stage("extract_skills"):
+        h = digest(text or "")
+        return _cached_or_fast(
+            f"skills:{EXTRACTOR_VERSION}:{h}", f"skills-fast:{EXTRACTOR_VERSION}:{h}", fast,
+            lambda fast_: _extract_skills_uncached(text, skillner=not fast_),
+        )
+
+
+def _extract_skills_uncached(text: str, skillner: bool = True) -> List[str]:
     cleaned = _normalize_for_skills(text)
     if not cleaned:
         return []
 
     found: set[str] = set()
 
-    # 1) Try SkillNer
-    try:
-        se = _lazy_skill_extractor()
-        for part in _chunk(cleaned, 5000):
-            try:
-                ann = se.annotate(part) or {}
-            except Exception:
-                continue
-            results = ann.get("results", {})
-            full_matches = results.get("full_matches") or []
-            ngram_scored = results.get("ngram_scored") or []
-            if isinstance(results, list):  # very old SkillNer API
-                full_matches = results
-
-            def _label(d: dict) -> str:
-                return (
-                    d.get("doc_node_value")
-                    or d.get("skill_name")
-                    or d.get("skill")
-                    or d.get("label")
-                    or ""
-                )
-
-            for it in full_matches:
-                s = _label(it).strip()
-                if s and _is_skill_like(s):
-                    found.add(s)
-            for it in ngram_scored:
+    # 1) Try SkillNer (unless skipped in degraded mode)
+    if skillner:
+        try:
+            se = _lazy_skill_extractor()
+            for part in _chunk(cleaned, 5000):
                 try:
-                    score = float(it.get("score", 0.0))
+                    ann = se.annotate(part) or {}
                 except Exception:
-                    score = 0.0
-                if score >= 0.85:
+                    continue
+                results = ann.get("results", {})
+                full_matches = results.get("full_matches") or []
+                ngram_scored = results.get("ngram_scored") or []
+                if isinstance(results, list):  # very old SkillNer API
+                    full_matches = results
+
+                def _label(d: dict) -> str:
+                    return (
+                        d.get("doc_node_value")
+                        or d.get("skill_name")
+                        or d.get("skill")
+                        or d.get("label")
+                        or ""
+                    )
+
+                for it in full_matches:
                     s = _label(it).strip()
                     if s and _is_skill_like(s):
                         found.add(s)
-    except Exception:
-        # ignore and try fallback below
-        pass
+                for it in ngram_scored:
+                    try:
+                        score = float(it.get("score", 0.0))
+                    except Exception:
+                        score = 0.0
+                    if score >= 0.85:
+                        s = _label(it).strip()
+                        if s and _is_skill_like(s):
+                            found.add(s)
+        except Exception:
+            # ignore and try fallback below
+            pass
 
     # 2) If SkillNer came up empty or too small, use morphology fallback too
     if len(found) == 0:
@@ -233,9 +430,12 @@ def normalize_skills(skills: List[str]) -> set:
 # Education / Experience periods + gaps
 # ======================================================================
 
+_ENTRY_BULLETS_RE = re.compile(r"[•\u2022\u2023\u25E6\u2043\u2219]")
+_WS_RE = re.compile(r"\s+")
+
 def clean_entry_name(s: str) -> str:
-    s = re.sub(r"[•\u2022\u2023\u25E6\u2043\u2219]", "", s or "")
-    s = re.sub(r"\s+", " ", s).strip(" -–—|\t")
+    s = _ENTRY_BULLETS_RE.sub("", s or "")
+    s = _WS_RE.sub(" ", s).strip(" -–—|\t")
     return s.strip()
 
 
@@ -255,16 +455,64 @@ SINGLE_RE = re.compile(rf"(?P<single>{MONTH_OR_SEASON_RE}\s+\d{{4}})", re.IGNORE
 
 SEASON_TO_MONTH = {"spring": 3, "summer": 6, "fall": 9, "autumn": 9, "winter": 12}
 
+# Every spelling MONTHS_RE accepts, mapped straight to its month number.
+MONTH_TO_NUM = {
+    name: num
+    for num, names in enumerate(
+        [
+            ("jan", "january"), ("feb", "february"), ("mar", "march"),
+            ("apr", "april"), ("may",), ("jun", "june"), ("jul", "july"),
+            ("aug", "august"), ("sep", "sept", "september"), ("oct", "october"),
+            ("nov", "november"), ("dec", "december"),
+        ],
+        start=1,
+    )
+    for name in names
+}
+
+_OPEN_END_RE = re.compile(r"(?i)present|current|now")
+_WORD_YEAR_RE = re.compile(r"([A-Za-z]+)\s+(\d{4})")
+_NUM_YEAR_RE = re.compile(r"(\d{1,2})[/-](\d{4})")
+_YEAR_RE = re.compile(r"\d{4}")
+
+
+def _fast_parse_date(s: str) -> Optional[datetime]:
+    """
+    Decode the DATE_TOKEN grammar (Month YYYY, Season YYYY, MM/YYYY, YYYY)
+    with table lookups. Returns None for anything outside that grammar, and
+    for years below 100 where dateutil applies its own century/time rules.
+    """
+    m = _WORD_YEAR_RE.fullmatch(s)
+    if m:
+        word, year = m.group(1).lower(), int(m.group(2))
+        month = MONTH_TO_NUM.get(word) or SEASON_TO_MONTH.get(word)
+        return datetime(year, month, 1) if month and year >= 100 else None
+    m = _NUM_YEAR_RE.fullmatch(s)
+    if m:
+        month, year = int(m.group(1)), int(m.group(2))
+        return datetime(year, month, 1) if 1 <= month <= 12 and year >= 100 else None
+    if _YEAR_RE.fullmatch(s):
+        year = int(s)
+        return datetime(year, 1, 1) if year >= 100 else None
+    return None
+
+
+@lru_cache(maxsize=4096)
 def _parse_date(s: str) -> Optional[datetime]:
     s = (s or "").strip()
     if not s:
         return None
-    if re.fullmatch(r"(?i)present|current|now", s):
+    if _OPEN_END_RE.fullmatch(s):
         return datetime(9999, 1, 1)
+    dt = _fast_parse_date(s)
+    if dt is not None:
+        return dt
     m = re.match(r"(?i)(spring|summer|fall|autumn|winter)\s+(\d{4})", s)
     if m:
         return datetime(int(m.group(2)), SEASON_TO_MONTH[m.group(1).lower()], 1)
+    # unknown shape: let dateutil have a go
     try:
+        from dateutil import parser as dparser
         dt = dparser.parse(s, default=datetime(1900, 1, 1), fuzzy=True, dayfirst=False)
         return dt.replace(day=1)
     except Exception:
@@ -289,87 +537,69 @@ def _split_degree_and_institution(line: str) -> Tuple[str, str]:
     return deg, inst
 
 
-# ---------- Helpers ----------
+# ---------- Line classification ----------
 
-def _find_nearest_index_above_first(
-    lines: List[str],
-    idx: int,
-    predicate,
-    window: int = 6,
-    exclude_predicates: List = None,
-    used: Optional[set] = None,
-) -> Optional[int]:
-    """Find nearest matching line preferring ABOVE the anchor."""
-    if exclude_predicates is None:
-        exclude_predicates = []
-    if used is None:
-        used = set()
-    n = len(lines)
-    for d in range(1, window + 1):
-        j = idx - d
-        if j < 0 or j in used:
-            continue
-        ln = lines[j].strip()
-        if not ln:
-            continue
-        if any(ex(ln) for ex in exclude_predicates):
-            continue
-        if predicate(ln):
-            return j
-    for d in range(1, window + 1):
-        j = idx + d
-        if j >= n or j in used:
-            continue
-        ln = lines[j].strip()
-        if not ln:
-            continue
-        if any(ex(ln) for ex in exclude_predicates):
-            continue
-        if predicate(ln):
-            return j
-    return None
+class _ClassifiedLines:
+    """
+    The label regexes for `mode` run exactly once per line, up front. Degree and
+    institution candidates are kept as sorted index lists so the nearest-
+    neighbour lookups below only touch actual candidates, not the whole window.
+    """
 
-def _find_institution_below_then_above(
-    lines: List[str],
-    deg_idx: int,
-    window: int = 6,
-) -> Optional[int]:
-    """For institutions, prefer the line(s) BELOW the degree, then above."""
-    n = len(lines)
-    # below first
-    for d in range(1, window + 1):
-        j = deg_idx + d
-        if j >= n:
-            break
-        ln = lines[j].strip()
-        if not ln:
-            continue
-        if _GPA_RE.search(ln):
-            continue
-        if _EDU_DEGREE_RE.search(ln):
-            continue
-        if _EDU_INSTITUTION_RE.search(ln):
-            return j
-    # then above
-    for d in range(1, window + 1):
-        j = deg_idx - d
-        if j < 0:
-            break
-        ln = lines[j].strip()
-        if not ln:
-            continue
-        if _GPA_RE.search(ln):
-            continue
-        if _EDU_DEGREE_RE.search(ln):
-            continue
-        if _EDU_INSTITUTION_RE.search(ln):
-            return j
-    return None
+    def __init__(self, lines: List[str], mode: str):
+        self.lines = lines
+        self.stripped = stripped = [(ln or "").strip() for ln in lines]
+        self.is_exp: List[bool] = []
+        self.degree_idxs: List[int] = []
+        self.inst_idxs: List[int] = []
+        if mode != "edu":
+            self.is_exp = [
+                bool(ln) and (_EXP_TITLE_RE.search(ln) is not None or _EXP_COMPANY_RE.search(ln) is not None)
+                for ln in stripped
+            ]
+            return
+        for i, ln in enumerate(stripped):
+            if not ln or _GPA_RE.search(ln):
+                continue
+            if _EDU_DEGREE_RE.search(ln):
+                self.degree_idxs.append(i)
+            elif _EDU_INSTITUTION_RE.search(ln):
+                self.inst_idxs.append(i)
+
+    def nearest_degree(self, idx: int, window: int = 6, used: Optional[set] = None) -> Optional[int]:
+        """Nearest unused degree line, preferring ABOVE the anchor."""
+        used = used or set()
+        idxs = self.degree_idxs
+        pos = bisect_left(idxs, idx)
+        for k in range(pos - 1, -1, -1):
+            j = idxs[k]
+            if j < idx - window:
+                break
+            if j not in used:
+                return j
+        for k in range(bisect_right(idxs, idx), len(idxs)):
+            j = idxs[k]
+            if j > idx + window:
+                break
+            if j not in used:
+                return j
+        return None
+
+    def institution_for(self, deg_idx: int, window: int = 6) -> Optional[int]:
+        """For institutions, prefer the line(s) BELOW the degree, then above."""
+        idxs = self.inst_idxs
+        k = bisect_right(idxs, deg_idx)
+        if k < len(idxs) and idxs[k] <= deg_idx + window:
+            return idxs[k]
+        k = bisect_left(idxs, deg_idx) - 1
+        if k >= 0 and idxs[k] >= deg_idx - window:
+            return idxs[k]
+        return None
 
 
 # ---------- Compose labels ----------
 
-def _compose_label_edu(lines: List[str], idx: int, before: str, after: str, used_deg: set) -> str:
+def _compose_label_edu(cl: _ClassifiedLines, idx: int, before: str, after: str, used_deg: set) -> str:
     cur = (before or after or "").strip()
     if _GPA_RE.search(cur):  # ignore GPA-only fragments
         cur = ""
@@ -383,24 +613,18 @@ def _compose_label_edu(lines: List[str], idx: int, before: str, after: str, used
         degree_text, institution_text = d, i
         deg_idx = idx
     else:
-        deg_idx = _find_nearest_index_above_first(
-            lines, idx,
-            lambda s: _EDU_DEGREE_RE.search(s) is not None,
-            window=6,
-            exclude_predicates=[lambda s: _GPA_RE.search(s) is not None],
-            used=used_deg,
-        )
+        deg_idx = cl.nearest_degree(idx, window=6, used=used_deg)
         if deg_idx is not None:
             used_deg.add(deg_idx)
-            d, i = _split_degree_and_institution(lines[deg_idx])
+            d, i = _split_degree_and_institution(cl.lines[deg_idx])
             degree_text = d
             institution_text = i or ""
 
     # Institution: prefer below the degree line, then above
     if degree_text and not institution_text and deg_idx is not None:
-        inst_idx = _find_institution_below_then_above(lines, deg_idx, window=6)
+        inst_idx = cl.institution_for(deg_idx, window=6)
         if inst_idx is not None:
-            institution_text = clean_entry_name(lines[inst_idx])
+            institution_text = clean_entry_name(cl.lines[inst_idx])
 
     label = (
         f"{degree_text} | {institution_text}"
@@ -410,7 +634,7 @@ def _compose_label_edu(lines: List[str], idx: int, before: str, after: str, used
     return clean_entry_name(label) or "Education"
 
 
-def _compose_label_exp(lines: List[str], idx: int, before: str, after: str) -> str:
+def _compose_label_exp(cl: _ClassifiedLines, idx: int, before: str, after: str) -> str:
     cand = (before or after or "").strip()
     picks: List[str] = []
 
@@ -423,14 +647,11 @@ def _compose_label_exp(lines: List[str], idx: int, before: str, after: str) -> s
         add(cand)
 
     for j in range(idx - 1, max(-1, idx - 3), -1):
-        ln = (lines[j] if j >= 0 else "").strip()
-        if _EXP_TITLE_RE.search(ln) or _EXP_COMPANY_RE.search(ln):
-            add(ln)
+        if cl.is_exp[j]:
+            add(cl.stripped[j])
 
-    if idx + 1 < len(lines):
-        ln = lines[idx + 1].strip()
-        if _EXP_TITLE_RE.search(ln) or _EXP_COMPANY_RE.search(ln):
-            add(ln)
+    if idx + 1 < len(cl.lines) and cl.is_exp[idx + 1]:
+        add(cl.stripped[idx + 1])
 
     if picks:
         if len(picks) >= 2:
@@ -447,10 +668,17 @@ def extract_periods(lines: List[str], mode: str = "generic") -> List[Tuple[str,
     if not lines:
         return periods
 
+    cl = _ClassifiedLines(lines, mode)
     used_degree_idxs: set = set()
 
+    def label(idx: int, before: str, after: str) -> str:
+        if mode == "edu":
+            return _compose_label_edu(cl, idx, before, after, used_degree_idxs)
+        return _compose_label_exp(cl, idx, before, after)
+
     for idx, line in enumerate(lines):
-        if not (line and line.strip()):
+        # every date token carries a 4-digit year
+        if not (line and _YEAR_RE.search(line)):
             continue
 
         ranges = list(RANGE_RE.finditer(line))
@@ -462,11 +690,7 @@ def extract_periods(lines: List[str], mode: str = "generic") -> List[Tuple[str,
                     continue
                 before = line[:m.span()[0]].strip()
                 after = line[m.span()[1]:].strip()
-                entry = (
-                    _compose_label_edu(lines, idx, before, after, used_degree_idxs)
-                    if mode == "edu" else
-                    _compose_label_exp(lines, idx, before, after)
-                )
+                entry = label(idx, before, after)
                 periods.append((clean_entry_name(entry) or "Experience", start, end))
             continue
 
@@ -476,11 +700,7 @@ def extract_periods(lines: List[str], mode: str = "generic") -> List[Tuple[str,
             if start:
                 before = line[:s.span()[0]].strip()
                 after = line[s.span()[1]:].strip()
-                entry = (
-                    _compose_label_edu(lines, idx, before, after, used_degree_idxs)
-                    if mode == "edu" else
-                    _compose_label_exp(lines, idx, before, after)
-                )
+                entry = label(idx, before, after)
                 periods.append((clean_entry_name(entry) or "Experience", start, datetime(9999, 1, 1)))
 
     seen, uniq = set(), []
@@ -554,14 +774,44 @@ def is_education_institution(s: str) -> bool:
         s,
     ))
 
-def extract_resume_data(text: str):
+def extract_resume_data(text: str, fast_skills: bool = False):
     """
     High-level parser: splits sections, extracts skills, education & experience
     periods, computes gaps, and the education-to-first-job gap.
+    fast_skills=True extracts skills without SkillNer (see extract_skills).
+    Results are cached by text hash (see parse_cache).
     """
-    sections = _split_sections(text)
-    skills = extract_skills(text)
+    checkpoint()
+    with stage("extract_resume_data"):
+        h = digest(text or "")
+        return _cached_or_fast(
+            f"resume:{EXTRACTOR_VERSION}:{h}", f"resume-fast:{EXTRACTOR_VERSION}:{h}", fast_skills,
+            lambda fast_: _extract_resume_data_uncached(text, fast_),
+        )
+
 
+def _extract_resume_data_uncached(text: str, fast_skills: bool = False):
+    skills = extract_skills(text, fast=fast_skills)
+    checkpoint()
+    return (skills, *extract_resume_periods(text))
+
+
+def extract_resume_periods(text: str):
+    """
+    The date half of extract_resume_data, which does not need the skills:
+    (education periods, experience periods, education gaps, experience
+    gaps, education-to-first-job gap). Cached by text hash.
+    """
+    checkpoint()
+    with stage("extract_resume_periods"):
+        h = digest(text or "")
+        return get_parse_cache().get_or_compute(
+            f"periods:{EXTRACTOR_VERSION}:{h}", lambda: _extract_resume_periods_uncached(text)
+        )
+
+
+def _extract_resume_periods_uncached(text: str):
+    sections = _split_sections(text)
     edu_lines = list(sections.get("education", []))
     edu_lines += [ln for ln in sections.get("misc", []) if is_education_institution(ln)]
     edu = extract_periods(edu_lines, mode="edu")
@@ -573,19 +823,12 @@ def extract_resume_data(text: str):
     )
     if not exp_lines:
         all_lines = [ln for ln in text.splitlines() if ln.strip()]
-        exp_lines = [ln for ln in all_lines if ln not in edu_lines]
+        edu_set = set(edu_lines)
+        exp_lines = [ln for ln in all_lines if ln not in edu_set]
     exp = extract_periods(exp_lines, mode="exp")
 
     gaps_edu = calculate_gaps(edu)
     gaps_exp = calculate_gaps(exp)
     edu_to_exp = education_to_first_job_gap(edu, exp)
 
-    return skills, edu, exp, gaps_edu, gaps_exp, edu_to_exp
-_DEGREE_WORD_RE = re.compile(
-    r"(?i)\b(master|bachelor|b\.?e|b\.?tech|m\.?s|m\.?sc|m\.?tech|bsc|msc|mca|bca|mba|phd|doctor|ms|bs|be|me|mtech|btech)\b"
-)   
-
-from fastapi import FastAPI, File, UploadFile, Form
-
-app = FastAPI() 
-from extractors import extract_text, extract_resume_data, normalize_skills
+    return edu, exp, gaps_edu, gaps_exp, edu_to_exp
@@ -0,0 +1,41 @@
+# gunicorn.conf.py
+#
+#   gunicorn -c gunicorn.conf.py app_main:app
+#
+# The master imports app_main once with PRELOAD_MODELS=1, which loads SBERT,
+# both spaCy pipelines, SkillNer and the memory-mapped JD store before any
+# worker is forked. Workers share those pages copy-on-write and run matching
+# on a thread inside themselves (MATCH_EXECUTOR=thread) instead of spawning
+# their own process pool, which would load private copies of every model.
+# Measure the effect with benchmarks/measure_worker_rss.py.
+#
+# Each worker sizes its torch/tokenizers thread pools to its share of the
+# cores after forking (see cpu_layout.py; CPU_AFFINITY=1 also pins it).
+# Find the best WEB_CONCURRENCY x threads split with
+# benchmarks/bench_cpu_layout.py.
+
+import os
+
+os.environ.setdefault("PRELOAD_MODELS", "1")
+os.environ.setdefault("MATCH_EXECUTOR", "thread")
+os.environ.setdefault("MATCH_WORKERS", "1")
+os.environ.setdefault("WEB_CONCURRENCY", "2")
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.environ["WEB_CONCURRENCY"])
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+
+
+def pre_fork(server, worker):
+    # in the master: the lowest CPU slot no live worker holds, so a worker
+    # replacing a dead one takes over its cores instead of doubling up
+    taken = {getattr(w, "cpu_slot", None) for w in server.WORKERS.values()}
+    worker.cpu_slot = next(slot for slot in range(len(taken) + 1) if slot not in taken)
+
+
+def post_fork(server, worker):
+    from cpu_layout import configure
+    configure(slot=worker.cpu_slot)
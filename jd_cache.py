@@ -1,58 +1,165 @@
 from pathlib import Path
-from typing import Dict, List, Tuple
-import os, tempfile
+from typing import Dict, List, Optional, Tuple, Union
+import json, os
 
-import fitz  # PyMuPDF
-import docx2txt
-
-from extractors import extract_text, extract_skills
+from extractors import extract_text, extract_skills, EXTRACTOR_VERSION
+from metrics import stage
+from cancellation import CancelToken, checkpoint, using
+from parse_cache import digest
+from singleflight import IN_FLIGHT
 from functools import lru_cache
 
+APP_DIR = Path(__file__).resolve().parent
+DEFAULT_JD_DIR = APP_DIR / "Dummy_data" / "JDS"
+DEFAULT_JD_CACHE_PATH = APP_DIR / "_cache" / "jd_cache.json"
+# shipped with the repo and only ever read: seeds DEFAULT_JD_CACHE_PATH
+SEED_JD_CACHE_PATH = APP_DIR / "Dummy_data" / "jd_cache.json"
+
 @lru_cache(maxsize=1)
-def _sbert():
+def get_sbert():
+    """
+    The process's one SentenceTransformer, for JDs here and resumes in
+    matcher, so a preloaded model (workers.preload_for_fork) is the only copy.
+    """
     from sentence_transformers import SentenceTransformer
     return SentenceTransformer("all-MiniLM-L6-v2")
 
-def build_jd_cache(jd_dir: str, cache_path: str) -> Dict[str, dict]:
+def skills_variant(fields=None, mode: str = "full") -> str:
+    """
+    How JD skills are extracted for a request: "full" (SkillNer), "fast"
+    (the fast_skills quality mode) or "none" (embedding_only, or `fields`
+    without "skills"). `fields` are parsed output groups, None for all.
+    """
+    if mode == "embedding_only" or not (fields is None or "skills" in fields):
+        return "none"
+    return "fast" if mode == "fast_skills" else "full"
+
+def _jd_entry(name: str, raw: Union[bytes, str], fields=None, mode: str = "full") -> dict:
+    """
+    Cache entry for one JD, computing only what `fields` and the quality
+    `mode` need (see skills_variant); without skills it has no "skills" key.
+    """
+    if isinstance(raw, (str, os.PathLike)):     # upload spooled to disk
+        raw = Path(raw).read_bytes()
+    skills = skills_variant(fields, mode)
+    # the same JD uploaded by concurrent requests is extracted and encoded once;
+    # an entry with fewer or cheaper skills never reaches a caller wanting more
+    sha = digest(raw)
+    return IN_FLIGHT.do(f"jd:{Path(name).suffix.lower()}:{sha}:{skills}",
+                        lambda: _build_jd_entry(name, raw, sha, skills))
+
+def _build_jd_entry(name: str, raw: bytes, sha: str, skills: str = "full") -> dict:
+    text = extract_text(raw, name=name)
+    entry = {"text": text}
+    if skills != "none":
+        entry["skills"] = extract_skills(text, fast=skills == "fast") or []
+    with stage("sbert_encode"):
+        emb = get_sbert().encode(text).tolist()
+    return {**entry, "embedding": emb, "sha256": sha, "version": EXTRACTOR_VERSION}
+
+def _write_json_atomic(path: Path, data) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + f".{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(data), encoding="utf-8")
+    os.replace(tmp, path)
+
+def build_jd_cache(jd_dir: str, cache_path: str, previous: Optional[Dict[str, dict]] = None) -> Dict[str, dict]:
+    """
+    Embed every JD under jd_dir and persist the result to cache_path.
+    Entries from `previous` whose file hash and extractor version still match
+    are reused as-is, so only new or edited JDs go through SkillNer/SBERT.
+    """
     jd_dir = Path(jd_dir)
+    previous = previous or {}
     cache: Dict[str, dict] = {}
     for p in jd_dir.glob("**/*"):
         if not p.is_file(): continue
         if p.suffix.lower() not in {".txt", ".pdf", ".docx"}: continue
         try:
-            text = extract_text(str(p))
-            skills = extract_skills(text) or []
-            emb = _sbert().encode(text, convert_to_tensor=True).tolist()
-            cache[p.name] = {"text": text, "skills": skills, "embedding": emb}
+            raw = p.read_bytes()
+            old = previous.get(p.name) or {}
+            if old.get("sha256") == digest(raw) and old.get("version") == EXTRACTOR_VERSION and old.get("embedding"):
+                cache[p.name] = old
+                continue
+            cache[p.name] = _jd_entry(p.name, raw)
         except Exception:
             continue
-    Path(cache_path).parent.mkdir(parents=True, exist_ok=True)
-    Path(cache_path).write_text("{}")
+    if cache != previous or not Path(cache_path).is_file():
+        _write_json_atomic(Path(cache_path), cache)
     return cache
 
-def load_or_build_jd_cache(jd_dir: str, cache_path: str) -> Dict[str, dict]:
-    return build_jd_cache(jd_dir, cache_path)
-
-def _text_from_bytes(name: str, raw: bytes) -> str:
-    ext = name.lower().rsplit(".", 1)[-1]
-    if ext == "pdf":
-        with fitz.open(stream=raw, filetype="pdf") as doc:
-            return "\n".join(page.get_text("text") for page in doc)
-    if ext == "docx":
-        with tempfile.NamedTemporaryFile(suffix=".docx", delete=False) as tmp:
-            tmp.write(raw); tmp.flush(); path = tmp.name
-        try:
-            return docx2txt.process(path) or ""
-        finally:
-            try: os.remove(path)
-            except Exception: pass
-    return raw.decode("utf-8", errors="ignore")
+def _read_cache(path) -> Dict[str, dict]:
+    try:
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+def load_or_build_jd_cache(jd_dir: str, cache_path: str, seed_path: Optional[str] = None) -> Dict[str, dict]:
+    """
+    Load the persisted JD cache and bring it up to date with jd_dir. Until
+    cache_path exists, the still-current entries of `seed_path` are reused.
+    """
+    previous = _read_cache(cache_path)
+    if not previous and seed_path:
+        previous = _read_cache(seed_path)
+    return build_jd_cache(jd_dir, cache_path, previous)
+
+def mmap_embeddings(cache: Dict[str, dict], npy_path: str) -> Dict[str, dict]:
+    """
+    Move the JD embeddings into one float32 matrix on disk and hand back
+    entries whose "embedding" is a row of a read-only memory map. Processes
+    mapping the same file share those pages through the OS page cache, and
+    forked workers never copy them (no refcounts live inside the buffer).
+    """
+    import numpy as np
+
+    names = [n for n, e in cache.items() if e.get("embedding") is not None and len(e["embedding"])]
+    if not names:
+        return cache
+    matrix = np.asarray([cache[n]["embedding"] for n in names], dtype=np.float32)
+    path = Path(npy_path)
+    try:
+        current = np.load(path, mmap_mode="r")
+        stale = current.shape != matrix.shape or not np.array_equal(current, matrix)
+    except (OSError, ValueError):
+        stale = True
+    if stale:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.stem}.{os.getpid()}.tmp.npy")
+        np.save(tmp, matrix)
+        os.replace(tmp, path)
+    mm = np.load(path, mmap_mode="r")
+    out = dict(cache)
+    for i, n in enumerate(names):
+        out[n] = {**cache[n], "embedding": mm[i]}
+    return out
+
+def default_jd_cache_path() -> Path:
+    """JD_CACHE_PATH (e.g. a prebuilt artifact bundle, see artifacts.py) or _cache/jd_cache.json (untracked)."""
+    return Path(os.getenv("JD_CACHE_PATH") or DEFAULT_JD_CACHE_PATH)
+
+@lru_cache(maxsize=1)
+def default_jd_cache() -> Dict[str, dict]:
+    """JD set used when a request uploads none; built once per process."""
+    cache_path = default_jd_cache_path()
+    try:
+        cache = load_or_build_jd_cache(jd_dir=str(DEFAULT_JD_DIR), cache_path=str(cache_path),
+                                       seed_path=str(SEED_JD_CACHE_PATH))
+        return mmap_embeddings(cache, str(cache_path.with_suffix(".embeddings.npy")))
+    except OSError as e:
+        raise RuntimeError(
+            f"default JD cache {cache_path} cannot be written ({e}); set JD_CACHE_PATH to a writable "
+            f"file or ship a prebuilt bundle (python artifacts.py build)"
+        ) from e
 
-def build_jd_cache_from_uploads(named_bytes: List[Tuple[str, bytes]]) -> Dict[str, dict]:
+def build_jd_cache_from_uploads(named_bytes: List[Tuple[str, Union[bytes, str]]],
+                                cancel: Optional[CancelToken] = None, fields=None,
+                                mode: str = "full") -> Dict[str, dict]:
+    """JD cache for uploaded JDs, computing only what `fields` and `mode` need (see _jd_entry)."""
     cache: Dict[str, dict] = {}
-    for name, raw in named_bytes:
-        text = _text_from_bytes(name, raw)
-        skills = extract_skills(text) or []
-        emb = _sbert().encode(text, convert_to_tensor=True).tolist()
-        cache[name] = {"text": text, "skills": skills, "embedding": emb}
+    with using(cancel):
+        for name, raw in named_bytes:
+            checkpoint()
+            cache[name] = _jd_entry(name, raw, fields, mode)
     return cache
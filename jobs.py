@@ -0,0 +1,397 @@
+# jobs.py
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from admission import current_client, current_priority
+from workers import PoolSaturated
+
+log = logging.getLogger(__name__)
+
+APP_DIR = Path(__file__).resolve().parent
+
+# job status: queued -> running -> done | failed | cancelled
+TERMINAL = ("done", "failed", "cancelled")
+
+
+class JobStore:
+    """
+    SQLite-backed screening jobs. A job is a JD set plus N resumes; every
+    resume is an item whose result is written as soon as it is scored, so a
+    restarted process resumes a job from its first unfinished item.
+    Upload bodies are stored with the job, so it survives without them.
+
+    Every web worker runs a JobRunner on the same file, so a job is claimed
+    before it runs: its owner holds a lease of `lease` seconds, renewed while
+    it works, and a running job is only taken over once that lease expired.
+    """
+
+    def __init__(self, path: str, lease: float = 60.0):
+        self.path = path
+        self.lease = lease
+        self._owner_id = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._conn_pid: Optional[int] = None
+
+    def _db(self) -> sqlite3.Connection:
+        # connections must not cross a fork; reopen in each process
+        if self._conn is None or self._conn_pid != os.getpid():
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY, status TEXT NOT NULL, total INTEGER NOT NULL,"
+                " created REAL NOT NULL, updated REAL NOT NULL, error TEXT, owner TEXT, lease_until REAL);"
+                "CREATE TABLE IF NOT EXISTS job_jds ("
+                " job_id TEXT NOT NULL, name TEXT NOT NULL, body BLOB NOT NULL);"
+                "CREATE TABLE IF NOT EXISTS job_items ("
+                " job_id TEXT NOT NULL, idx INTEGER NOT NULL, name TEXT NOT NULL, body BLOB,"
+                " status TEXT NOT NULL, result TEXT, error TEXT, seq INTEGER,"
+                " PRIMARY KEY (job_id, idx));"
+                "CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, created);"
+            )
+            # job files written before leases existed
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column, kind in (("owner", "TEXT"), ("lease_until", "REAL")):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+            conn.commit()
+            self._conn, self._conn_pid = conn, os.getpid()
+        return self._conn
+
+    @property
+    def owner(self) -> str:
+        # per process: children forked from one store must not share a lease
+        return f"{self._owner_id}:{os.getpid()}"
+
+    # ---------- writes ----------
+
+    def submit(self, resumes: List[Tuple[str, bytes]], jds: List[Tuple[str, bytes]]) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            with db:
+                db.execute(
+                    "INSERT INTO jobs (id, status, total, created, updated) VALUES (?, 'queued', ?, ?, ?)",
+                    (job_id, len(resumes), now, now),
+                )
+                db.executemany("INSERT INTO job_jds (job_id, name, body) VALUES (?, ?, ?)",
+                               [(job_id, n, b) for n, b in jds])
+                db.executemany(
+                    "INSERT INTO job_items (job_id, idx, name, body, status) VALUES (?, ?, ?, ?, 'pending')",
+                    [(job_id, i, n, b) for i, (n, b) in enumerate(resumes)],
+                )
+        return job_id
+
+    def set_status(self, job_id: str, status: str, error: Optional[str] = None) -> None:
+        with self._lock:
+            db = self._db()
+            with db:
+                db.execute("UPDATE jobs SET status = ?, error = ?, updated = ? WHERE id = ?",
+                           (status, error, time.time(), job_id))
+
+    def claim_job(self, job_id: Optional[str] = None) -> Optional[str]:
+        """
+        Claim the oldest queued job (or `job_id`) for this store's owner and
+        return its id; None if there is none. A running job is claimable
+        only by its owner or once its lease expired, i.e. its process died.
+        """
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            with db:
+                db.execute("BEGIN IMMEDIATE")       # one claimer at a time across processes
+                row = db.execute(
+                    "UPDATE jobs SET status = 'running', owner = ?, lease_until = ?, updated = ?"
+                    " WHERE id = (SELECT id FROM jobs WHERE (status = 'queued' OR (status = 'running'"
+                    " AND (owner = ? OR COALESCE(lease_until, 0) < ?))) AND (? IS NULL OR id = ?)"
+                    " ORDER BY created LIMIT 1) RETURNING id",
+                    (self.owner, now + self.lease, now, self.owner, now, job_id, job_id),
+                ).fetchone()
+        return row[0] if row else None
+
+    def renew(self, job_id: str) -> bool:
+        """Extend this owner's lease on a running job; False if it no longer holds it."""
+        with self._lock:
+            db = self._db()
+            with db:
+                cur = db.execute(
+                    "UPDATE jobs SET lease_until = ? WHERE id = ? AND owner = ? AND status = 'running'",
+                    (time.time() + self.lease, job_id, self.owner),
+                )
+        return cur.rowcount > 0
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Mark a queued/running job cancelled and drop the upload bodies it no
+        longer needs; False if unknown or already finished.
+        """
+        with self._lock:
+            db = self._db()
+            with db:
+                cur = db.execute(
+                    "UPDATE jobs SET status = 'cancelled', updated = ? WHERE id = ? AND status IN ('queued', 'running')",
+                    (time.time(), job_id),
+                )
+                if cur.rowcount:
+                    db.execute("UPDATE job_items SET body = NULL WHERE job_id = ? AND status = 'pending'", (job_id,))
+                    db.execute("DELETE FROM job_jds WHERE job_id = ?", (job_id,))
+        return cur.rowcount > 0
+
+    def sweep(self, max_age: float) -> int:
+        """Delete finished, failed and cancelled jobs not updated for `max_age` seconds; returns the count."""
+        cutoff = time.time() - max_age
+        with self._lock:
+            db = self._db()
+            with db:
+                ids = [r[0] for r in db.execute(
+                    "SELECT id FROM jobs WHERE status IN (%s) AND updated < ?" % ",".join("?" * len(TERMINAL)),
+                    (*TERMINAL, cutoff),
+                )]
+                for table, column in (("job_items", "job_id"), ("job_jds", "job_id"), ("jobs", "id")):
+                    db.executemany(f"DELETE FROM {table} WHERE {column} = ?", [(i,) for i in ids])
+        return len(ids)
+
+    def checkpoint(self, job_id: str, idx: int, result: Any = None, error: Optional[str] = None) -> None:
+        """Persist one finished item; its body is dropped since it is no longer needed."""
+        with self._lock:
+            db = self._db()
+            with db:
+                # seq numbers items in completion order, for resumable result streams
+                db.execute(
+                    "UPDATE job_items SET status = ?, result = ?, error = ?, body = NULL,"
+                    " seq = (SELECT COALESCE(MAX(seq), 0) + 1 FROM job_items WHERE job_id = ?)"
+                    " WHERE job_id = ? AND idx = ?",
+                    ("error" if error else "done", None if error else json.dumps(result, default=str),
+                     error, job_id, job_id, idx),
+                )
+                now = time.time()
+                db.execute(
+                    "UPDATE jobs SET updated = ?,"
+                    " lease_until = CASE WHEN owner = ? THEN ? ELSE lease_until END WHERE id = ?",
+                    (now, self.owner, now + self.lease, job_id),
+                )
+
+    # ---------- reads ----------
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            db = self._db()
+            row = db.execute("SELECT id, status, total, created, updated, error FROM jobs WHERE id = ?",
+                             (job_id,)).fetchone()
+            if row is None:
+                return None
+            counts = dict(db.execute("SELECT status, COUNT(*) FROM job_items WHERE job_id = ? GROUP BY status",
+                                     (job_id,)).fetchall())
+        return {
+            "job_id": row[0], "status": row[1], "total": row[2], "created": row[3], "updated": row[4],
+            "error": row[5], "completed": counts.get("done", 0) + counts.get("error", 0),
+            "failed_items": counts.get("error", 0),
+        }
+
+    def jds(self, job_id: str) -> List[Tuple[str, bytes]]:
+        with self._lock:
+            return [(n, bytes(b)) for n, b in self._db().execute(
+                "SELECT name, body FROM job_jds WHERE job_id = ? ORDER BY rowid", (job_id,))]
+
+    def pending_items(self, job_id: str) -> List[Tuple[int, str]]:
+        """(idx, name) of the unfinished items; load each body with item_body() when it runs."""
+        with self._lock:
+            return self._db().execute(
+                "SELECT idx, name FROM job_items WHERE job_id = ? AND status = 'pending' ORDER BY idx",
+                (job_id,)).fetchall()
+
+    def item_body(self, job_id: str, idx: int) -> Optional[bytes]:
+        with self._lock:
+            row = self._db().execute(
+                "SELECT body FROM job_items WHERE job_id = ? AND idx = ?", (job_id, idx)).fetchone()
+        return bytes(row[0]) if row and row[0] is not None else None
+
+    def results(self, job_id: str, after: int = 0, limit: int = -1) -> Iterator[Dict[str, Any]]:
+        """Finished items in completion order, at most `limit`; pass the last `seq` seen to resume."""
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT seq, idx, name, status, result, error FROM job_items"
+                " WHERE job_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+                (job_id, after, limit),
+            ).fetchall()
+        for seq, idx, name, status, result, error in rows:
+            item = {"seq": seq, "index": idx, "resume_file": name}
+            if status == "done":
+                item["matches"] = json.loads(result)
+            else:
+                item["error"] = error
+            yield item
+
+
+class _JobCancelled(Exception):
+    pass
+
+
+class JobRunner:
+    """
+    Background task that works through the job queue one job at a time,
+    running up to pool.workers resumes of it at once on the shared MatchPool.
+    Jobs yield to interactive traffic: on PoolSaturated they back off for the
+    pool's Retry-After (at most `max_backoff` seconds) instead of failing.
+    Resume bodies are loaded one at a time as they start, and store calls
+    run in a thread, off the event loop. A job runs only while this runner
+    holds its lease (see JobStore.claim_job), renewed every lease / 3. Jobs finished more than
+    `retention` seconds ago (JOBS_RETENTION_HOURS, default 24) are deleted.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        get_pool: Callable[[], Any],
+        match_fn: Optional[Callable] = None,
+        build_jds_fn: Optional[Callable] = None,
+        max_backoff: float = 10.0,
+        retention: Optional[float] = None,
+    ):
+        self.store = store
+        self.get_pool = get_pool
+        self.match_fn = match_fn
+        self.build_jds_fn = build_jds_fn
+        self.max_backoff = max_backoff
+        self.retention = retention if retention is not None else float(os.getenv("JOBS_RETENTION_HOURS", "24")) * 3600
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._swept = 0.0
+
+    def _fns(self):
+        if self.match_fn is None or self.build_jds_fn is None:
+            from matcher import match_uploads
+            from jd_cache import build_jd_cache_from_uploads
+            self.match_fn = self.match_fn or match_uploads
+            self.build_jds_fn = self.build_jds_fn or build_jd_cache_from_uploads
+        return self.match_fn, self.build_jds_fn
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def notify(self) -> None:
+        self._wake.set()
+
+    async def _loop(self) -> None:
+        # everything this task puts on the pool is background work
+        current_client.set("jobs")
+        current_priority.set("batch")
+        while True:
+            await self._sweep()
+            job_id = await asyncio.to_thread(self.store.claim_job)
+            if job_id is None:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=30)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self.run_job(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.exception("job %s failed", job_id)
+                await asyncio.to_thread(self.store.set_status, job_id, "failed", str(e))
+
+    async def _sweep(self) -> None:
+        # at most once an hour
+        if self.retention > 0 and time.monotonic() - self._swept > 3600:
+            self._swept = time.monotonic()
+            removed = await asyncio.to_thread(self.store.sweep, self.retention)
+            if removed:
+                log.info("deleted %d finished jobs older than %.0fh", removed, self.retention / 3600)
+
+    async def _on_pool(self, job_id: str, fn, *args):
+        """Run fn on the pool, waiting out PoolSaturated; _JobCancelled once the job is cancelled."""
+        while True:
+            try:
+                return await self.get_pool().run(fn, *args)
+            except PoolSaturated as e:
+                if await self._cancelled(job_id):
+                    raise _JobCancelled(job_id)
+                await asyncio.sleep(min(e.retry_after, self.max_backoff))
+
+    async def _cancelled(self, job_id: str) -> bool:
+        job = await asyncio.to_thread(self.store.get, job_id)
+        return job is None or job["status"] == "cancelled"
+
+    async def _keep_lease(self, job_id: str) -> None:
+        while True:
+            await asyncio.sleep(self.store.lease / 3)
+            if not await asyncio.to_thread(self.store.renew, job_id):
+                log.warning("job %s: lease lost", job_id)
+                return
+
+    async def run_job(self, job_id: str) -> None:
+        # cancelled, finished or held by a live runner elsewhere: not ours to run
+        if await asyncio.to_thread(self.store.claim_job, job_id) is None:
+            return
+        lease = asyncio.create_task(self._keep_lease(job_id))
+        try:
+            await self._run_claimed(job_id)
+        finally:
+            lease.cancel()
+
+    async def _run_claimed(self, job_id: str) -> None:
+        match_fn, build_jds_fn = self._fns()
+        jds = await asyncio.to_thread(self.store.jds, job_id)
+        try:
+            jd_cache = await self._on_pool(job_id, build_jds_fn, jds) if jds else None
+        except _JobCancelled:
+            return
+        items = await asyncio.to_thread(self.store.pending_items, job_id)
+        slots = asyncio.Semaphore(self.get_pool().workers)
+
+        async def one(idx: int, name: str) -> None:
+            async with slots:
+                if await self._cancelled(job_id):
+                    return
+                body = await asyncio.to_thread(self.store.item_body, job_id, idx)
+                if body is None:
+                    return
+                try:
+                    matches = await self._on_pool(job_id, match_fn, body, name, None, jd_cache)
+                except _JobCancelled:
+                    return
+                except Exception as e:
+                    await asyncio.to_thread(self.store.checkpoint, job_id, idx, error=str(e))
+                else:
+                    await asyncio.to_thread(self.store.checkpoint, job_id, idx, result=matches)
+
+        await asyncio.gather(*(one(*item) for item in items))
+        if not await self._cancelled(job_id):
+            await asyncio.to_thread(self.store.set_status, job_id, "done")
+            log.info("job %s finished (%d items this run)", job_id, len(items))
+
+
+@lru_cache(maxsize=1)
+def get_job_store() -> JobStore:
+    """
+    Process-wide job store configured from the environment:
+      JOBS_DB   SQLite file for the job queue (default _jobs/jobs.sqlite3)
+    """
+    return JobStore(os.getenv("JOBS_DB") or str(APP_DIR / "_jobs" / "jobs.sqlite3"))
@@ -0,0 +1,68 @@
+# load_shedding.py
+
+import os
+from typing import Optional, Sequence
+
+from metrics import REGISTRY
+
+# quality ladder, best first; each rung also drops what the ones above dropped
+#   full            everything
+#   no_location     skip spaCy location for the resume and every JD
+#   fast_skills     + morphology-only skill extraction instead of SkillNer
+#   embedding_only  + no skills, periods or gaps: SBERT similarity only
+# Uploaded JDs are built at the same rung (see jd_cache.skills_variant).
+# Shedding under load is opt-in (QUALITY_SHEDDING=1); otherwise a request
+# only gets a cheaper rung when it asks for one (X-Quality-Mode).
+QUALITY_MODES = ("full", "no_location", "fast_skills", "embedding_only")
+
+MODE_SELECTED = REGISTRY.counter("match_quality_mode_total", "Match requests served per quality mode", ["mode"])
+PRESSURE = REGISTRY.gauge("match_pressure", "Load pressure seen by the last quality-mode decision (0..1+)")
+
+
+def _thresholds() -> Sequence[float]:
+    """QUALITY_THRESHOLDS: pressure at which each degraded rung starts (default "0.8,0.9,1.0")."""
+    try:
+        values = [float(v) for v in os.getenv("QUALITY_THRESHOLDS", "0.8,0.9,1.0").split(",")]
+    except ValueError:
+        values = [0.8, 0.9, 1.0]
+    return (values + [float("inf")] * 3)[:3]
+
+
+def _cpu_pressure(psi_path: str = "/sys/fs/cgroup/cpu.pressure") -> float:
+    """
+    CPU pressure of this container: the cgroup v2 PSI "some avg10" share of
+    time runnable tasks waited for a CPU, where the kernel exposes it; else
+    the 1-minute load average per CPU this process may use (cgroup quota and
+    affinity, see cpu_layout.available_cpus); 0 where neither is reported.
+    """
+    try:
+        with open(psi_path) as f:
+            some = f.readline().split()
+        return float(dict(kv.split("=") for kv in some[1:])["avg10"]) / 100.0
+    except (OSError, ValueError, KeyError, IndexError):
+        pass
+    try:
+        from cpu_layout import available_cpus
+        return os.getloadavg()[0] / len(available_cpus())
+    except (AttributeError, OSError):
+        return 0.0
+
+
+def pick_quality_mode(pool, requested: Optional[str] = None) -> str:
+    """
+    Quality mode for a new request: the rung matching the larger of queue
+    fill (queued / max_queue) and CPU load per core. A caller may ask for a
+    cheaper mode than that (`requested`), never a better one.
+    Shedding is opt-in: without QUALITY_SHEDDING=1 every request gets the
+    full pipeline unless it asks for less.
+    """
+    pressure = max(pool.queued / max(1, pool.max_queue), _cpu_pressure())
+    PRESSURE.set(pressure)
+    rung = 0
+    if os.getenv("QUALITY_SHEDDING", "0") == "1":
+        rung = sum(1 for t in _thresholds() if pressure >= t)
+    if requested in QUALITY_MODES:
+        rung = max(rung, QUALITY_MODES.index(requested))
+    mode = QUALITY_MODES[rung]
+    MODE_SELECTED.inc(mode=mode)
+    return mode
@@ -1,41 +1,56 @@
 from __future__ import annotations
 
-import os, torch
+import copy, os
 from datetime import datetime
-from functools import lru_cache
-from typing import Dict, Any, List, Tuple
-
-from sentence_transformers import util
+from functools import lru_cache, partial
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple, Union
 
+import numpy as np
 from extractors import (
     extract_text,
-    extract_resume_data,
+    extract_skills,
+    extract_resume_periods,
     normalize_skills,
     clean_entry_name,
 )
+from jd_cache import build_jd_cache_from_uploads, default_jd_cache, get_sbert
+from metrics import stage
+from parse_cache import digest
+from singleflight import IN_FLIGHT
+from cancellation import CancelToken, Cancelled, checkpoint, current, using
+from load_shedding import QUALITY_MODES
+from pipeline import Stage, get_stage_executor, run_stages
 
 @lru_cache(maxsize=1)
 def _lazy_models():
     import spacy
-    from sentence_transformers import SentenceTransformer
     try:
         nlp = spacy.load("en_core_web_sm")
     except Exception:
         nlp = spacy.blank("en")
-    sbert = SentenceTransformer("all-MiniLM-L6-v2")
-    return nlp, sbert
+    return nlp, get_sbert()
 
 def warmup():
-    _lazy_models(); return True
+    """
+    Load every model plus the default JD set, and push one dummy input through
+    each so the first real request does not pay for kernel/graph warm-up.
+    """
+    nlp, sbert = _lazy_models()
+    sbert.encode("warmup")
+    nlp("Warmup in New York")
+    extract_skills("Python and SQL")
+    default_jd_cache()
+    return True
 
 def extract_location(text: str) -> str:
-    try:
-        nlp, _ = _lazy_models()
-        doc = nlp(text or "")
-        locs = [ent.text for ent in doc.ents if ent.label_ in {"GPE", "LOC"}]
-        return locs[0] if locs else "Not Mentioned"
-    except Exception:
-        return "Not Mentioned"
+    with stage("extract_location"):
+        try:
+            nlp, _ = _lazy_models()
+            doc = nlp(text or "")
+            locs = [ent.text for ent in doc.ents if ent.label_ in {"GPE", "LOC"}]
+            return locs[0] if locs else "Not Mentioned"
+        except Exception:
+            return "Not Mentioned"
 
 # matcher.py
 
@@ -67,56 +82,221 @@ def _jd_skill_sets(jd_entry: Dict[str, Any]):
     for k in jd_norm: jd_map.setdefault(k, k)
     return jd_text, jd_norm, jd_map
 
-def _compare(resume_embed, res_norm, resume_loc, jd_name, jd_entry, resume_name):
+LOCATION_SKIPPED = "Not Checked"
+
+# output groups a caller can ask for (fields=) and the row keys each one fills;
+# the score is always computed, everything else only when requested
+FIELD_GROUPS: Dict[str, Tuple[str, ...]] = {
+    "score": ("similarity_score_percent",),
+    "skills": ("matched_skills", "missing_skills"),
+    "location": ("resume_location", "jd_location"),
+    "periods": ("education_periods", "experience_periods", "education_gaps",
+                "experience_gaps", "education_to_first_job_gap_months"),
+}
+ALL_FIELDS = frozenset(FIELD_GROUPS)
+
+def parse_fields(fields: Union[None, str, Iterable[str]]) -> frozenset:
+    """
+    "score,skills" or ["score", "skills"] -> the FIELD_GROUPS to compute.
+    None or empty means all of them; unknown groups raise ValueError.
+    """
+    if fields is None:
+        return ALL_FIELDS
+    if isinstance(fields, str):
+        fields = fields.split(",")
+    groups = {f.strip() for f in fields if f and f.strip()}
+    unknown = groups - ALL_FIELDS
+    if unknown:
+        raise ValueError(f"unknown fields {', '.join(sorted(unknown))}; expected some of {', '.join(FIELD_GROUPS)}")
+    return frozenset(groups | {"score"}) if groups else ALL_FIELDS
+
+def _cosine(a, b) -> float:
+    """Cosine similarity of two vectors (lists, numpy arrays or memmap rows); 0 for a zero vector."""
+    a = np.asarray(a, dtype=np.float32).ravel()
+    b = np.asarray(b, dtype=np.float32).ravel()
+    norm = float(np.linalg.norm(a)) * float(np.linalg.norm(b))
+    return float(a @ b) / norm if norm else 0.0
+
+def _compare(resume_embed, res_norm, resume_loc, jd_name, jd_entry, resume_name, mode: str = "full",
+             fields: frozenset = ALL_FIELDS):
     if not jd_entry: return None
-    jd_text, jd_norm, jd_map = _jd_skill_sets(jd_entry)
-    jd_embed = torch.tensor(jd_entry["embedding"])
-    score = util.pytorch_cos_sim(resume_embed, jd_embed)[0][0].item() * 100.0
-    matched_keys, missing_keys = _containment_match(jd_norm, res_norm)
-    matched = [jd_map[k] for k in matched_keys if k in jd_map]
-    missing = [jd_map[k] for k in missing_keys if k in jd_map]
-    return {
+    score = _cosine(resume_embed, jd_entry["embedding"]) * 100.0
+    row = {
         "resume_file": resume_name,
         "jd_file": jd_name,
         "similarity_score_percent": round(score, 2),
-        "matched_skills": sorted(set(matched)),
-        "missing_skills": sorted(set(missing)),
-        "resume_location": resume_loc,
-        "jd_location": extract_location(jd_text),
     }
+    # embedding_only rows carry no skill keys at all: empty lists would read as "nothing matched"
+    if "skills" in fields and mode != "embedding_only":
+        _, jd_norm, jd_map = _jd_skill_sets(jd_entry)
+        matched_keys, missing_keys = _containment_match(jd_norm, res_norm)
+        row["matched_skills"] = sorted({jd_map[k] for k in matched_keys if k in jd_map})
+        row["missing_skills"] = sorted({jd_map[k] for k in missing_keys if k in jd_map})
+    if "location" in fields:
+        row["resume_location"] = resume_loc
+        row["jd_location"] = extract_location(jd_entry.get("text", "") or "") if mode == "full" else LOCATION_SKIPPED
+    return row
 
-def match_resume_to_jds(resume_path: str, jd_cache: Dict[str, dict]) -> List[Dict[str, Any]]:
-    nlp, sbert = _lazy_models()
-    text = extract_text(resume_path)
-    resume_name = os.path.basename(resume_path)
-    resume_embed = sbert.encode(text, convert_to_tensor=True)
+def _period_rows(items) -> List[Dict[str, str]]:
+    rows = []
+    for e in items or []:
+        start = e[1].strftime("%b %Y")
+        end_dt = e[2]
+        end = "Present" if getattr(end_dt, "year", 0) == 9999 or end_dt > datetime.now() \
+              else end_dt.strftime("%b %Y")
+        rows.append({"entry": clean_entry_name(e[0]), "start": start, "end": end})
+    return rows
+
+def _encode_resume(text: str):
+    _, sbert = _lazy_models()
+    with stage("sbert_encode"):
+        # concurrent requests for the same resume text share one encode
+        return IN_FLIGHT.do(f"encode:{digest(text)}", lambda: sbert.encode(text))
+
+def analyze_resume(
+    resume, resume_name: Optional[str] = None, mode: str = "full", fields=None,
+    cancel: Optional[CancelToken] = None,
+) -> Dict[str, Any]:
+    """
+    Everything about one resume that the per-JD comparison needs. The result
+    is picklable, so it can be computed once and shipped to pool workers.
+    `mode` is a rung of load_shedding.QUALITY_MODES; rows are tagged with it.
+    Only the `fields` groups are computed (see parse_fields): skills alone
+    skip the date parsing, and without "location" spaCy NER never runs.
+    `cancel` is checked at stage boundaries, as for match_resume_to_jds.
+
+    Past text extraction, the encode, skills, periods and location stages
+    only need the text, so they run side by side (see pipeline.run_stages).
+    """
+    if cancel is not None:
+        cancel.check()              # expired while queued: do not start
+    with using(cancel if cancel is not None else current()):
+        if mode not in QUALITY_MODES:
+            raise ValueError(f"unknown quality mode {mode!r}")
+        fields = parse_fields(fields)
+        _lazy_models()          # load here, not racing in the stage threads
+        text = extract_text(resume, name=resume_name)
+        if resume_name is None:
+            resume_name = os.path.basename(resume) if isinstance(resume, (str, os.PathLike)) else "resume"
+        checkpoint()
+
+        stages = [Stage("resume_encode", _encode_resume, ("text",))]
+        if mode != "embedding_only":
+            fast = mode == "fast_skills"
+            if "skills" in fields:
+                stages.append(Stage("resume_skills", partial(extract_skills, fast=fast), ("text",)))
+            if "periods" in fields:
+                stages.append(Stage("resume_periods", extract_resume_periods, ("text",)))
+            if mode == "full" and "location" in fields:
+                stages.append(Stage("resume_location", extract_location, ("text",)))
+        done = run_stages(stages, {"text": text}, get_stage_executor())
 
-    # Resume skills + periods/gaps
-    resume_skills, edu, exp, edu_gaps, exp_gaps, edu_to_exp = extract_resume_data(text)
-    res_norm = normalize_skills(resume_skills)
-    resume_loc = extract_location(text)
+        analysis = {
+            "resume_name": resume_name,
+            "embedding": done["resume_encode"],
+            "skills_norm": normalize_skills(done["resume_skills"]) if "resume_skills" in done else set(),
+            "location": done.get("resume_location", LOCATION_SKIPPED),
+            "mode": mode,
+            "fields": fields,
+            "extras": {},
+        }
+        if "resume_periods" in done:
+            edu, exp, edu_gaps, exp_gaps, edu_to_exp = done["resume_periods"]
+            analysis["extras"] = {
+                "education_periods": _period_rows(edu),
+                "experience_periods": _period_rows(exp),
+                "education_gaps": edu_gaps,
+                "experience_gaps": exp_gaps,
+                "education_to_first_job_gap_months": edu_to_exp,
+            }
+        return analysis
 
-    out: List[Dict[str, Any]] = []
+def score_jd(analysis: Dict[str, Any], jd_name: str, jd_entry: dict) -> Optional[Dict[str, Any]]:
+    """One MatchResult row: the analyzed resume against a single JD entry."""
+    with stage("jd_compare"):
+        base = _compare(
+            analysis["embedding"], analysis["skills_norm"], analysis["location"],
+            jd_name, jd_entry, analysis["resume_name"], analysis.get("mode", "full"),
+            analysis.get("fields", ALL_FIELDS),
+        )
+    if not base: return None
+    return {**base, **copy.deepcopy(analysis["extras"]), "quality_mode": analysis.get("mode", "full")}
+
+def score_jds(
+    analysis: Dict[str, Any], jd_items: List[Tuple[str, dict]], cancel: Optional[CancelToken] = None,
+) -> List[Dict[str, Any]]:
+    """score_jd over a slice of the JD cache (one pool task), checking `cancel` before each JD."""
+    rows = []
+    for jd_name, jd_entry in jd_items:
+        if cancel is not None:
+            cancel.check(rows)
+        row = score_jd(analysis, jd_name, jd_entry)
+        if row: rows.append(row)
+    return rows
+
+def iter_match_results(
+    resume, jd_cache: Dict[str, dict], resume_name: Optional[str] = None, mode: str = "full", fields=None,
+) -> Iterator[Dict[str, Any]]:
+    """Like match_resume_to_jds, but yields each row as soon as it is scored."""
+    analysis = analyze_resume(resume, resume_name, mode, fields)
     for jd_name, jd_entry in jd_cache.items():
-        base = _compare(resume_embed, res_norm, resume_loc, jd_name, jd_entry, resume_name)
-        if not base: continue
-
-        def periods(items):
-            rows = []
-            for e in items or []:
-                start = e[1].strftime("%b %Y")
-                end_dt = e[2]
-                end = "Present" if getattr(end_dt, "year", 0) == 9999 or end_dt > datetime.now() \
-                      else end_dt.strftime("%b %Y")
-                rows.append({"entry": clean_entry_name(e[0]), "start": start, "end": end})
-            return rows
-
-        out.append({
-            **base,
-            "education_periods": periods(edu),
-            "experience_periods": periods(exp),
-            "education_gaps": edu_gaps,
-            "experience_gaps": exp_gaps,
-            "education_to_first_job_gap_months": edu_to_exp,
-        })
-    return out
+        checkpoint()
+        row = score_jd(analysis, jd_name, jd_entry)
+        if row: yield row
+
+def match_resume_to_jds(
+    resume,
+    jd_cache: Dict[str, dict],
+    resume_name: Optional[str] = None,
+    cancel: Optional[CancelToken] = None,
+    mode: str = "full",
+    fields=None,
+) -> List[Dict[str, Any]]:
+    """
+    `resume` is a path or the raw resume bytes (bytes / memoryview / file-like);
+    for in-memory resumes pass the original filename as `resume_name`.
+
+    `mode` picks a rung of the quality ladder (load_shedding.QUALITY_MODES):
+    "full", "no_location", "fast_skills" (no SkillNer) or "embedding_only".
+    Every row carries the mode it was produced in as `quality_mode`.
+
+    `fields` ("score,skills", or a list) limits the rows to those output
+    groups (FIELD_GROUPS) and skips the work behind the others; by default
+    everything is computed.
+
+    With a `cancel` token, work stops at the next stage boundary (or between
+    JDs) after its deadline passes or it is cancelled, raising Cancelled
+    with the rows scored so far in `partial`.
+    """
+    rows: List[Dict[str, Any]] = []
+    with using(cancel):
+        try:
+            for row in iter_match_results(resume, jd_cache, resume_name, mode, fields):
+                rows.append(row)
+        except Cancelled as e:
+            raise Cancelled(e.reason, rows) from None
+    return rows
+
+def match_uploads(
+    resume: Union[bytes, str],
+    resume_name: str,
+    jd_uploads: Optional[List[Tuple[str, Union[bytes, str]]]] = None,
+    jd_cache: Optional[Dict[str, dict]] = None,
+    cancel: Optional[CancelToken] = None,
+    mode: str = "full",
+    fields=None,
+) -> List[Dict[str, Any]]:
+    """
+    One upload request end to end (this is what runs on the worker pool):
+    embed the uploaded JDs, or use the default JD set, and match the resume.
+    Pass an already built `jd_cache` to skip JD processing (batch requests).
+    Bodies are bytes, or paths for uploads that were spooled to disk.
+    `cancel`, `mode` and `fields` are as for match_resume_to_jds.
+    """
+    if cancel is not None:
+        cancel.check()              # expired while queued: do not start
+    if jd_cache is None:
+        with using(cancel):
+            jd_cache = (build_jd_cache_from_uploads(jd_uploads, fields=parse_fields(fields), mode=mode) if jd_uploads
+                        else default_jd_cache())
+    return match_resume_to_jds(resume, jd_cache, resume_name=resume_name, cancel=cancel, mode=mode, fields=fields)
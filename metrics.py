@@ -0,0 +1,207 @@
+# metrics.py
+
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# latency buckets in seconds (Prometheus histogram convention)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _fmt_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    inner = ",".join(f'{k}="{esc(v)}"' for k, v in sorted(labels.items()))
+    return "{" + inner + "}"
+
+
+def _fmt_value(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.label_names)
+
+    def _labels(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.label_names, key))
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *a, **k):
+        super().__init__(*a, **k)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_fmt_labels(self._labels(k))} {_fmt_value(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = float(value)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series: Dict[Tuple[str, ...], List[float]] = {}   # bucket counts..., sum, count
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                s = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    s[i] += 1
+            s[-2] += value
+            s[-1] += 1
+
+    def count(self, **labels) -> int:
+        s = self._series.get(self._key(labels))
+        return int(s[-1]) if s else 0
+
+    def _samples(self) -> List[str]:
+        out = []
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        for key, s in items:
+            labels = self._labels(key)
+            for i, b in enumerate(self.buckets):
+                out.append(f"{self.name}_bucket{_fmt_labels({**labels, 'le': _fmt_value(b)})} {_fmt_value(s[i])}")
+            out.append(f"{self.name}_sum{_fmt_labels(labels)} {_fmt_value(s[-2])}")
+            out.append(f"{self.name}_count{_fmt_labels(labels)} {_fmt_value(s[-1])}")
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _get_or_add(self, cls, name: str, help_text: str, label_names: Sequence[str] = (), **kw):
+        m = self._metrics.get(name)
+        if m is None:
+            m = self._metrics[name] = cls(name, help_text, label_names, **kw)
+        return m
+
+    def counter(self, name: str, help_text: str, label_names: Sequence[str] = ()) -> Counter:
+        return self._get_or_add(Counter, name, help_text, label_names)
+
+    def gauge(self, name: str, help_text: str, label_names: Sequence[str] = ()) -> Gauge:
+        return self._get_or_add(Gauge, name, help_text, label_names)
+
+    def histogram(self, name: str, help_text: str, label_names: Sequence[str] = (), buckets: Optional[Sequence[float]] = None) -> Histogram:
+        return self._get_or_add(Histogram, name, help_text, label_names, buckets=buckets or DEFAULT_BUCKETS)
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines: List[str] = []
+        for m in self._metrics.values():
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# ---------- pipeline stage timings ----------
+#
+# Matching runs on pool workers, possibly in other processes whose registry
+# nobody scrapes. Code marks its stages with `with stage("..."):` and records
+# cache lookups with record_cache(); inside collect() those events go to a
+# per-thread report that travels back with the result and is replayed into
+# REGISTRY by the caller. Outside collect() they are recorded directly.
+
+STAGE_SECONDS = REGISTRY.histogram("match_stage_seconds", "Time spent in each matching pipeline stage", ["stage"])
+CACHE_LOOKUPS = REGISTRY.counter("parse_cache_lookups_total", "Parse cache lookups by entry kind and result", ["kind", "result"])
+
+_report_local = threading.local()
+
+
+def _new_report() -> Dict[str, Any]:
+    return {"stages": [], "cache": {}}
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0
+        report = getattr(_report_local, "report", None)
+        if report is None:
+            STAGE_SECONDS.observe(elapsed, stage=name)
+        else:
+            report["stages"].append((name, elapsed))
+
+
+def record_cache(kind: str, result: str) -> None:
+    """result is "memory_hit", "disk_hit" or "miss"."""
+    report = getattr(_report_local, "report", None)
+    if report is None:
+        CACHE_LOOKUPS.inc(kind=kind, result=result)
+    else:
+        report["cache"][(kind, result)] = report["cache"].get((kind, result), 0) + 1
+
+
+def collect(fn: Callable[..., Any], *args, **kwargs) -> Tuple[Any, Dict[str, Any]]:
+    """Run fn and return (result, report) with the stage/cache events it produced."""
+    previous = getattr(_report_local, "report", None)
+    report = _report_local.report = _new_report()
+    try:
+        return fn(*args, **kwargs), report
+    finally:
+        _report_local.report = previous
+
+
+def current_report() -> Optional[Dict[str, Any]]:
+    """The report collect() is filling on this thread, if any."""
+    return getattr(_report_local, "report", None)
+
+
+def replay(report: Dict[str, Any]) -> None:
+    """Record a report from collect() (possibly made in another process) here."""
+    for name, elapsed in report["stages"]:
+        STAGE_SECONDS.observe(elapsed, stage=name)
+    for (kind, result), n in report["cache"].items():
+        CACHE_LOOKUPS.inc(n, kind=kind, result=result)
@@ -0,0 +1,234 @@
+# parse_cache.py
+
+import hashlib
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+from metrics import record_cache
+from singleflight import IN_FLIGHT
+
+log = logging.getLogger(__name__)
+
+MISS = object()
+
+
+def digest(data) -> str:
+    """sha256 hex digest of bytes or str (str is hashed as UTF-8)."""
+    if isinstance(data, str):
+        data = data.encode("utf-8", errors="surrogatepass")
+    return hashlib.sha256(data).hexdigest()
+
+
+def _private(path: Path) -> bool:
+    """Only this user can write `path` (the disk tier unpickles what it reads)."""
+    if os.name != "posix" or not path.exists():
+        return True
+    st = path.stat()
+    return st.st_uid == os.getuid() and not st.st_mode & 0o022
+
+
+class ParseCache:
+    """
+    Two-tier cache for parse results.
+
+    Tier 1 is an in-process LRU bounded by total pickled size. Tier 2 is an
+    optional SQLite file (shared by every worker process on the host) bounded
+    by total blob size; least-recently-used rows are evicted first. Disk hits
+    bump a row's atime in batches (every `touch_batch` hits or
+    `touch_interval` seconds, and before evicting) rather than with a write
+    per read. Values are stored pickled, so every hit hands back a fresh copy
+    the caller may mutate; since unpickling runs whatever the file says, the
+    disk tier is refused if its directory or file is writable by anyone but
+    this user.
+    """
+
+    touch_batch = 64
+    touch_interval = 30.0
+
+    def __init__(
+        self,
+        max_memory_bytes: int = 64 * 1024 * 1024,
+        disk_path: Optional[str] = None,
+        max_disk_bytes: int = 512 * 1024 * 1024,
+    ):
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.disk_path = disk_path
+        self._mem: "OrderedDict[str, bytes]" = OrderedDict()
+        self._mem_bytes = 0
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._conn_pid: Optional[int] = None
+        self._disk_bytes = 0
+        self._touched: Dict[str, float] = {}
+        self._touched_at = time.monotonic()
+        self.stats: Dict[str, int] = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+    # ---------- disk tier ----------
+
+    def _db(self) -> Optional[sqlite3.Connection]:
+        if not self.disk_path:
+            return None
+        # connections must not cross a fork; reopen in each process
+        if self._conn is None or self._conn_pid != os.getpid():
+            path = Path(self.disk_path)
+            path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+            if not (_private(path.parent) and _private(path)):
+                log.warning("parse cache disk tier disabled: %s is writable by other users", path)
+                self.disk_path = None
+                return None
+            conn = sqlite3.connect(self.disk_path, timeout=10, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY, value BLOB NOT NULL,"
+                " size INTEGER NOT NULL, atime REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_atime ON entries(atime)")
+            conn.commit()
+            self._disk_bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            self._touched.clear()
+            self._conn, self._conn_pid = conn, os.getpid()
+        return self._conn
+
+    def _flush_touches(self, db: sqlite3.Connection) -> None:
+        # caller commits
+        if self._touched:
+            db.executemany("UPDATE entries SET atime = ? WHERE key = ?",
+                           [(atime, key) for key, atime in self._touched.items()])
+            self._touched.clear()
+        self._touched_at = time.monotonic()
+
+    def _disk_get(self, key: str) -> Optional[bytes]:
+        db = self._db()
+        if db is None:
+            return None
+        row = db.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        self._touched[key] = time.time()
+        if len(self._touched) >= self.touch_batch or time.monotonic() - self._touched_at >= self.touch_interval:
+            self._flush_touches(db)
+            db.commit()
+        return row[0]
+
+    def _disk_put(self, key: str, blob: bytes) -> None:
+        db = self._db()
+        if db is None or len(blob) > self.max_disk_bytes:
+            return
+        old = db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+        db.execute(
+            "INSERT OR REPLACE INTO entries (key, value, size, atime) VALUES (?, ?, ?, ?)",
+            (key, blob, len(blob), time.time()),
+        )
+        self._touched.pop(key, None)
+        self._disk_bytes += len(blob) - (old[0] if old else 0)
+        if self._disk_bytes > self.max_disk_bytes:
+            # evict by up-to-date atimes; other processes write too, so
+            # re-read the real total as well
+            self._flush_touches(db)
+            self._disk_bytes = db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            target = int(self.max_disk_bytes * 0.9)
+            for old_key, size in db.execute("SELECT key, size FROM entries ORDER BY atime").fetchall():
+                if self._disk_bytes <= target:
+                    break
+                db.execute("DELETE FROM entries WHERE key = ?", (old_key,))
+                self._disk_bytes -= size
+        db.commit()
+
+    # ---------- memory tier ----------
+
+    def _mem_put(self, key: str, blob: bytes) -> None:
+        if len(blob) > self.max_memory_bytes:
+            return
+        old = self._mem.pop(key, None)
+        if old is not None:
+            self._mem_bytes -= len(old)
+        self._mem[key] = blob
+        self._mem_bytes += len(blob)
+        while self._mem_bytes > self.max_memory_bytes:
+            _, evicted = self._mem.popitem(last=False)
+            self._mem_bytes -= len(evicted)
+
+    # ---------- public API ----------
+
+    def get(self, key: str) -> Any:
+        """Return the cached value for `key`, or MISS."""
+        with self._lock:
+            blob = self._mem.get(key)
+            if blob is not None:
+                self._mem.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                record_cache(key.split(":", 1)[0], "memory_hit")
+                return pickle.loads(blob)
+            blob = self._disk_get(key)
+            if blob is not None:
+                self._mem_put(key, blob)
+                self.stats["disk_hits"] += 1
+                record_cache(key.split(":", 1)[0], "disk_hit")
+                return pickle.loads(blob)
+            self.stats["misses"] += 1
+            record_cache(key.split(":", 1)[0], "miss")
+            return MISS
+
+    def put(self, key: str, value: Any) -> None:
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._mem_put(key, blob)
+            self._disk_put(key, blob)
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]) -> Any:
+        """
+        Cached value for `key`; concurrent misses on the same key in this
+        process compute it once (IN_FLIGHT is per process: workers of a
+        process pool only share results through the disk tier).
+        """
+        value = self.get(key)
+        if value is MISS:
+            value = IN_FLIGHT.do(key, lambda: self._compute_and_put(key, compute))
+        return value
+
+    def _compute_and_put(self, key: str, compute: Callable[[], Any]) -> Any:
+        # a flight that just finished may have stored it between our miss and now
+        value = self.get(key)
+        if value is MISS:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+            self._mem_bytes = 0
+            db = self._db()
+            if db is not None:
+                db.execute("DELETE FROM entries")
+                db.commit()
+                self._disk_bytes = 0
+                self._touched.clear()
+
+
+@lru_cache(maxsize=1)
+def get_parse_cache() -> ParseCache:
+    """
+    Process-wide cache configured from the environment:
+      PARSE_CACHE_MB       memory tier budget (default 64, 0 disables)
+      PARSE_CACHE_DIR      enables the SQLite tier at <dir>/parse_cache.sqlite3;
+                           the dir must be private to the service user (it
+                           holds pickles), a shared one is refused
+      PARSE_CACHE_DISK_MB  disk tier budget (default 512)
+    """
+    disk_dir = os.getenv("PARSE_CACHE_DIR")
+    return ParseCache(
+        max_memory_bytes=int(float(os.getenv("PARSE_CACHE_MB", "64")) * 1024 * 1024),
+        disk_path=str(Path(disk_dir) / "parse_cache.sqlite3") if disk_dir else None,
+        max_disk_bytes=int(float(os.getenv("PARSE_CACHE_DISK_MB", "512")) * 1024 * 1024),
+    )
@@ -0,0 +1,126 @@
+# pipeline.py
+
+import os
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import metrics
+from cancellation import CancelToken, current, using
+from metrics import collect, current_report, stage
+from profiling import profiling_active
+
+
+class Stage(NamedTuple):
+    """
+    One node of a stage DAG: fn is called with the results of `deps`, in
+    order. fn must be picklable (a module-level function or a partial of
+    one) for process executors.
+    """
+    name: str
+    fn: Callable[..., Any]
+    deps: Tuple[str, ...] = ()
+
+
+def _order(stages: Sequence[Stage], inputs: Dict[str, Any]) -> List[Stage]:
+    """Stages in dependency order; rejects duplicate names, unknown deps and cycles."""
+    names = [s.name for s in stages]
+    if len(set(names)) != len(names) or set(names) & set(inputs):
+        raise ValueError(f"duplicate stage names in {names}")
+    known = set(inputs)
+    pending, ordered = list(stages), []
+    while pending:
+        ready = [s for s in pending if set(s.deps) <= known]
+        if not ready:
+            raise ValueError(f"unknown or cyclic deps in stages {[s.name for s in pending]}")
+        known.update(s.name for s in ready)
+        ordered.extend(ready)
+        pending = [s for s in pending if s not in ready]
+    return ordered
+
+
+def _run_stage(name: str, fn: Callable[..., Any], args: tuple, token: Optional[CancelToken]):
+    """Runs on the executor: one stage under its timing, with the caller's cancel token."""
+    with using(token):
+        return collect(_timed, name, fn, args)
+
+
+def _timed(name: str, fn: Callable[..., Any], args: tuple) -> Any:
+    with stage(name):
+        return fn(*args)
+
+
+def _merge(report: Dict[str, Any]) -> None:
+    """Fold a stage's report into the caller's (or record it, outside collect())."""
+    mine = current_report()
+    if mine is None:
+        metrics.replay(report)
+        return
+    mine["stages"].extend(report["stages"])
+    for key, n in report["cache"].items():
+        mine["cache"][key] = mine["cache"].get(key, 0) + n
+
+
+def run_stages(
+    stages: Sequence[Stage],
+    inputs: Optional[Dict[str, Any]] = None,
+    executor: Optional[Executor] = None,
+) -> Dict[str, Any]:
+    """
+    Run a DAG of stages over `inputs` and return every result by name.
+    A stage starts as soon as its deps are done, so independent stages run
+    concurrently on `executor` and the whole graph takes about as long as
+    its slowest path; without an executor, or under profiling.run_profiled
+    (whose cProfile only sees this thread), they run here one by one. Each
+    stage is timed as a metrics.stage of its name, and the caller's cancel
+    token goes along, so checkpoint() works inside stages as usual. The
+    first stage error is raised once the stages already running finished.
+    """
+    results: Dict[str, Any] = dict(inputs or {})
+    pending = _order(stages, results)
+    if executor is None or len(stages) < 2 or profiling_active():
+        for s in pending:
+            results[s.name] = _timed(s.name, s.fn, tuple(results[d] for d in s.deps))
+        return results
+
+    token = current()
+    running: Dict[Future, Stage] = {}
+    error: Optional[BaseException] = None
+    while pending or running:
+        if error is None:
+            for s in [s for s in pending if all(d in results for d in s.deps)]:
+                pending.remove(s)
+                args = tuple(results[d] for d in s.deps)
+                running[executor.submit(_run_stage, s.name, s.fn, args, token)] = s
+        if not running:
+            break
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for fut in done:
+            s = running.pop(fut)
+            try:
+                value, report = fut.result()
+            except BaseException as e:
+                error = error or e
+                continue
+            _merge(report)
+            results[s.name] = value
+    if error is not None:
+        raise error
+    return results
+
+
+@lru_cache(maxsize=1)
+def get_stage_executor() -> Optional[Executor]:
+    """
+    Executor for the independent stages of one request, configured from the
+    environment (created lazily, once per process):
+      PIPELINE_EXECUTOR   "thread" (default), "process" or "off" (run stages in sequence)
+      PIPELINE_WORKERS    stages run at once (default 3)
+    """
+    kind = os.getenv("PIPELINE_EXECUTOR", "thread")
+    workers = int(os.getenv("PIPELINE_WORKERS", "3"))
+    if kind == "off" or workers < 2:
+        return None
+    if kind == "process":
+        return ProcessPoolExecutor(max_workers=workers)
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="stage")
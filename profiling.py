@@ -0,0 +1,93 @@
+# profiling.py
+
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import threading
+import time
+import uuid
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from metrics import current_report
+
+APP_DIR = Path(__file__).resolve().parent
+
+_local = threading.local()
+
+
+def profile_dir() -> Path:
+    return Path(os.getenv("PROFILE_DIR") or APP_DIR / "_profiles")
+
+
+def profile_requested(headers, query) -> Optional[bool]:
+    """
+    None when the request did not ask to be profiled, True when it did with
+    the right admin token (PROFILE_TOKEN), False when the token is missing
+    or wrong. Ask with the X-Profile-Token header or ?profile=<token>.
+    """
+    given = headers.get("x-profile-token") or query.get("profile")
+    if not given:
+        return None
+    expected = os.getenv("PROFILE_TOKEN", "")
+    return bool(expected) and hmac.compare_digest(given.encode(), expected.encode())
+
+
+def profiling_active() -> bool:
+    """
+    True on a thread inside run_profiled. cProfile only sees its own thread,
+    so pipeline.run_stages runs stages inline there instead of on its executor.
+    """
+    return getattr(_local, "active", False)
+
+
+def _stage_table(stages) -> str:
+    totals: Dict[str, list] = defaultdict(lambda: [0, 0.0])
+    for name, elapsed in stages:
+        totals[name][0] += 1
+        totals[name][1] += elapsed
+    lines = [f"{'stage':<22}{'calls':>7}{'total ms':>11}"]
+    for name, (calls, total) in sorted(totals.items(), key=lambda kv: -kv[1][1]):
+        lines.append(f"{name:<22}{calls:>7}{total * 1000:>11.1f}")
+    return "\n".join(lines)
+
+
+def run_profiled(fn: Callable[..., Any], *args, **kwargs) -> Tuple[Any, Dict[str, str]]:
+    """
+    Run fn under cProfile (on the pool worker, where the work happens) and
+    return (result, profile). The raw stats go to PROFILE_DIR/<id>.prof for
+    snakeviz/pstats; profile["summary"] has per-stage totals for this call
+    followed by the top functions by cumulative time, and is also written
+    next to it as <id>.txt.
+    """
+    report = current_report()
+    first = len(report["stages"]) if report is not None else 0
+    prof = cProfile.Profile()
+    t0 = time.perf_counter()
+    previous, _local.active = profiling_active(), True
+    prof.enable()
+    try:
+        result = fn(*args, **kwargs)
+    finally:
+        prof.disable()
+        _local.active = previous
+    wall = time.perf_counter() - t0
+
+    profile_id = uuid.uuid4().hex
+    out = io.StringIO()
+    stats = pstats.Stats(prof, stream=out)
+    stats.sort_stats("cumulative").print_stats(int(os.getenv("PROFILE_TOP", "40")))
+    stages = report["stages"][first:] if report is not None else []
+    summary = (
+        f"profile {profile_id}: {getattr(fn, '__name__', fn)} took {wall * 1000:.1f} ms in pid {os.getpid()}\n\n"
+        f"{_stage_table(stages)}\n\n{out.getvalue()}"
+    )
+
+    root = profile_dir()
+    root.mkdir(parents=True, exist_ok=True)
+    stats.dump_stats(str(root / f"{profile_id}.prof"))
+    (root / f"{profile_id}.txt").write_text(summary, encoding="utf-8")
+    return result, {"id": profile_id, "path": str(root / f"{profile_id}.prof"), "summary": summary}
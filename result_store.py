@@ -0,0 +1,126 @@
+# result_store.py
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+APP_DIR = Path(__file__).resolve().parent
+
+
+class ResultStore:
+    """
+    Short-lived store of match result sets, keyed by match_id, so an export
+    can reuse exactly what the user was shown instead of recomputing. It is
+    a SQLite file, so every web worker on the host sees every result set
+    whichever of them served the match. Each row is its own record, so an
+    export reads them back a batch at a time (iter_rows) instead of loading
+    the whole set. Entries expire after `ttl` seconds; past `max_entries`
+    the oldest go first.
+    """
+
+    def __init__(self, path: str, ttl: float = 1800.0, max_entries: int = 256):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._conn_pid: Optional[int] = None
+
+    def _db(self) -> sqlite3.Connection:
+        # connections must not cross a fork; reopen in each process
+        if self._conn is None or self._conn_pid != os.getpid():
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(
+                "CREATE TABLE IF NOT EXISTS result_sets ("
+                " match_id TEXT PRIMARY KEY, created REAL NOT NULL, expires REAL NOT NULL, count INTEGER NOT NULL);"
+                "CREATE INDEX IF NOT EXISTS result_sets_created ON result_sets(created);"
+                "CREATE TABLE IF NOT EXISTS result_rows ("
+                " match_id TEXT NOT NULL, idx INTEGER NOT NULL, row TEXT NOT NULL, PRIMARY KEY (match_id, idx));"
+            )
+            conn.commit()
+            self._conn, self._conn_pid = conn, os.getpid()
+        return self._conn
+
+    def put(self, rows: List[Dict[str, Any]]) -> str:
+        match_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            with db:
+                db.execute("INSERT INTO result_sets (match_id, created, expires, count) VALUES (?, ?, ?, ?)",
+                           (match_id, now, now + self.ttl, len(rows)))
+                db.executemany("INSERT INTO result_rows (match_id, idx, row) VALUES (?, ?, ?)",
+                               ((match_id, i, json.dumps(r, default=str)) for i, r in enumerate(rows)))
+                stale = [(m,) for m, in db.execute(
+                    "SELECT match_id FROM result_sets WHERE expires <= ? OR match_id NOT IN"
+                    " (SELECT match_id FROM result_sets ORDER BY created DESC LIMIT ?)",
+                    (now, self.max_entries),
+                )]
+                db.executemany("DELETE FROM result_rows WHERE match_id = ?", stale)
+                db.executemany("DELETE FROM result_sets WHERE match_id = ?", stale)
+        return match_id
+
+    def iter_rows(self, match_id: str, batch: int = 200) -> Optional[Iterator[Dict[str, Any]]]:
+        """
+        The rows of a result set, read lazily `batch` at a time, or None if
+        it is unknown or expired. The rows come from one read snapshot on a
+        connection of their own, so a put() evicting the set mid-export
+        does not cut it short.
+        """
+        with self._lock:
+            self._db()                      # schema
+        conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        try:
+            conn.execute("BEGIN")
+            found = conn.execute("SELECT 1 FROM result_sets WHERE match_id = ? AND expires > ?",
+                                 (match_id, time.time())).fetchone()
+        except BaseException:
+            conn.close()
+            raise
+        if found is None:
+            conn.close()
+            return None
+        return self._stream(conn, match_id, batch)
+
+    @staticmethod
+    def _stream(conn: sqlite3.Connection, match_id: str, batch: int) -> Iterator[Dict[str, Any]]:
+        try:
+            cur = conn.execute("SELECT row FROM result_rows WHERE match_id = ? ORDER BY idx", (match_id,))
+            while True:
+                chunk = cur.fetchmany(batch)
+                if not chunk:
+                    return
+                for (row,) in chunk:
+                    yield json.loads(row)
+        finally:
+            conn.close()
+
+    def get(self, match_id: str) -> Optional[List[Dict[str, Any]]]:
+        rows = self.iter_rows(match_id)
+        return None if rows is None else list(rows)
+
+
+@lru_cache(maxsize=1)
+def get_result_store() -> ResultStore:
+    """
+    Process-wide store configured from the environment:
+      RESULTS_DB           SQLite file shared by the web workers (default
+                           results.sqlite3 next to JOBS_DB, else _jobs/)
+      RESULT_TTL_SECONDS   how long a match_id stays exportable (default 1800)
+      RESULT_STORE_MAX     result sets kept at most (default 256)
+    """
+    jobs_db = os.getenv("JOBS_DB")
+    default = Path(jobs_db).parent / "results.sqlite3" if jobs_db else APP_DIR / "_jobs" / "results.sqlite3"
+    return ResultStore(
+        os.getenv("RESULTS_DB") or str(default),
+        ttl=float(os.getenv("RESULT_TTL_SECONDS", "1800")),
+        max_entries=int(os.getenv("RESULT_STORE_MAX", "256")),
+    )
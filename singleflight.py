@@ -0,0 +1,132 @@
+# singleflight.py
+
+import asyncio
+import copy
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from cancellation import CancelToken, Cancelled
+from metrics import REGISTRY
+
+SHARED = REGISTRY.counter(
+    "singleflight_shared_total", "Calls that waited on an identical in-flight call instead of running", ["kind"]
+)
+
+
+def _kind(key: str) -> str:
+    return key.split(":", 1)[0]
+
+
+class _Call:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Collapse concurrent calls with the same key into one, across threads:
+    the first caller runs fn, the others block until it returns and get a
+    deep copy of its result (or its exception). Nothing is kept afterwards;
+    caching is parse_cache's job. If the running call was cancelled, which
+    belongs to its own request, a waiter runs fn itself instead.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+            if leader:
+                break
+            SHARED.inc(kind=_kind(key))
+            call.done.wait()
+            if isinstance(call.error, Cancelled):
+                continue
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.value)
+        try:
+            call.value = fn()
+            return call.value
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class _Flight:
+    __slots__ = ("task", "token", "waiters")
+
+    def __init__(self, token: CancelToken):
+        self.task: Optional[asyncio.Future] = None
+        self.token = token
+        self.waiters = 0
+
+
+class AsyncSingleFlight:
+    """
+    SingleFlight for coroutines on one event loop. The first caller's
+    factory runs as its own task, so a waiter that goes away does not cancel
+    it for the others; every caller gets the same result object and must
+    treat it as read-only. The factory is handed a CancelToken of its own,
+    cancelled once every waiter has left (its request was cancelled, passed
+    its deadline or was torn down) so abandoned work stops at its next
+    stage boundary; a caller arriving after that starts a fresh flight.
+    """
+
+    poll = 0.25                 # seconds between checks of a waiter's own token
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+
+    async def run(self, key: str, factory: Callable[[CancelToken], Awaitable[Any]],
+                  cancel: Optional[CancelToken] = None) -> Any:
+        if cancel is not None:
+            cancel.check()
+        flight = self._flights.get(key)
+        if flight is None or flight.token.reason() is not None:
+            flight = self._start(key, factory)
+        else:
+            SHARED.inc(kind=_kind(key))
+        flight.waiters += 1
+        try:
+            while True:
+                done, _ = await asyncio.wait({flight.task}, timeout=self.poll if cancel is not None else None)
+                if done:
+                    return flight.task.result()
+                cancel.check()
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.token.cancel()
+
+    def _start(self, key: str, factory) -> _Flight:
+        flight = _Flight(CancelToken())
+        flight.task = asyncio.ensure_future(factory(flight.token))
+        self._flights[key] = flight
+
+        def finished(task):
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            flight.token.close()
+            if not task.cancelled():
+                task.exception()    # retrieved: nobody may be left to await it
+        flight.task.add_done_callback(finished)
+        return flight
+
+
+# process-wide, for work running on pool threads (extraction, encoding)
+IN_FLIGHT = SingleFlight()
@@ -8,6 +8,15 @@ from app_main import app
 
 client = TestClient(app)
 
+@pytest.fixture(autouse=True)
+def _fresh_rate_limiter(monkeypatch):
+    # every test starts with a full token bucket for the shared test client
+    import app_main
+    from admission import RateLimiter
+    limiter = RateLimiter(rate=1.0, burst=10)
+    monkeypatch.setattr(app_main, "get_rate_limiter", lambda: limiter)
+    return limiter
+
 def test_index_page():
     response = client.get("/")
     assert response.status_code == 200
@@ -38,3 +47,328 @@ def test_download_csv_endpoint(tmp_path):
     assert response.status_code in (200, 400)
     if response.status_code == 200:
         assert response.headers["content-type"].startswith("text/csv")
+
+def test_match_batch_embeds_jds_once(monkeypatch):
+    import app_main
+    from workers import MatchPool
+
+    calls = {"jd_builds": 0}
+    def fake_build(jd_uploads, cancel=None, fields=None, mode="full"):
+        calls["jd_builds"] += 1
+        return {name: {"text": raw.decode(), "skills": [], "embedding": []} for name, raw in jd_uploads}
+    def fake_match(resume, resume_name, jd_uploads=None, jd_cache=None, cancel=None, mode="full", fields=None):
+        return [{"resume_file": resume_name, "jd_file": jd, "similarity_score_percent": 50.0} for jd in jd_cache]
+
+    pool = MatchPool(workers=2, max_queue=8, kind="thread")
+    monkeypatch.setattr(app_main, "get_pool", lambda: pool)
+    monkeypatch.setattr(app_main, "build_jd_cache_from_uploads", fake_build)
+    monkeypatch.setattr(app_main, "match_uploads", fake_match)
+
+    files = [("resumes", (f"r{i}.txt", b"Python developer", "text/plain")) for i in range(3)]
+    files += [("jd_files", (f"jd{i}.txt", b"Need Python", "text/plain")) for i in range(2)]
+    try:
+        response = client.post("/match/batch", files=files)
+    finally:
+        pool.shutdown()
+    assert response.status_code == 200
+    body = response.json()
+    assert calls["jd_builds"] == 1
+    assert [r["resume_file"] for r in body["results"]] == ["r0.txt", "r1.txt", "r2.txt"]
+    assert all(len(r["matches"]) == 2 for r in body["results"])
+
+def test_ui_screening_on_match_batch_is_not_queued_behind_batch_work(monkeypatch):
+    import threading
+    import time
+    import app_main
+    from workers import MatchPool
+
+    gate = threading.Event()
+    def fake_build(jd_uploads, cancel=None, fields=None, mode="full"):
+        if any(name == "slow.txt" for name, _ in jd_uploads):
+            gate.wait(5)
+        return {name: {} for name, _ in jd_uploads}
+    def fake_match(resume, resume_name, jd_uploads=None, jd_cache=None, cancel=None, mode="full", fields=None):
+        return [{"resume_file": resume_name, "jd_file": jd, "similarity_score_percent": 50.0} for jd in jd_cache]
+
+    pool = MatchPool(workers=2, max_queue=8, kind="thread")
+    monkeypatch.setattr(app_main, "get_pool", lambda: pool)
+    monkeypatch.setattr(app_main, "build_jd_cache_from_uploads", fake_build)
+    monkeypatch.setattr(app_main, "match_uploads", fake_match)
+
+    def post(jd_name, headers, out):
+        files = [("resumes", ("r.txt", b"Python developer", "text/plain")),
+                 ("jd_files", (jd_name, jd_name.encode(), "text/plain"))]
+        out.append(client.post("/match/batch", files=files, headers=headers).status_code)
+
+    bulk, ui = [], []
+    scripts = [threading.Thread(target=post, args=("slow.txt", {"X-Priority": "batch"}, bulk)) for _ in range(2)]
+    try:
+        for t in scripts:
+            t.start()
+        deadline = time.time() + 5
+        while pool.running_by_class["batch"] < 1 and time.time() < deadline:
+            time.sleep(0.01)
+        browser = threading.Thread(target=post, args=("fast.txt", {}, ui))
+        browser.start()
+        browser.join(3)
+        assert ui == [200]                          # done while the batch work is still stuck
+        assert pool.running_by_class["interactive"] == 0 and not bulk
+    finally:
+        gate.set()
+        for t in scripts:
+            t.join(5)
+        pool.shutdown()
+    assert bulk == [200, 200]
+
+def test_match_stream_emits_ndjson_rows_and_top_k(monkeypatch):
+    import json
+    import app_main
+    from workers import MatchPool
+
+    jds = {f"jd{i}.txt": {"score": s} for i, s in enumerate([10.0, 70.0, 40.0])}
+    def fake_score(analysis, items, cancel=None):
+        return [{"jd_file": n, "similarity_score_percent": e["score"]} for n, e in items]
+
+    pool = MatchPool(workers=2, max_queue=8, kind="thread")
+    monkeypatch.setattr(app_main, "get_pool", lambda: pool)
+    monkeypatch.setattr(app_main, "default_jd_cache", lambda: jds)
+    monkeypatch.setattr(app_main, "analyze_resume",
+                        lambda data, name, mode="full", fields=None, cancel=None: {"resume_name": name})
+    monkeypatch.setattr(app_main, "score_jds", fake_score)
+    on_pool = []
+    real_run = pool.run
+    async def recording_run(fn, *args, **kwargs):
+        on_pool.append(fn)
+        return await real_run(fn, *args, **kwargs)
+    monkeypatch.setattr(pool, "run", recording_run)
+
+    resume = {"resume": ("resume.txt", b"Python developer", "text/plain")}
+    try:
+        plain = client.post("/match/stream", files=resume)
+        ranked = client.post("/match/stream", files=resume, data={"top_k": "1"})
+    finally:
+        pool.shutdown()
+
+    events = [json.loads(ln) for ln in plain.text.splitlines()]
+    assert plain.headers["content-type"].startswith("application/x-ndjson")
+    assert sorted(e["data"]["jd_file"] for e in events if e["event"] == "result") == sorted(jds)
+    assert events[-1]["event"] == "done" and events[-1]["data"]["count"] == 3
+    assert events[-1]["data"]["quality_mode"] == plain.headers["x-quality-mode"]
+
+    top = [json.loads(ln) for ln in ranked.text.splitlines() if '"top_k"' in ln]
+    assert top[-1]["data"] == [{"jd_file": "jd1.txt", "similarity_score_percent": 70.0}]
+    assert app_main.default_jd_cache not in on_pool   # the JD set is not shipped back from a worker
+
+def test_match_stream_scores_under_the_request_deadline(monkeypatch):
+    import json
+    import time
+    import app_main
+    from workers import MatchPool
+
+    jds = {f"jd{i}.txt": {} for i in range(4)}
+    def fake_score(analysis, items, cancel=None):
+        time.sleep(0.2)
+        cancel.check()
+        return [{"jd_file": n, "similarity_score_percent": 50.0} for n, _ in items]
+
+    pool = MatchPool(workers=1, max_queue=8, kind="thread")
+    monkeypatch.setattr(app_main, "get_pool", lambda: pool)
+    monkeypatch.setattr(app_main, "default_jd_cache", lambda: jds)
+    monkeypatch.setattr(app_main, "analyze_resume",
+                        lambda data, name, mode="full", fields=None, cancel=None: {"resume_name": name})
+    monkeypatch.setattr(app_main, "score_jds", fake_score)
+    try:
+        response = client.post("/match/stream", files={"resume": ("resume.txt", b"Python", "text/plain")},
+                               headers={"X-Deadline-Ms": "300"})
+    finally:
+        pool.shutdown()
+
+    events = [json.loads(ln) for ln in response.text.splitlines()]
+    assert events[-1]["event"] == "done"
+    assert events[-1]["data"]["partial"] == "deadline"
+    assert 0 < events[-1]["data"]["count"] < len(jds)
+
+def test_results_csv_export_reuses_stored_match():
+    import csv as _csv
+    from result_store import get_result_store
+
+    rows = [
+        {"resume_file": "r.pdf", "jd_file": f"jd{i}.txt", "similarity_score_percent": float(i),
+         "matched_skills": ["Python"], "education_periods": [{"entry": "B.Tech", "start": "Jan 2016", "end": "Jan 2020"}]}
+        for i in range(450)
+    ]
+    match_id = get_result_store().put(rows)
+    response = client.get(f"/results/{match_id}.csv")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    parsed = list(_csv.reader(io.StringIO(response.text)))
+    assert parsed[0][:2] == ["Resume File", "JD File"]
+    assert len(parsed) == 451
+    assert parsed[-1][1] == "jd449.txt"
+
+    assert client.get("/results/does-not-exist.csv").status_code == 404
+
+def test_health_and_readiness_probes(monkeypatch, tmp_path):
+    import asyncio
+    import app_main
+    from jobs import get_job_store
+    from workers import MatchPool
+
+    assert client.get("/healthz").json() == {"status": "ok"}
+
+    pool = MatchPool(workers=1, max_queue=1, kind="thread")
+    monkeypatch.setattr(app_main, "get_pool", lambda: pool)
+    monkeypatch.setattr(app_main, "warmup", lambda: None)
+    monkeypatch.setitem(app_main._readiness, "status", "warming")
+
+    # warm-up runs in the background behind /readyz
+    assert client.get("/readyz").status_code == 503
+    asyncio.run(app_main._warm_in_background())
+    assert client.get("/readyz").json()["status"] == "ready"
+
+    # the lifespan, with its scratch state in tmp and no model loading
+    for var, name in (("JOBS_DB", "jobs.sqlite3"), ("UPLOAD_DIR", "uploads"), ("PROFILE_DIR", "profiles")):
+        monkeypatch.setenv(var, str(tmp_path / name))
+    monkeypatch.setenv("WARM_ON_STARTUP", "0")
+    monkeypatch.setitem(app_main._readiness, "status", "warming")
+    get_job_store.cache_clear()
+    try:
+        with TestClient(app) as c:
+            assert c.get("/readyz").json()["status"] == "ready"
+    finally:
+        get_job_store.cache_clear()
+    assert (tmp_path / "jobs.sqlite3").exists()
+
+def test_upload_over_size_limit_returns_413(monkeypatch):
+    monkeypatch.setenv("UPLOAD_MAX_MB", "0.01")
+    response = client.post(
+        "/match/batch",
+        files=[("resumes", ("r.txt", b"x" * 20000, "text/plain"))],
+    )
+    assert response.status_code == 413
+    assert "upload limit" in response.json()["error"]
+
+def test_missing_upload_field_returns_422():
+    response = client.post("/match/batch", files=[("jd_files", ("jd.txt", b"Python", "text/plain"))])
+    assert response.status_code == 422
+    assert "resumes" in response.json()["error"]
+
+def test_upload_profiling_requires_token_and_returns_summary(monkeypatch, tmp_path):
+    import app_main
+    from metrics import stage
+    from workers import MatchPool
+
+    def fake_match(resume, resume_name, jd_uploads=None, jd_cache=None, cancel=None, mode="full", fields=None):
+        with stage("extract_text"):
+            pass
+        return [{"resume_file": resume_name, "jd_file": "jd.txt", "similarity_score_percent": 50.0}]
+
+    pool = MatchPool(workers=1, max_queue=4, kind="thread")
+    monkeypatch.setattr(app_main, "get_pool", lambda: pool)
+    monkeypatch.setattr(app_main, "match_uploads", fake_match)
+    monkeypatch.setenv("PROFILE_TOKEN", "s3cret")
+    monkeypatch.setenv("PROFILE_DIR", str(tmp_path))
+    files = {"resume": ("r.txt", b"Python developer", "text/plain")}
+    try:
+        assert client.post("/upload?profile=wrong", files=files).status_code == 403
+        response = client.post(
+            "/upload", files=files,
+            headers={"X-Profile-Token": "s3cret", "X-Profile-Output": "inline"},
+        )
+    finally:
+        pool.shutdown()
+    assert response.status_code == 200
+    assert "extract_text" in response.text and "cumulative" in response.text
+    profile_id = response.headers["X-Profile-Id"]
+    assert (tmp_path / f"{profile_id}.prof").exists() and (tmp_path / f"{profile_id}.txt").exists()
+
+def test_jobs_submit_poll_results_and_cancel(monkeypatch, tmp_path):
+    import json
+    import app_main
+    from jobs import JobStore
+
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    monkeypatch.setattr(app_main, "get_job_store", lambda: store)
+
+    files = [("resumes", (f"r{i}.txt", b"Python developer", "text/plain")) for i in range(2)]
+    submitted = client.post("/jobs", files=files)
+    assert submitted.status_code == 202
+    job_id = submitted.json()["job_id"]
+    assert submitted.headers["Location"] == f"/jobs/{job_id}"
+    assert client.get(f"/jobs/{job_id}").json()["total"] == 2
+
+    store.checkpoint(job_id, 1, result=[{"jd_file": "jd.txt"}])
+    lines = [json.loads(ln) for ln in client.get(f"/jobs/{job_id}/results").text.splitlines()]
+    assert lines[0]["event"] == "result" and lines[0]["data"]["resume_file"] == "r1.txt"
+    assert lines[-1]["event"] == "done"
+
+    assert client.delete(f"/jobs/{job_id}").json()["status"] == "cancelled"
+    assert client.get("/jobs/nope").status_code == 404
+
+def test_rate_limit_returns_429_per_client(_fresh_rate_limiter, monkeypatch):
+    _fresh_rate_limiter.rate, _fresh_rate_limiter.burst = 0.01, 1
+    monkeypatch.setenv("API_KEYS", "bulk,ui")
+    monkeypatch.setenv("UPLOAD_MAX_MB", "0.01")     # admitted requests stop at 413
+    files = {"resume": ("r.txt", b"x" * 20000, "text/plain")}
+    first = client.post("/match/batch", files=[("resumes", files["resume"])], headers={"X-API-Key": "bulk"})
+    assert first.status_code != 429
+    limited = client.post("/match/batch", files=[("resumes", files["resume"])], headers={"X-API-Key": "bulk"})
+    assert limited.status_code == 429 and int(limited.headers["Retry-After"]) >= 1
+    other = client.post("/match/batch", files=[("resumes", files["resume"])], headers={"X-API-Key": "ui"})
+    assert other.status_code != 429
+    assert client.get("/healthz").status_code == 200
+
+def test_upload_deadline_returns_504_or_partial_rows(monkeypatch):
+    import time
+    import app_main
+    from cancellation import Cancelled
+    from workers import MatchPool
+
+    def slow_match(resume, resume_name, jd_uploads=None, jd_cache=None, cancel=None, mode="full", fields=None):
+        rows = [{"resume_file": resume_name, "jd_file": "jd0.txt", "similarity_score_percent": 50.0}]
+        while cancel.reason() is None:
+            time.sleep(0.01)
+        raise Cancelled(cancel.reason(), rows)
+
+    pool = MatchPool(workers=1, max_queue=4, kind="thread")
+    monkeypatch.setattr(app_main, "get_pool", lambda: pool)
+    monkeypatch.setattr(app_main, "match_uploads", slow_match)
+    files = {"resume": ("r.txt", b"Python developer", "text/plain")}
+    try:
+        timed_out = client.post("/upload?deadline_ms=100", files=files)
+        partial = client.post("/upload?deadline_ms=100&partial=1", files=files)
+    finally:
+        pool.shutdown()
+    assert timed_out.status_code == 504
+    assert partial.status_code == 200 and partial.headers["X-Partial-Results"] == "deadline"
+    assert "jd0.txt" in partial.text
+
+def test_match_batch_rejects_unknown_fields():
+    files = [("resumes", ("r.txt", b"Python developer", "text/plain"))]
+    response = client.post("/match/batch?fields=score,salary", files=files)
+    assert response.status_code == 400
+    assert "salary" in response.json()["error"]
+
+def test_upload_passes_fields_to_the_match(monkeypatch):
+    import app_main
+    from workers import MatchPool
+
+    seen = []
+    def fake_match(resume, resume_name, jd_uploads=None, jd_cache=None, cancel=None, mode="full", fields=None):
+        seen.append(fields)
+        return [{"resume_file": resume_name, "jd_file": "jd.txt", "similarity_score_percent": 50.0}]
+
+    pool = MatchPool(workers=1, max_queue=4, kind="thread")
+    monkeypatch.setattr(app_main, "get_pool", lambda: pool)
+    monkeypatch.setattr(app_main, "match_uploads", fake_match)
+    files = {"resume": ("r.txt", b"Python developer", "text/plain")}
+    try:
+        by_form = client.post("/upload", files=files, data={"fields": "score"})
+        by_query = client.post("/upload?fields=score,skills", files=files)
+        bad = client.post("/upload?fields=salary", files=files)
+    finally:
+        pool.shutdown()
+    assert by_form.status_code == 200 and by_query.status_code == 200
+    assert seen == [frozenset({"score"}), frozenset({"score", "skills"})]
+    assert "Not Checked" in by_form.text           # skills were not computed
+    assert bad.status_code == 400 and "salary" in bad.text
@@ -0,0 +1,115 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import asyncio
+import importlib.util
+import json
+
+import httpx
+import pytest
+from azure_asgi import LocalRequest, _FUNCTION_DEFAULTS
+
+APP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+@pytest.fixture
+def entry(monkeypatch, tmp_path):
+    """The function entry point (__init__.py) loaded as the Functions worker would, with scratch dirs in tmp."""
+    for key, value in _FUNCTION_DEFAULTS.items():
+        monkeypatch.setenv(key, value)
+    monkeypatch.setenv("UPLOAD_DIR", str(tmp_path / "uploads"))
+    monkeypatch.setenv("JOBS_DB", str(tmp_path / "jobs.sqlite3"))
+    monkeypatch.setenv("ARTIFACT_DIR", str(tmp_path / "no-bundle"))
+    monkeypatch.setenv("JD_CACHE_PATH", str(tmp_path / "jd_cache.json"))
+    spec = importlib.util.spec_from_file_location("function_app", os.path.join(APP_DIR, "__init__.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_function_serves_app_main_and_reports_cold_start(entry):
+    async def run():
+        try:
+            first = await entry.main(LocalRequest("GET", "http://localhost/api/healthz"))
+            ready = await entry.main(LocalRequest("GET", "http://localhost/api/readyz"))
+            missing = await entry.main(LocalRequest("GET", "http://localhost/api/results/nope.csv?x=1"))
+            built = httpx.Request("POST", "http://localhost/api/match/batch?fields=score,salary",
+                                  files=[("resumes", ("r.txt", b"Python developer", "text/plain"))])
+            bad = await entry.main(LocalRequest("POST", str(built.url), dict(built.headers), built.read()))
+            return first, ready, missing, bad
+        finally:
+            await entry._function.shutdown()
+
+    first, ready, missing, bad = asyncio.run(run())
+    assert first.status_code == 200 and json.loads(first.get_body()) == {"status": "ok"}
+    assert int(first.headers["X-Cold-Start-Ms"]) >= 0
+    assert {"bundle", "import", "startup", "first_request", "total"} <= set(entry._function.cold_start)
+    assert ready.status_code == 200            # WARM_ON_STARTUP=0: models load on first use
+    assert "X-Cold-Start-Ms" not in ready.headers
+    assert missing.status_code == 404
+    assert bad.status_code == 400 and "salary" in json.loads(bad.get_body())["error"]
+
+
+def _clear_bundle_env(monkeypatch):
+    for var in ("JD_CACHE_PATH", "SKILLNER_DATA_DIR"):
+        monkeypatch.setenv(var, "")
+        monkeypatch.delenv(var)
+
+
+def _write_bundle(root):
+    from artifacts import JD_FILES, MANIFEST, SKILLNER_FILES
+    from extractors import EXTRACTOR_VERSION
+
+    for name in SKILLNER_FILES + JD_FILES:
+        (root / name).write_bytes(b"{}")
+    (root / MANIFEST).write_text(json.dumps({"extractor_version": EXTRACTOR_VERSION}))
+
+
+def test_artifact_bundle_is_used_only_when_current(monkeypatch, tmp_path):
+    from artifacts import JD_FILES, MANIFEST, SKILLNER_FILES, use_bundle
+    from extractors import EXTRACTOR_VERSION
+
+    _clear_bundle_env(monkeypatch)
+    assert use_bundle(str(tmp_path)) is False                       # no manifest
+    for name in SKILLNER_FILES + JD_FILES:
+        (tmp_path / name).write_bytes(b"{}")
+    (tmp_path / MANIFEST).write_text(json.dumps({"extractor_version": "old"}))
+    assert use_bundle(str(tmp_path)) is False                       # stale
+    (tmp_path / MANIFEST).write_text(json.dumps({"extractor_version": EXTRACTOR_VERSION}))
+    assert use_bundle(str(tmp_path)) is True
+    assert os.environ["JD_CACHE_PATH"] == str(tmp_path / "jd_cache.json")
+    assert os.environ["SKILLNER_DATA_DIR"] == str(tmp_path)
+
+
+def test_bundle_jd_cache_wins_over_the_tmp_default_and_client_is_rightmost_hop(monkeypatch, tmp_path):
+    from azure_asgi import AsgiFunction
+
+    for key, value in _FUNCTION_DEFAULTS.items():
+        monkeypatch.setenv(key, value)
+    _clear_bundle_env(monkeypatch)
+    _write_bundle(tmp_path)
+    seen = {}
+
+    async def app(scope, receive, send):
+        if scope["type"] == "lifespan":
+            await receive()
+            await send({"type": "lifespan.startup.complete"})
+            await receive()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+        seen["client"] = scope["client"][0]
+        await send({"type": "http.response.start", "status": 204, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    function = AsgiFunction(app_factory=lambda: app, bundle_dir=str(tmp_path))
+
+    async def run():
+        try:
+            return await function(LocalRequest("GET", "http://localhost/api/healthz",
+                                               {"X-Forwarded-For": "6.6.6.6, 203.0.113.7:50123"}))
+        finally:
+            await function.shutdown()
+
+    assert asyncio.run(run()).status_code == 204
+    assert os.environ["JD_CACHE_PATH"] == str(tmp_path / "jd_cache.json")
+    assert seen["client"] == "203.0.113.7"
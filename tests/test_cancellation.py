@@ -0,0 +1,56 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pickle
+import time
+
+import pytest
+import cancellation
+from cancellation import CancelToken, Cancelled, checkpoint, using
+
+
+def test_deadline_and_cancel_are_seen_at_checkpoints():
+    assert CancelToken.after(None).reason() is None
+    expired = CancelToken(deadline=time.time() - 1)
+    with using(expired), pytest.raises(Cancelled) as exc:
+        checkpoint()
+    assert exc.value.reason == "deadline"
+    checkpoint()                                    # no token outside using()
+
+
+def test_cancel_reaches_a_pickled_copy_through_the_marker(tmp_path, monkeypatch):
+    monkeypatch.setenv("CANCEL_DIR", str(tmp_path))
+    token = CancelToken.after(60)
+    copy = pickle.loads(pickle.dumps(token))        # what a process worker receives
+    token.cancel()
+    cancellation._CANCELLED.discard(token.id)       # as seen from another process
+    assert copy.reason() == "disconnected"
+    token.close()
+    assert copy.reason() is None and list(tmp_path.iterdir()) == []
+
+
+def test_match_resume_to_jds_stops_between_jds_with_partial_rows(monkeypatch):
+    import matcher
+
+    token = CancelToken.after(60)
+    scored = []
+
+    def fake_score(analysis, name, entry):
+        scored.append(name)
+        if len(scored) == 2:
+            token.cancel()
+        return {"jd_file": name}
+
+    monkeypatch.setattr(matcher, "analyze_resume", lambda resume, resume_name=None, mode="full", fields=None, cancel=None: {})
+    monkeypatch.setattr(matcher, "score_jd", fake_score)
+    jds = {f"jd{i}": {} for i in range(5)}
+    try:
+        with pytest.raises(Cancelled) as exc:
+            matcher.match_resume_to_jds(b"resume", jds, "r.txt", cancel=token)
+    finally:
+        token.close()
+    assert scored == ["jd0", "jd1"]
+    assert exc.value.reason == "disconnected"
+    assert exc.value.partial == [{"jd_file": "jd0"}, {"jd_file": "jd1"}]
+    e = pickle.loads(pickle.dumps(exc.value))       # crosses the process pool intact
+    assert e.reason == "disconnected" and len(e.partial) == 2
@@ -0,0 +1,87 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import cpu_layout
+from cpu_layout import cgroup_cpu_limit, plan
+
+
+def test_threads_split_cores_between_workers_and_jobs():
+    cpus = list(range(8))
+    assert plan(cpus, processes=1, jobs_per_process=1).torch_threads == 8
+    assert plan(cpus, processes=2, jobs_per_process=2).torch_threads == 2
+    assert plan(cpus, processes=16, jobs_per_process=1).torch_threads == 1
+    layout = plan(cpus, processes=4, jobs_per_process=1, torch_threads=3)
+    assert layout.torch_threads == 3 and not layout.pinned
+    assert plan(cpus, 8, 1).tokenizers_parallel is False
+
+
+def test_pinned_workers_get_disjoint_slices():
+    cpus = list(range(10))
+    slices = [plan(cpus, processes=3, jobs_per_process=1, slot=i, pin=True).cpus for i in range(3)]
+    assert slices == [(0, 1, 2, 3), (4, 5, 6), (7, 8, 9)]
+    assert plan(cpus, 3, 1, slot=0, pin=True).torch_threads == 4
+    # more workers than cores: one core each, round robin
+    assert plan([0, 1], processes=3, jobs_per_process=1, slot=2, pin=True).cpus == (0,)
+
+
+def test_cgroup_quota_is_read(tmp_path):
+    f = tmp_path / "cpu.max"
+    f.write_text("250000 100000\n")
+    assert cgroup_cpu_limit(str(f)) == 2.5
+    f.write_text("max 100000\n")
+    assert cgroup_cpu_limit(str(f)) is None
+    assert cgroup_cpu_limit(str(tmp_path / "missing")) is None
+
+
+def test_configure_exports_threads_once_per_process(monkeypatch):
+    import torch
+
+    before = torch.get_num_threads()
+    for var in ("TORCH_THREADS", "OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS",
+                "RAYON_NUM_THREADS", "TOKENIZERS_PARALLELISM"):
+        monkeypatch.delenv(var, raising=False)
+    monkeypatch.setattr(cpu_layout, "_applied", None)
+    monkeypatch.setattr(cpu_layout, "available_cpus", lambda: [0, 1, 2, 3])
+    monkeypatch.setenv("WEB_CONCURRENCY", "2")
+    monkeypatch.setenv("MATCH_WORKERS", "1")
+    try:
+        layout = cpu_layout.configure()
+        assert layout.torch_threads == 2
+        assert os.environ["OMP_NUM_THREADS"] == "2" and os.environ["TOKENIZERS_PARALLELISM"] == "true"
+        assert torch.get_num_threads() == 2
+        monkeypatch.setenv("WEB_CONCURRENCY", "4")
+        assert cpu_layout.configure() is layout
+    finally:
+        torch.set_num_threads(before)
+
+
+def test_gunicorn_replacement_worker_reuses_the_dead_workers_slot(monkeypatch):
+    import runpy
+    from types import SimpleNamespace
+
+    for var, value in (("PRELOAD_MODELS", "0"), ("MATCH_EXECUTOR", "thread"), ("MATCH_WORKERS", "1"),
+                       ("WEB_CONCURRENCY", "2")):
+        monkeypatch.setenv(var, value)      # the config only setdefaults these
+    conf = runpy.run_path(os.path.join(os.path.dirname(__file__), "..", "gunicorn.conf.py"))
+    server = SimpleNamespace(WORKERS={})
+
+    def spawn(pid):
+        worker = SimpleNamespace()
+        conf["pre_fork"](server, worker)
+        server.WORKERS[pid] = worker
+        return worker.cpu_slot
+
+    assert [spawn(1), spawn(2)] == [0, 1]
+    del server.WORKERS[1]                   # slot 0's worker died
+    assert spawn(3) == 0
+    assert spawn(4) == 2                    # scaled up past WEB_CONCURRENCY
+
+
+def test_configure_does_not_import_torch():
+    import subprocess
+
+    out = subprocess.run(
+        [sys.executable, "-c", "import sys, cpu_layout; cpu_layout.configure(); print('torch' in sys.modules)"],
+        cwd=os.path.join(os.path.dirname(__file__), ".."), capture_output=True, text=True, check=True,
+    )
+    assert out.stdout.strip() == "False"
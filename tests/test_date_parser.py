@@ -0,0 +1,84 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import re
+from datetime import datetime
+
+import pytest
+from dateutil import parser as dparser
+
+from extractors import _parse_date, MONTH_TO_NUM, SEASON_TO_MONTH, RANGE_RE, SINGLE_RE
+
+
+def _reference_parse_date(s):
+    """The original fuzzy-dateutil implementation of _parse_date."""
+    s = (s or "").strip()
+    if not s:
+        return None
+    if re.fullmatch(r"(?i)present|current|now", s):
+        return datetime(9999, 1, 1)
+    m = re.match(r"(?i)(spring|summer|fall|autumn|winter)\s+(\d{4})", s)
+    if m:
+        return datetime(int(m.group(2)), SEASON_TO_MONTH[m.group(1).lower()], 1)
+    try:
+        dt = dparser.parse(s, default=datetime(1900, 1, 1), fuzzy=True, dayfirst=False)
+        return dt.replace(day=1)
+    except Exception:
+        return None
+
+
+YEARS = ["0100", "0999", "1899", "1900", "1999", "2000", "2020", "2024", "9998", "9999"]
+
+
+def _corpus():
+    words = list(MONTH_TO_NUM) + list(SEASON_TO_MONTH)
+    for w in words:
+        for variant in (w, w.upper(), w.title()):
+            for y in YEARS:
+                yield f"{variant} {y}"
+                yield f"{variant}   {y}"
+    for m in range(0, 100):
+        for y in YEARS:
+            yield f"{m}/{y}"
+            yield f"{m:02d}/{y}"
+            yield f"{m}-{y}"
+    for y in range(100, 10000, 7):
+        yield f"{y:04d}"
+    yield from ("Present", "present", "CURRENT", "Now", "", "  ", "Jan 2020 ", "Q3 2020", "Sept. 2020")
+
+    # tokens as they come out of the real regexes
+    text = (
+        "Software Engineer, Acme Labs  Jan 2019 - Present\n"
+        "B.Tech, ABC University 2014 – 2018\n"
+        "Intern 06/2017 to 08/2017\n"
+        "M.S. Computer Science Fall 2018 through Spring 2020\n"
+        "Analyst Sept 2020 until current\n"
+        "Started Summer 2021\n"
+    )
+    for m in RANGE_RE.finditer(text):
+        yield m.group("start")
+        yield m.group("end")
+    for m in SINGLE_RE.finditer(text):
+        yield m.group("single")
+
+
+def test_parse_date_matches_dateutil_on_corpus():
+    mismatches = []
+    for tok in _corpus():
+        try:
+            want = _reference_parse_date(tok)
+        except ValueError:
+            with pytest.raises(ValueError):
+                _parse_date(tok)
+            continue
+        got = _parse_date(tok)
+        if got != want:
+            mismatches.append((tok, got, want))
+    assert not mismatches, mismatches[:20]
+
+
+def test_parse_date_is_memoized():
+    _parse_date.cache_clear()
+    _parse_date("Jan 2020")
+    _parse_date("Jan 2020")
+    assert _parse_date.cache_info().hits >= 1
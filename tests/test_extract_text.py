@@ -0,0 +1,71 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import io
+import pytest
+import fitz
+from extractors import extract_text
+
+
+def _pdf_bytes(text: str) -> bytes:
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), text)
+    try:
+        return doc.tobytes()
+    finally:
+        doc.close()
+
+
+@pytest.mark.parametrize("wrap", [bytes, bytearray, memoryview, io.BytesIO])
+def test_extract_text_from_in_memory_sources(wrap):
+    raw = "Python developer\r\nSQL".encode("utf-8")
+    assert extract_text(wrap(raw), name="resume.txt") == "Python developer\nSQL"
+
+
+def test_extract_text_pdf_from_bytes_with_and_without_name():
+    raw = _pdf_bytes("Data Analyst skilled in Python")
+    assert "Data Analyst" in extract_text(raw, name="resume.pdf")
+    assert "Data Analyst" in extract_text(memoryview(raw))   # sniffed from %PDF
+
+
+def test_extract_text_from_bytes_does_not_touch_disk(monkeypatch):
+    import builtins, pathlib
+    def _no_io(*a, **k):
+        raise AssertionError("filesystem access on the in-memory path")
+    monkeypatch.setattr(builtins, "open", _no_io)
+    monkeypatch.setattr(pathlib.Path, "read_bytes", _no_io)
+    assert extract_text(b"Backend engineer, FastAPI", name="jd.txt") == "Backend engineer, FastAPI"
+
+
+def _docx_bytes(body_xml: str, header_xml: str = "") -> bytes:
+    import zipfile
+    ns = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        zf.writestr("[Content_Types].xml", "<Types/>")
+        zf.writestr("word/document.xml", f"<w:document {ns}><w:body>{body_xml}</w:body></w:document>")
+        if header_xml:
+            zf.writestr("word/header1.xml", f"<w:hdr {ns}>{header_xml}</w:hdr>")
+    return buf.getvalue()
+
+
+def _p(text: str) -> str:
+    return f"<w:p><w:r><w:t>{text}</w:t></w:r></w:p>"
+
+
+def test_extract_text_docx_streams_paragraphs_tables_and_headers():
+    body = (
+        _p("Experience")
+        + "<w:p><w:r><w:t>Software Engineer</w:t><w:tab/><w:t>Jan 2019 - Present</w:t></w:r></w:p>"
+        + "<w:tbl><w:tr>"
+        + "<w:tc>" + _p("Skills") + "</w:tc>"
+        + "<w:tc>" + _p("Python, SQL") + _p("Power BI") + "</w:tc>"
+        + "</w:tr></w:tbl>"
+    )
+    text = extract_text(_docx_bytes(body, header_xml=_p("Jane Doe | jane@example.com")), name="cv.docx")
+    assert text.splitlines() == [
+        "Jane Doe | jane@example.com",
+        "Experience",
+        "Software Engineer\tJan 2019 - Present",
+        "Skills | Python, SQL Power BI",
+    ]
@@ -0,0 +1,38 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import re
+import subprocess
+
+import pytest
+
+APP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# cumulative import time allowed per module, in ms; IMPORT_BUDGET_SCALE
+# stretches all of them on slow CI machines
+BUDGET_MS = {"extractors": 1000, "matcher": 1500, "app_main": 3000}
+HEAVY = ("torch", "sentence_transformers", "transformers", "spacy", "skillNer", "fitz", "dateutil")
+
+
+def _import_profile(module: str):
+    """(cumulative µs per imported module, modules left loaded) for `import module` in a fresh interpreter."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import sys, {module}; print(' '.join(sys.modules))"],
+        cwd=APP_DIR, capture_output=True, text=True, check=True,
+    )
+    cumulative = {}
+    for line in proc.stderr.splitlines():
+        m = re.match(r"import time:\s+\d+ \|\s+(\d+) \|\s*(\S+)", line)
+        if m:
+            cumulative[m.group(2)] = int(m.group(1))
+    return cumulative, set(proc.stdout.split())
+
+
+@pytest.mark.parametrize("module", sorted(BUDGET_MS))
+def test_import_stays_within_budget(module):
+    cumulative, loaded = _import_profile(module)
+    assert not loaded & set(HEAVY), f"import {module} loads {sorted(loaded & set(HEAVY))}; import them on first use"
+    budget = BUDGET_MS[module] * float(os.getenv("IMPORT_BUDGET_SCALE", "1"))
+    took = cumulative[module] / 1000
+    slowest = sorted(cumulative.items(), key=lambda kv: -kv[1])[1:6]
+    assert took <= budget, f"import {module} took {took:.0f}ms (budget {budget:.0f}ms); slowest: {slowest}"
@@ -0,0 +1,141 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import asyncio
+
+from jobs import JobRunner, JobStore
+from workers import MatchPool
+
+
+def _fake_build(jd_uploads):
+    return {name: {} for name, _ in jd_uploads}
+
+
+def _runner(store, pool, calls):
+    def fake_match(resume, resume_name, jd_uploads=None, jd_cache=None):
+        calls.append(resume_name)
+        if resume == b"bad":
+            raise ValueError("unreadable resume")
+        return [{"resume_file": resume_name, "jd_file": jd, "similarity_score_percent": 1.0} for jd in jd_cache]
+    return JobRunner(store, lambda: pool, match_fn=fake_match, build_jds_fn=_fake_build)
+
+
+def test_job_runs_checkpoints_and_streams_results(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    job_id = store.submit([("a.txt", b"ok"), ("b.txt", b"bad"), ("c.txt", b"ok")], [("jd.txt", b"Need Python")])
+    assert store.get(job_id)["status"] == "queued"
+
+    pool, calls = MatchPool(workers=2, max_queue=8, kind="thread"), []
+    try:
+        asyncio.run(_runner(store, pool, calls).run_job(job_id))
+    finally:
+        pool.shutdown()
+
+    job = store.get(job_id)
+    assert job["status"] == "done" and job["completed"] == 3 and job["failed_items"] == 1
+    results = list(store.results(job_id))
+    assert sorted(r["resume_file"] for r in results) == ["a.txt", "b.txt", "c.txt"]
+    assert [r["seq"] for r in results] == [1, 2, 3]
+    assert list(store.results(job_id, after=2)) == results[2:]
+    bad = next(r for r in results if r["resume_file"] == "b.txt")
+    assert "unreadable" in bad["error"]
+
+
+def test_restarted_runner_resumes_from_first_unfinished_item(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    store = JobStore(path)
+    job_id = store.submit([("a.txt", b"ok"), ("b.txt", b"ok")], [])
+    store.set_status(job_id, "running")
+    store.checkpoint(job_id, 0, result=[])          # a.txt finished before the "crash"
+
+    reopened = JobStore(path)                       # a new process: the old lease is gone
+    assert reopened.claim_job() == job_id
+    pool, calls = MatchPool(workers=1, max_queue=8, kind="thread"), []
+    runner = _runner(reopened, pool, calls)
+    try:
+        asyncio.run(runner.run_job(job_id))
+    finally:
+        pool.shutdown()
+    assert calls == ["b.txt"]
+    assert reopened.get(job_id)["status"] == "done"
+
+
+def test_cancelled_job_is_not_run(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    job_id = store.submit([("a.txt", b"ok")], [])
+    assert store.cancel(job_id) is True
+    assert store.cancel(job_id) is False
+    pool, calls = MatchPool(workers=1, max_queue=8, kind="thread"), []
+    try:
+        asyncio.run(_runner(store, pool, calls).run_job(job_id))
+    finally:
+        pool.shutdown()
+    assert calls == [] and store.get(job_id)["status"] == "cancelled"
+    assert store.claim_job() is None
+
+
+def test_saturated_pool_backoff_stops_once_the_job_is_cancelled(tmp_path):
+    from workers import PoolSaturated
+
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    job_id = store.submit([("a.txt", b"ok")], [])
+
+    class BusyPool:
+        workers, attempts = 1, 0
+
+        async def run(self, fn, *args):
+            self.attempts += 1
+            if self.attempts == 3:
+                store.cancel(job_id)
+            raise PoolSaturated(retry_after=60)
+
+    pool = BusyPool()
+    runner = JobRunner(store, lambda: pool, match_fn=lambda *a: [], build_jds_fn=_fake_build, max_backoff=0.01)
+    asyncio.run(asyncio.wait_for(runner.run_job(job_id), timeout=5))
+    assert pool.attempts == 3
+    assert store.get(job_id)["status"] == "cancelled" and store.item_body(job_id, 0) is None
+
+
+def test_sweep_deletes_only_old_finished_jobs(tmp_path):
+    import time
+
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    old = store.submit([("a.txt", b"ok")], [("jd.txt", b"jd")])
+    store.checkpoint(old, 0, result=[])
+    store.set_status(old, "done")
+    live = store.submit([("b.txt", b"ok")], [])
+    time.sleep(0.05)
+    assert store.sweep(max_age=10) == 0
+    assert store.sweep(max_age=0.01) == 1
+    assert store.get(old) is None and store.jds(old) == [] and list(store.results(old)) == []
+    assert store.get(live)["status"] == "queued" and store.item_body(live, 0) == b"ok"
+
+
+def test_a_job_is_claimed_by_one_store_until_its_lease_expires(tmp_path):
+    import threading
+    import time
+
+    path = str(tmp_path / "jobs.sqlite3")
+    job_id = JobStore(path).submit([("a.txt", b"ok")], [])
+    stores = [JobStore(path, lease=0.3) for _ in range(4)]
+    claimed, start = [], threading.Barrier(len(stores))
+
+    def claim(store):
+        start.wait()
+        claimed.append((store, store.claim_job()))
+    threads = [threading.Thread(target=claim, args=(s,)) for s in stores]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    winners = [store for store, got in claimed if got is not None]
+    assert len(winners) == 1 and [got for _, got in claimed].count(job_id) == 1
+
+    owner = winners[0]
+    other = next(s for s in stores if s is not owner)
+    assert other.claim_job(job_id) is None and other.renew(job_id) is False
+    owner.checkpoint(job_id, 0, result=[])            # renews the lease
+    assert other.claim_job() is None
+    time.sleep(0.35)
+    assert other.claim_job() == job_id                # owner went quiet: taken over
+    assert owner.renew(job_id) is False
@@ -67,3 +67,112 @@ def test_match_resume_to_jds(tmp_path, dummy_jd_cache):
             assert "start" in row
             assert "end" in row
 
+
+
+def test_mmap_embeddings_rows_match_and_file_is_reused(tmp_path, dummy_jd_cache):
+    from jd_cache import mmap_embeddings
+
+    npy = tmp_path / "jd.embeddings.npy"
+    out = mmap_embeddings(dummy_jd_cache, str(npy))
+    assert list(out["JD_1"]["embedding"]) == dummy_jd_cache["JD_1"]["embedding"]
+    assert out["JD_1"]["skills"] == ["Python", "SQL", "Power BI"]
+
+    mtime = npy.stat().st_mtime_ns
+    mmap_embeddings(dummy_jd_cache, str(npy))
+    assert npy.stat().st_mtime_ns == mtime      # unchanged embeddings: no rewrite
+
+
+def test_uploaded_jds_skip_skillner_when_skills_are_not_requested_or_shed(monkeypatch):
+    import jd_cache
+
+    class FakeSbert:
+        def encode(self, text):
+            import numpy as np
+            return np.zeros(3)
+
+    calls = []
+    monkeypatch.setattr(jd_cache, "extract_text", lambda raw, name=None: raw.decode())
+    monkeypatch.setattr(jd_cache, "extract_skills", lambda text, fast=False: calls.append((text, fast)) or ["Python"])
+    monkeypatch.setattr(jd_cache, "get_sbert", lambda: FakeSbert())
+    text = "Need Python, unique 91c2"
+    jds = [("jd.txt", text.encode())]
+
+    score_only = jd_cache.build_jd_cache_from_uploads(jds, fields=frozenset({"score"}))
+    assert calls == [] and "skills" not in score_only["jd.txt"]
+    shed = jd_cache.build_jd_cache_from_uploads(jds, mode="embedding_only")
+    assert calls == [] and "skills" not in shed["jd.txt"]
+    fast = jd_cache.build_jd_cache_from_uploads(jds, mode="fast_skills")
+    full = jd_cache.build_jd_cache_from_uploads(jds)
+    assert calls == [(text, True), (text, False)]
+    assert fast["jd.txt"]["skills"] == full["jd.txt"]["skills"] == ["Python"]
+
+
+def test_jd_cache_is_seeded_from_the_shipped_file_without_writing_it(tmp_path):
+    import json
+    from extractors import EXTRACTOR_VERSION
+    from jd_cache import load_or_build_jd_cache
+    from parse_cache import digest
+
+    jds = tmp_path / "JDS"
+    jds.mkdir()
+    (jds / "jd.txt").write_bytes(b"Need Python")
+    seed = tmp_path / "seed.json"
+    entry = {"text": "Need Python", "skills": ["Python"], "embedding": [0.1], "sha256": digest(b"Need Python"),
+             "version": EXTRACTOR_VERSION}
+    seed.write_text(json.dumps({"jd.txt": entry}))
+    before = seed.read_bytes()
+
+    cache_path = tmp_path / "_cache" / "jd_cache.json"
+    assert load_or_build_jd_cache(str(jds), str(cache_path), seed_path=str(seed)) == {"jd.txt": entry}
+    assert json.loads(cache_path.read_text()) == {"jd.txt": entry}
+    assert seed.read_bytes() == before
+
+
+@pytest.mark.parametrize("fields, keys, ran", [
+    ("score", {"similarity_score_percent"}, []),
+    ("skills", {"similarity_score_percent", "matched_skills", "missing_skills"}, ["skills"]),
+    (None, {"similarity_score_percent", "matched_skills", "missing_skills", "resume_location", "jd_location",
+            "education_periods", "experience_periods", "education_gaps", "experience_gaps",
+            "education_to_first_job_gap_months"}, ["location", "location", "periods", "skills"]),
+])
+def test_fields_limit_rows_and_skip_unrequested_work(monkeypatch, tmp_path, dummy_jd_cache, fields, keys, ran):
+    import numpy as np
+    import matcher
+
+    class FakeSbert:
+        def encode(self, text):
+            return np.full(384, 0.5, dtype=np.float32)
+
+    calls = []
+    monkeypatch.setattr(matcher, "_lazy_models", lambda: (None, FakeSbert()))
+    monkeypatch.setattr(matcher, "extract_skills", lambda text, fast=False: calls.append("skills") or ["Python"])
+    monkeypatch.setattr(matcher, "extract_resume_periods", lambda text: calls.append("periods") or ([], [], [], [], None))
+    monkeypatch.setattr(matcher, "extract_location", lambda text: calls.append("location") or "New York")
+
+    resume_path = tmp_path / "resume.txt"
+    resume_path.write_text("Data Analyst skilled in Python.", encoding="utf-8")
+    [row] = matcher.match_resume_to_jds(str(resume_path), dummy_jd_cache, fields=fields)
+    assert set(row) == keys | {"resume_file", "jd_file", "quality_mode"}
+    assert row["similarity_score_percent"] == 100.0     # same direction as the JD embedding
+    assert sorted(calls) == ran
+
+
+def test_unknown_fields_are_rejected():
+    from matcher import parse_fields
+
+    assert parse_fields("skills, location") == {"score", "skills", "location"}
+    assert parse_fields("") == parse_fields(None)
+    with pytest.raises(ValueError):
+        parse_fields("score,salary")
+
+
+
+def test_embedding_only_rows_leave_skills_out_instead_of_empty(dummy_jd_cache):
+    from matcher import _compare
+
+    entry = dict(dummy_jd_cache["JD_1"], skills=["Python"])
+    full = _compare([0.5] * 384, {"python"}, "NY", "JD_1", entry, "r.txt", mode="no_location")
+    cheap = _compare([0.5] * 384, {"python"}, "NY", "JD_1", entry, "r.txt", mode="embedding_only")
+    assert full["matched_skills"] == ["Python"] and full["jd_location"] == "Not Checked"
+    assert "matched_skills" not in cheap and "missing_skills" not in cheap
+    assert cheap["similarity_score_percent"] == 100.0
@@ -0,0 +1,118 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+from parse_cache import ParseCache, MISS, digest
+
+
+def test_memory_tier_returns_copies_and_counts_hits():
+    cache = ParseCache()
+    cache.put("k", ["Python", "SQL"])
+    got = cache.get("k")
+    assert got == ["Python", "SQL"]
+    got.append("mutated")
+    assert cache.get("k") == ["Python", "SQL"]
+    assert cache.get("other") is MISS
+    assert cache.stats["memory_hits"] == 2
+    assert cache.stats["misses"] == 1
+
+
+def test_memory_tier_evicts_least_recently_used_by_size():
+    cache = ParseCache(max_memory_bytes=300)
+    cache.put("a", "x" * 100)
+    cache.put("b", "y" * 100)
+    cache.get("a")                 # a is now most recent
+    cache.put("c", "z" * 100)      # over budget -> b goes
+    assert cache.get("b") is MISS
+    assert cache.get("a") == "x" * 100
+    assert cache.get("c") == "z" * 100
+
+
+def test_disk_tier_survives_new_instance_and_is_size_bounded(tmp_path):
+    db = str(tmp_path / "cache.sqlite3")
+    first = ParseCache(disk_path=db, max_disk_bytes=1000)
+    first.put(digest(b"resume"), {"text": "hello"})
+
+    second = ParseCache(disk_path=db, max_disk_bytes=1000)
+    assert second.get(digest(b"resume")) == {"text": "hello"}
+    assert second.stats["disk_hits"] == 1
+
+    for i in range(20):
+        second.put(f"k{i}", "v" * 200)
+    total = second._db().execute("SELECT SUM(size) FROM entries").fetchone()[0]
+    assert total <= 1000
+    assert second.get("k19") == "v" * 200
+
+
+def test_disk_hits_bump_atime_in_batches_and_replacing_keeps_the_size_exact(tmp_path):
+    db = str(tmp_path / "cache.sqlite3")
+    writer = ParseCache(disk_path=db)
+    for i in range(3):
+        writer.put(f"k{i}", "v" * 100)
+    writer.put("k0", "v" * 100)                     # replaced, not added
+    assert writer._disk_bytes == writer._db().execute("SELECT SUM(size) FROM entries").fetchone()[0]
+
+    reader = ParseCache(max_memory_bytes=0, disk_path=db)
+    reader.touch_batch, reader.touch_interval = 3, 3600.0
+    conn = reader._db()
+    writes = conn.total_changes
+    reader.get("k0"), reader.get("k1")
+    assert conn.total_changes == writes             # reads alone write nothing yet
+    reader.get("k2")
+    assert conn.total_changes == writes + 3
+
+
+@pytest.mark.skipif(os.name != "posix", reason="POSIX permissions")
+def test_disk_tier_is_refused_in_a_directory_others_can_write(tmp_path):
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    shared.chmod(0o777)
+    cache = ParseCache(disk_path=str(shared / "parse_cache.sqlite3"))
+    cache.put("k", "v")
+    assert cache.disk_path is None
+    assert not (shared / "parse_cache.sqlite3").exists()
+    assert cache.get("k") == "v"                    # the memory tier still works
+
+
+def test_extract_text_is_cached_by_content(tmp_path):
+    from extractors import extract_text
+    from parse_cache import get_parse_cache
+
+    a = tmp_path / "a.txt"
+    b = tmp_path / "b.txt"
+    a.write_text("Same resume body", encoding="utf-8")
+    b.write_text("Same resume body", encoding="utf-8")
+    before = get_parse_cache().stats["memory_hits"]
+    assert extract_text(str(a)) == extract_text(str(b)) == "Same resume body"
+    assert get_parse_cache().stats["memory_hits"] == before + 1
+
+
+def test_fast_skills_never_stand_in_for_full_ones(monkeypatch):
+    import extractors
+
+    calls = []
+    def fake(text, skillner=True):
+        calls.append(skillner)
+        return ["Python", "SkillNer"] if skillner else ["Python"]
+
+    monkeypatch.setattr(extractors, "_extract_skills_uncached", fake)
+    text = "Unique fast-mode resume body 7f3c"
+    assert extractors.extract_skills(text, fast=True) == ["Python"]
+    assert extractors.extract_skills(text) == ["Python", "SkillNer"]
+    # once the full result exists, fast mode reuses it
+    assert extractors.extract_skills(text, fast=True) == ["Python", "SkillNer"]
+    assert calls == [False, True]
+
+
+def test_a_miss_racing_a_finished_flight_reuses_its_value():
+    cache = ParseCache()
+    runs = []
+
+    def compute():
+        runs.append(1)
+        return ["Python"]
+
+    assert cache.get("skills:v1:race") is MISS      # this caller missed...
+    cache.put("skills:v1:race", ["Python"])         # ...as another flight finished and stored it
+    assert cache._compute_and_put("skills:v1:race", compute) == ["Python"]
+    assert runs == []
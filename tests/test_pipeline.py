@@ -0,0 +1,60 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from cancellation import CancelToken, Cancelled, checkpoint, using
+from metrics import collect
+from pipeline import Stage, run_stages
+
+
+def test_independent_stages_overlap_and_are_timed():
+    def slow(x):
+        time.sleep(0.3)
+        return x + 1
+
+    stages = [Stage("a", slow, ("text",)), Stage("b", slow, ("text",)), Stage("c", slow, ("text",)),
+              Stage("total", lambda a, b, c: a + b + c, ("a", "b", "c"))]
+    with ThreadPoolExecutor(3) as pool:
+        t0 = time.perf_counter()
+        done, report = collect(run_stages, stages, {"text": 1}, pool)
+        elapsed = time.perf_counter() - t0
+    assert done["total"] == 6
+    assert elapsed < 0.6                            # about the slowest stage, not the sum
+    assert sorted(name for name, _ in report["stages"]) == ["a", "b", "c", "total"]
+
+    with pytest.raises(ValueError):
+        run_stages([Stage("x", slow, ("y",)), Stage("y", slow, ("x",))], {})
+
+
+def test_stage_errors_and_cancellation_reach_the_caller():
+    token = CancelToken.after(60)
+    def cancel_then_check(text):
+        token.cancel()
+        checkpoint()
+    stages = [Stage("a", cancel_then_check, ("text",)), Stage("b", lambda t: t, ("text",)),
+              Stage("after", lambda a, b: None, ("a", "b"))]
+    try:
+        with ThreadPoolExecutor(2) as pool, using(token):
+            with pytest.raises(Cancelled):
+                run_stages(stages, {"text": "x"}, pool)
+    finally:
+        token.close()
+
+
+def test_profiled_match_stages_show_up_in_the_profile(monkeypatch, tmp_path):
+    from functools import partial
+    from extractors import extract_skills
+    from profiling import run_profiled
+
+    monkeypatch.setenv("PROFILE_DIR", str(tmp_path))
+    text = "Python and SQL developer, profiled 4d1e"
+    stages = [Stage("resume_skills", partial(extract_skills, fast=True), ("text",)),
+              Stage("resume_length", len, ("text",))]
+    with ThreadPoolExecutor(2) as pool:
+        (done, profile), report = collect(run_profiled, run_stages, stages, {"text": text}, pool)
+    assert done["resume_length"] == len(text)
+    assert "(extract_skills)" in profile["summary"]  # a cProfile frame, not just the stage timing
+    assert {"resume_skills", "resume_length"} <= {name for name, _ in report["stages"]}
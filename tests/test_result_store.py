@@ -0,0 +1,42 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import time
+
+from result_store import ResultStore
+
+
+def test_result_sets_are_shared_between_workers_and_expire(tmp_path):
+    path = str(tmp_path / "results.sqlite3")
+    web1, web2 = ResultStore(path, ttl=0.2), ResultStore(path, ttl=0.2)   # two worker processes
+    rows = [{"jd_file": "jd.txt", "similarity_score_percent": 50.0, "matched_skills": ["python"]}]
+    match_id = web1.put(rows)
+    assert web2.get(match_id) == rows
+    assert web2.get("nope") is None
+    time.sleep(0.3)
+    assert web2.get(match_id) is None
+
+
+def test_oldest_result_sets_go_first_past_max_entries(tmp_path):
+    store = ResultStore(str(tmp_path / "results.sqlite3"), max_entries=2)
+    ids = [store.put([{"i": i}]) for i in range(3)]
+    assert store.get(ids[0]) is None
+    assert store.get(ids[2]) == [{"i": 2}]
+
+
+def test_rows_are_read_back_lazily_a_batch_at_a_time(tmp_path, monkeypatch):
+    import result_store
+
+    store = ResultStore(str(tmp_path / "results.sqlite3"))
+    match_id = store.put([{"i": i} for i in range(450)])
+    decoded = []
+    real_loads = result_store.json.loads
+    monkeypatch.setattr(result_store.json, "loads", lambda s: decoded.append(s) or real_loads(s))
+
+    rows = store.iter_rows(match_id, batch=100)
+    assert decoded == []                            # nothing read before the first row is wanted
+    assert next(rows) == {"i": 0}
+    assert len(decoded) == 1
+    store.put([{"late": True}])                     # writes go on while the export is open
+    assert [r["i"] for r in rows] == list(range(1, 450))
+    assert store.iter_rows("nope") is None
@@ -0,0 +1,131 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import asyncio
+import threading
+import time
+
+import pytest
+from cancellation import CancelToken, Cancelled
+from singleflight import AsyncSingleFlight, SingleFlight
+
+
+def _concurrently(n, fn):
+    out, errors = [None] * n, []
+    def run(i):
+        try:
+            out[i] = fn()
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return out, errors
+
+
+def test_concurrent_identical_calls_run_once_and_get_copies():
+    flight = SingleFlight()
+    runs = []
+    def work():
+        runs.append(1)
+        time.sleep(0.2)
+        return {"skills": ["Python"]}
+
+    out, errors = _concurrently(5, lambda: flight.do("skills:abc", work))
+    assert not errors and len(runs) == 1
+    assert all(r == {"skills": ["Python"]} for r in out)
+    assert len({id(r) for r in out}) == 5          # waiters may mutate their copy
+    flight.do("skills:abc", work)
+    assert len(runs) == 2                          # nothing is kept once done
+
+
+def test_errors_are_shared_but_a_cancelled_leader_is_retried():
+    flight = SingleFlight()
+    def fail():
+        time.sleep(0.1)
+        raise ValueError("bad pdf")
+    _, errors = _concurrently(3, lambda: flight.do("text:x", fail))
+    assert len(errors) == 3 and all(isinstance(e, ValueError) for e in errors)
+
+    runs = []
+    def cancelled_once():
+        runs.append(1)
+        time.sleep(0.1)
+        if len(runs) == 1:
+            raise Cancelled("disconnected")
+        return "ok"
+    out, errors = _concurrently(3, lambda: flight.do("text:y", cancelled_once))
+    assert len(errors) == 1 and isinstance(errors[0], Cancelled)
+    assert sorted(o for o in out if o) == ["ok", "ok"]
+
+
+def test_parse_cache_computes_concurrent_misses_once():
+    from parse_cache import ParseCache
+
+    cache = ParseCache()
+    runs = []
+    def compute():
+        runs.append(1)
+        time.sleep(0.2)
+        return ["Python"]
+    out, _ = _concurrently(4, lambda: cache.get_or_compute("skills:v1:same", compute))
+    assert len(runs) == 1 and out == [["Python"]] * 4
+
+
+def test_async_waiters_share_one_task_that_survives_a_cancelled_waiter():
+    flight = AsyncSingleFlight()
+    runs = []
+
+    async def build(token):
+        runs.append(1)
+        await asyncio.sleep(0.1)
+        return {"jd.txt": {}}
+
+    async def main():
+        first = asyncio.ensure_future(flight.run("jds:pack", build))
+        others = [asyncio.ensure_future(flight.run("jds:pack", build)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        first.cancel()
+        results = await asyncio.gather(*others)
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return results
+
+    results = asyncio.run(main())
+    assert len(runs) == 1
+    assert all(r == {"jd.txt": {}} for r in results)
+
+
+def test_async_shared_token_is_cancelled_only_once_every_waiter_has_gone():
+    flight = AsyncSingleFlight()
+    flight.poll = 0.01
+    tokens, stopped = [], []
+
+    async def build(token):
+        tokens.append(token)
+        while token.reason() is None:
+            await asyncio.sleep(0.01)
+        stopped.append(token.reason())
+        raise Cancelled(token.reason())
+
+    async def main():
+        mine, theirs = CancelToken(), CancelToken()
+        first = asyncio.ensure_future(flight.run("jds:pack", build, cancel=mine))
+        second = asyncio.ensure_future(flight.run("jds:pack", build, cancel=theirs))
+        await asyncio.sleep(0.05)
+        mine.cancel()
+        with pytest.raises(Cancelled):
+            await first
+        assert not stopped                          # the other request still waits on it
+        theirs.cancel()
+        with pytest.raises(Cancelled):
+            await second
+        await asyncio.sleep(0.05)
+        assert stopped == ["disconnected"]
+        # a later caller does not inherit the abandoned flight
+        assert await flight.run("jds:pack", lambda token: asyncio.sleep(0, result="fresh")) == "fresh"
+
+    asyncio.run(main())
+    assert len(tokens) == 1
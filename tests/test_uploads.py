@@ -0,0 +1,113 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import asyncio
+import hashlib
+import io
+
+import pytest
+from starlette.datastructures import UploadFile
+from uploads import FormError, UploadSession, UploadTooLarge
+
+
+def _upload(name, data):
+    return UploadFile(io.BytesIO(data), filename=name)
+
+
+def test_small_bodies_stay_in_memory_and_large_ones_spool_then_get_deleted(tmp_path):
+    small, large = b"x" * 100, os.urandom(300 * 1024)
+
+    async def main():
+        async with UploadSession(max_file_bytes=1 << 20, max_total_bytes=1 << 21,
+                                 spool_bytes=64 * 1024, spool_dir=str(tmp_path)) as s:
+            a = await s.ingest(_upload("a.txt", small))
+            b = await s.ingest(_upload("b.pdf", large))
+            assert a.source == small and a.path is None
+            assert b.path and b.path.endswith(".pdf") and open(b.path, "rb").read() == large
+            assert b.sha256 == hashlib.sha256(large).hexdigest() and b.size == len(large)
+        return b.path
+
+    spooled = asyncio.run(main())
+    assert not os.path.exists(spooled)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_oversized_upload_is_rejected_without_leaving_files(tmp_path):
+    async def main():
+        async with UploadSession(max_file_bytes=200 * 1024, max_total_bytes=1 << 21,
+                                 spool_bytes=64 * 1024, spool_dir=str(tmp_path)) as s:
+            await s.ingest(_upload("big.pdf", b"y" * (512 * 1024)))
+
+    with pytest.raises(UploadTooLarge):
+        asyncio.run(main())
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_request_total_cap_applies_across_files(tmp_path):
+    async def main():
+        async with UploadSession(max_file_bytes=1 << 20, max_total_bytes=150 * 1024,
+                                 spool_bytes=1 << 20, spool_dir=str(tmp_path)) as s:
+            await s.ingest_all([_upload(f"{i}.txt", b"z" * (100 * 1024)) for i in range(2)])
+
+    with pytest.raises(UploadTooLarge):
+        asyncio.run(main())
+
+
+class _StreamedRequest:
+    """The bits of a starlette Request ingest_form reads: headers and stream()."""
+
+    def __init__(self, body: bytes, content_type: str, chunk: int = 4096, content_length: bool = True):
+        self.headers = {"content-type": content_type}
+        if content_length:
+            self.headers["content-length"] = str(len(body))
+        self.body, self.chunk, self.read = body, chunk, 0
+
+    async def stream(self):
+        for i in range(0, len(self.body), self.chunk):
+            self.read += self.chunk
+            yield self.body[i:i + self.chunk]
+
+
+def _multipart(files, data=None):
+    import httpx
+    built = httpx.Request("POST", "http://test/", files=files, data=data)
+    return built.read(), built.headers["content-type"]
+
+
+def test_form_is_streamed_into_the_session(tmp_path):
+    resume = os.urandom(200 * 1024)
+    body, ctype = _multipart(
+        [("resume", ("cv.pdf", resume, "application/pdf")), ("jd_files", ("", b"", "application/octet-stream"))],
+        {"fields": "score,skills"},
+    )
+
+    async def main():
+        async with UploadSession(spool_bytes=64 * 1024, spool_dir=str(tmp_path)) as s:
+            form = await s.ingest_form(_StreamedRequest(body, ctype))
+            doc = form.file("resume")
+            assert doc.name == "cv.pdf" and doc.path and open(doc.path, "rb").read() == resume
+            assert doc.sha256 == hashlib.sha256(resume).hexdigest()
+            assert form.files("jd_files") == []          # "no file chosen" part
+            assert form.get("fields") == "score,skills"
+            with pytest.raises(FormError):
+                form.file("missing")
+
+    asyncio.run(main())
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.parametrize("content_length", [True, False])
+def test_oversized_form_is_refused_before_the_body_is_read(tmp_path, content_length):
+    body, ctype = _multipart([("resume", ("cv.txt", b"x" * (3 << 20), "text/plain"))])
+    request = _StreamedRequest(body, ctype, content_length=content_length)
+
+    async def main():
+        async with UploadSession(max_file_bytes=1 << 20, max_total_bytes=1 << 20, spool_bytes=64 * 1024,
+                                 spool_dir=str(tmp_path)) as s:
+            await s.ingest_form(request)
+
+    with pytest.raises(UploadTooLarge):
+        asyncio.run(main())
+    # declared length: nothing read; chunked: stopped just past the cap
+    assert request.read == 0 if content_length else request.read < (1 << 20) + 3 * 4096
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,277 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import asyncio
+import threading
+import time
+
+import pytest
+from workers import MatchPool, PoolSaturated, QUEUE_WAIT
+
+
+def _slow(x, delay=0.05):
+    time.sleep(delay)
+    return x * 2
+
+
+def test_pool_runs_jobs_and_records_queue_wait():
+    pool = MatchPool(workers=2, max_queue=10, kind="thread")
+    before = QUEUE_WAIT.count()
+
+    async def main():
+        return await asyncio.gather(*(pool.run(_slow, i) for i in range(6)))
+
+    try:
+        assert asyncio.run(main()) == [0, 2, 4, 6, 8, 10]
+    finally:
+        pool.shutdown()
+    assert QUEUE_WAIT.count() == before + 6
+    assert pool.running == 0 and pool.queued == 0
+
+
+def test_pool_rejects_when_queue_is_full():
+    pool = MatchPool(workers=1, max_queue=1, kind="thread")
+    gate = threading.Event()
+
+    async def main():
+        first = asyncio.ensure_future(pool.run(gate.wait))
+        await asyncio.sleep(0.05)
+        second = asyncio.ensure_future(pool.run(_slow, 1, 0))   # waits in the queue
+        await asyncio.sleep(0.05)
+        with pytest.raises(PoolSaturated) as exc:
+            await pool.run(_slow, 2, 0)
+        assert exc.value.retry_after >= 1
+        gate.set()
+        return await first, await second
+
+    try:
+        assert asyncio.run(main()) == (True, 2)
+    finally:
+        pool.shutdown()
+
+
+def _staged(x):
+    from metrics import stage, record_cache
+    with stage("test_stage"):
+        record_cache("test", "miss")
+        return x + 1
+
+
+def test_stage_timings_travel_back_from_workers():
+    from metrics import STAGE_SECONDS, CACHE_LOOKUPS, REGISTRY, collect
+
+    result, report = collect(_staged, 1)
+    assert result == 2 and report["stages"][0][0] == "test_stage"
+    assert report["cache"] == {("test", "miss"): 1}
+
+    pool = MatchPool(workers=1, max_queue=1, kind="thread")
+    before = STAGE_SECONDS.count(stage="test_stage")
+    try:
+        assert asyncio.run(pool.run(_staged, 1)) == 2
+    finally:
+        pool.shutdown()
+    assert STAGE_SECONDS.count(stage="test_stage") == before + 1
+    assert CACHE_LOOKUPS.value(kind="test", result="miss") >= 1
+    assert 'match_stage_seconds_count{stage="test_stage"}' in REGISTRY.render()
+
+
+def test_fair_queue_interleaves_clients_by_weight():
+    from admission import FairQueue
+
+    q = FairQueue(weights={"ui": 2.0})
+    for i in range(4):
+        q.push("bulk", f"bulk{i}")
+    for i in range(4):
+        q.push("ui", f"ui{i}")
+    order = [q.pop() for _ in range(6)]
+    # ui gets two turns for each of bulk's despite queueing after it
+    assert order == ["ui0", "bulk0", "ui1", "ui2", "bulk1", "ui3"]
+    assert len(q) == 2 and q.clients == 1
+
+
+def test_client_key_honors_only_known_api_keys_and_trusted_proxy_hops(monkeypatch):
+    from admission import client_key
+
+    monkeypatch.setenv("API_KEYS", "ui-key")
+    monkeypatch.setenv("CLIENT_WEIGHTS", "key:bulk-sync=0.5")
+    monkeypatch.delenv("TRUSTED_PROXY_HOPS", raising=False)
+    xff = {"x-forwarded-for": "6.6.6.6, 1.2.3.4"}
+    assert client_key({"x-api-key": "ui-key"}, "10.0.0.1") == "key:ui-key"
+    assert client_key({"x-api-key": "bulk-sync"}, "10.0.0.1") == "key:bulk-sync"
+    assert client_key({"x-api-key": "made-up"}, "10.0.0.1") == "ip:10.0.0.1"
+    assert client_key(xff, "10.0.0.1") == "ip:10.0.0.1"        # not trusted by default
+    monkeypatch.setenv("TRUSTED_PROXY_HOPS", "1")
+    assert client_key(xff, "10.0.0.1") == "ip:1.2.3.4"          # the spoofed left entry is ignored
+    assert client_key({}, "10.0.0.1") == "ip:10.0.0.1"
+
+
+def test_pool_caps_queue_slots_per_client():
+    from admission import current_client
+
+    pool = MatchPool(workers=1, max_queue=4, kind="thread", max_queue_per_client=1)
+    gate = threading.Event()
+
+    async def main():
+        current_client.set("bulk")
+        first = asyncio.ensure_future(pool.run(gate.wait))
+        await asyncio.sleep(0.05)
+        second = asyncio.ensure_future(pool.run(_slow, 1, 0))
+        await asyncio.sleep(0.05)
+        with pytest.raises(PoolSaturated):
+            await pool.run(_slow, 2, 0)             # bulk already holds its one slot
+        current_client.set("ui")
+        third = asyncio.ensure_future(pool.run(_slow, 3, 0))
+        await asyncio.sleep(0.05)
+        gate.set()
+        return await first, await second, await third
+
+    try:
+        assert asyncio.run(main()) == (True, 2, 6)
+    finally:
+        pool.shutdown()
+
+
+def test_cancelled_caller_keeps_the_slot_until_its_job_finishes():
+    pool = MatchPool(workers=1, max_queue=0, kind="thread")
+    gate = threading.Event()
+
+    async def main():
+        caller = asyncio.ensure_future(pool.run(gate.wait, 5))
+        await asyncio.sleep(0.05)
+        caller.cancel()                                 # e.g. the client disconnected
+        with pytest.raises(asyncio.CancelledError):
+            await caller
+        assert pool.running == 1                        # the worker is still on it
+        with pytest.raises(PoolSaturated):
+            await pool.run(_slow, 1)
+        gate.set()
+        for _ in range(100):
+            if pool.running == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert pool.running == 0
+        return await pool.run(_slow, 2)
+
+    try:
+        assert asyncio.run(main()) == 4
+    finally:
+        pool.shutdown()
+
+
+def test_interactive_work_goes_ahead_of_batch_and_batch_leaves_a_worker_free():
+    from admission import current_priority
+
+    pool = MatchPool(workers=2, max_queue=16, kind="thread")
+    gate = threading.Event()
+    order = []
+
+    def job(name, wait=False):
+        if wait:
+            gate.wait()
+        order.append(name)
+
+    async def submit(cls, *args):
+        current_priority.set(cls)
+        return await pool.run(job, *args)
+
+    async def main():
+        blocker = asyncio.ensure_future(submit("batch", "batch-blocker", True))
+        await asyncio.sleep(0.05)
+        assert pool.running_by_class["batch"] == 1
+        queued_batch = asyncio.ensure_future(submit("batch", "batch-queued"))
+        await asyncio.sleep(0.05)
+        assert pool.running == 1 and pool.queued == 1     # second worker kept for interactive
+        await submit("interactive", "interactive")        # starts at once on the free worker
+        gate.set()
+        await asyncio.gather(blocker, queued_batch)
+
+    try:
+        asyncio.run(main())
+    finally:
+        pool.shutdown()
+    assert order.index("interactive") < order.index("batch-queued")
+
+
+def test_single_worker_batch_only_borrows_an_idle_worker():
+    from admission import current_priority
+
+    pool = MatchPool(workers=1, max_queue=16, kind="thread")
+    assert pool.batch_max_running == 0
+    gate = threading.Event()
+    order = []
+
+    def job(name, wait=False):
+        if wait:
+            gate.wait()
+        order.append(name)
+
+    async def submit(cls, *args):
+        current_priority.set(cls)
+        return await pool.run(job, *args)
+
+    async def main():
+        await submit("batch", "batch-idle")                 # nothing else wants the worker
+        blocker = asyncio.ensure_future(submit("interactive", "interactive-blocker", True))
+        await asyncio.sleep(0.05)
+        queued_batch = asyncio.ensure_future(submit("batch", "batch-queued"))
+        await asyncio.sleep(0.05)
+        interactive = asyncio.ensure_future(submit("interactive", "interactive"))
+        await asyncio.sleep(0.05)
+        assert pool.queued == 2
+        gate.set()
+        await asyncio.gather(blocker, queued_batch, interactive)
+
+    try:
+        asyncio.run(main())
+    finally:
+        pool.shutdown()
+    assert order == ["batch-idle", "interactive-blocker", "interactive", "batch-queued"]
+
+
+def test_priority_queue_ages_batch_waiters():
+    import time as _time
+    from admission import PriorityQueue
+
+    q = PriorityQueue(aging_seconds=0.05)
+    q.push("c", "old-batch", "batch")
+    _time.sleep(0.12)
+    q.push("c", "new-ui", "interactive")
+    assert q.pop() == ("old-batch", "batch")
+    assert q.pop() == ("new-ui", "interactive")
+    assert q.pop() is None
+
+
+def test_quality_mode_follows_pressure_and_only_degrades_on_request(monkeypatch):
+    import load_shedding
+    from load_shedding import pick_quality_mode
+
+    class Pool:
+        max_queue = 10
+        queued = 0
+
+    pool = Pool()
+    monkeypatch.setattr(load_shedding, "_cpu_pressure", lambda: 0.0)
+    monkeypatch.setenv("QUALITY_SHEDDING", "1")
+    monkeypatch.setenv("QUALITY_THRESHOLDS", "0.5,0.75,0.9")
+    picks = []
+    for queued in (0, 5, 8, 10):
+        pool.queued = queued
+        picks.append(pick_quality_mode(pool))
+    assert picks == ["full", "no_location", "fast_skills", "embedding_only"]
+
+    pool.queued = 0
+    assert pick_quality_mode(pool, "fast_skills") == "fast_skills"
+    monkeypatch.setattr(load_shedding, "_cpu_pressure", lambda: 0.8)
+    assert pick_quality_mode(pool) == "fast_skills"
+    assert pick_quality_mode(pool, "full") == "fast_skills"      # cannot ask for better
+    monkeypatch.delenv("QUALITY_SHEDDING")
+    assert pick_quality_mode(pool) == "full"                    # off by default
+
+
+def test_cpu_pressure_prefers_cgroup_psi(tmp_path):
+    from load_shedding import _cpu_pressure
+
+    psi = tmp_path / "cpu.pressure"
+    psi.write_text("some avg10=42.50 avg60=10.00 avg300=1.00 total=123\nfull avg10=0.00 avg60=0.00 avg300=0.00 total=0\n")
+    assert _cpu_pressure(str(psi)) == pytest.approx(0.425)
+    assert _cpu_pressure(str(tmp_path / "missing")) >= 0.0      # load average fallback
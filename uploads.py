@@ -0,0 +1,323 @@
+# uploads.py
+
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+from metrics import stage
+
+try:
+    import python_multipart as multipart
+    from python_multipart.multipart import parse_options_header
+except ModuleNotFoundError:
+    import multipart
+    from multipart.multipart import parse_options_header
+
+log = logging.getLogger(__name__)
+
+APP_DIR = Path(__file__).resolve().parent
+CHUNK_SIZE = 64 * 1024
+_SPOOL_PREFIX = "upload-"
+# multipart framing (boundaries, part headers) allowed on top of the body caps
+FORM_OVERHEAD = 1024 * 1024
+MAX_FIELD_BYTES = 64 * 1024
+
+
+class UploadTooLarge(Exception):
+    """Raised while reading an upload once it (or the request) passes its size cap."""
+
+    def __init__(self, name: str, limit: int):
+        super().__init__(f"{name or 'upload'} exceeds the {limit // (1024 * 1024)} MB upload limit")
+        self.name = name
+        self.limit = limit
+
+
+class FormError(ValueError):
+    """The request body is not a usable multipart form (or lacks a required file)."""
+
+
+class IngestedUpload:
+    """
+    One uploaded file after ingestion: its sha256 and size, and its body either
+    in memory (`data`) or spooled to a temporary file (`path`). `source` is
+    what the extractors take, bytes or a path; both pickle cheaply to workers.
+    """
+
+    def __init__(self, name: str, sha256: str, size: int, data: Optional[bytes] = None, path: Optional[str] = None):
+        self.name = name
+        self.sha256 = sha256
+        self.size = size
+        self.data = data
+        self.path = path
+
+    @property
+    def source(self) -> Union[bytes, str]:
+        return self.data if self.path is None else self.path
+
+    def read_bytes(self) -> bytes:
+        return self.data if self.path is None else Path(self.path).read_bytes()
+
+    def cleanup(self) -> None:
+        if self.path is not None:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+
+
+class _Spool:
+    """
+    One upload's body as it arrives: hashed and counted chunk by chunk
+    against the session's caps, kept in memory up to `spool_bytes` and
+    written to a file in `spool_dir` past that. File writes run in a thread
+    so a slow disk does not stall the event loop.
+    """
+
+    def __init__(self, session: "UploadSession", name: str):
+        self.session = session
+        self.name = name
+        self.hash = hashlib.sha256()
+        self.size = 0
+        self.chunks: List[bytes] = []
+        self.file = None
+
+    def _open(self, head: List[bytes]):
+        self.session.spool_dir.mkdir(parents=True, exist_ok=True)
+        f = tempfile.NamedTemporaryFile(
+            dir=self.session.spool_dir, prefix=_SPOOL_PREFIX, suffix=Path(self.name).suffix.lower(), delete=False
+        )
+        f.writelines(head)
+        return f
+
+    async def write(self, chunk: bytes) -> None:
+        s = self.session
+        self.size += len(chunk)
+        s.total += len(chunk)
+        if self.size > s.max_file_bytes:
+            raise UploadTooLarge(self.name, s.max_file_bytes)
+        if s.total > s.max_total_bytes:
+            raise UploadTooLarge("request", s.max_total_bytes)
+        self.hash.update(chunk)
+        if self.file is None and self.size > s.spool_bytes:
+            self.file = await asyncio.to_thread(self._open, self.chunks)
+            self.chunks = []
+        if self.file is not None:
+            await asyncio.to_thread(self.file.write, chunk)
+        else:
+            self.chunks.append(chunk)
+
+    async def finish(self) -> IngestedUpload:
+        if self.file is not None:
+            await asyncio.to_thread(self.file.close)
+            item = IngestedUpload(self.name, self.hash.hexdigest(), self.size, path=self.file.name)
+        else:
+            item = IngestedUpload(self.name, self.hash.hexdigest(), self.size, data=b"".join(self.chunks))
+        self.session.files.append(item)
+        log.debug("ingested %s: %d bytes sha256=%s (%s)", self.name, self.size, item.sha256,
+                  "disk" if self.file is not None else "memory")
+        return item
+
+    async def discard(self) -> None:
+        if self.file is not None:
+            f, self.file = self.file, None
+            await asyncio.to_thread(_close_and_unlink, f)
+
+
+def _close_and_unlink(f) -> None:
+    f.close()
+    try:
+        os.unlink(f.name)
+    except FileNotFoundError:
+        pass
+
+
+class Form:
+    """A multipart form read by UploadSession.ingest_form: uploads and plain fields by name."""
+
+    def __init__(self):
+        self.uploads: Dict[str, List[IngestedUpload]] = {}
+        self.fields: Dict[str, str] = {}
+
+    def files(self, name: str) -> List[IngestedUpload]:
+        return list(self.uploads.get(name, []))
+
+    def file(self, name: str) -> IngestedUpload:
+        """The single upload `name`; FormError if it was not sent."""
+        found = self.uploads.get(name)
+        if not found:
+            raise FormError(f"missing required file field '{name}'")
+        return found[0]
+
+    def get(self, name: str, default: str = "") -> str:
+        return self.fields.get(name, default)
+
+
+class UploadSession:
+    """
+    Ingests a request's uploads chunk by chunk and deletes every spooled file
+    when the request is done:
+
+        async with UploadSession() as uploads:
+            form = await uploads.ingest_form(request)
+            resume = form.file("resume")
+            ...
+
+    Each chunk is hashed and counted as it is read, so an oversized file is
+    rejected after at most one chunk past its cap. Bodies up to `spool_bytes`
+    stay in memory; larger ones are written to `spool_dir` instead.
+    """
+
+    def __init__(
+        self,
+        max_file_bytes: Optional[int] = None,
+        max_total_bytes: Optional[int] = None,
+        spool_bytes: Optional[int] = None,
+        spool_dir: Optional[str] = None,
+    ):
+        mb = 1024 * 1024
+        self.max_file_bytes = max_file_bytes if max_file_bytes is not None else int(float(os.getenv("UPLOAD_MAX_MB", "10")) * mb)
+        self.max_total_bytes = max_total_bytes if max_total_bytes is not None else int(float(os.getenv("UPLOAD_MAX_TOTAL_MB", "100")) * mb)
+        self.spool_bytes = spool_bytes if spool_bytes is not None else int(float(os.getenv("UPLOAD_SPOOL_MB", "1")) * mb)
+        self.spool_dir = Path(spool_dir or os.getenv("UPLOAD_DIR") or APP_DIR / "_uploads")
+        self.total = 0
+        self.files: List[IngestedUpload] = []
+
+    async def ingest(self, upload) -> IngestedUpload:
+        """Read a starlette/FastAPI UploadFile (anything with async read(n))."""
+        with stage("upload_read"):
+            spool = _Spool(self, upload.filename or "")
+            try:
+                while True:
+                    chunk = await upload.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    await spool.write(chunk)
+            except BaseException:
+                await spool.discard()
+                raise
+            return await spool.finish()
+
+    async def ingest_all(self, uploads) -> List[IngestedUpload]:
+        return [await self.ingest(u) for u in uploads]
+
+    async def ingest_form(self, request) -> Form:
+        """
+        Read a multipart/form-data request straight off request.stream():
+        file parts go through the same caps and spooling as ingest(), so an
+        oversized body is refused at its Content-Length or as soon as the
+        running count passes the cap, and nothing is buffered or copied
+        ahead of this. Must run before anything else reads the request
+        (request.is_disconnected() would swallow body chunks).
+        """
+        with stage("upload_read"):
+            return await self._ingest_form(request)
+
+    async def _ingest_form(self, request) -> Form:
+        ctype, params = parse_options_header(request.headers.get("content-type", ""))
+        if ctype != b"multipart/form-data" or b"boundary" not in params:
+            raise FormError("expected a multipart/form-data body")
+        limit = self.max_total_bytes + FORM_OVERHEAD
+        length = request.headers.get("content-length")
+        if length and length.isdigit() and int(length) > limit:
+            raise UploadTooLarge("request", self.max_total_bytes)
+
+        form = Form()
+        events: List[Tuple[str, object]] = []
+        part: Dict[str, object] = {}
+
+        def on_header_field(data, start, end):
+            part["header"] = part.get("header", b"") + data[start:end]
+
+        def on_header_value(data, start, end):
+            part["value"] = part.get("value", b"") + data[start:end]
+
+        def on_header_end():
+            if part.pop("header", b"").lower() == b"content-disposition":
+                part["disposition"] = part.get("value", b"")
+            part.pop("value", None)
+
+        def on_headers_finished():
+            _, options = parse_options_header(part.pop("disposition", b""))
+            if b"name" not in options:
+                raise FormError("multipart part without a name")
+            name = options[b"name"].decode("utf-8", "replace")
+            filename = options[b"filename"].decode("utf-8", "replace") if b"filename" in options else None
+            events.append(("begin", (name, filename)))
+
+        callbacks = {
+            "on_part_data": lambda data, start, end: events.append(("data", data[start:end])),
+            "on_part_end": lambda: events.append(("end", None)),
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_headers_finished": on_headers_finished,
+        }
+        parser = multipart.MultipartParser(params[b"boundary"], callbacks)
+        name, spool, value = "", None, None
+        received = 0
+        try:
+            async for chunk in request.stream():
+                received += len(chunk)
+                if received > limit:
+                    raise UploadTooLarge("request", self.max_total_bytes)
+                parser.write(chunk)
+                for kind, data in events:
+                    if kind == "begin":
+                        name, filename = data
+                        spool, value = (_Spool(self, filename), None) if filename is not None else (None, [])
+                    elif kind == "data":
+                        if spool is not None:
+                            await spool.write(data)
+                        else:
+                            value.append(data)
+                            if sum(map(len, value)) > MAX_FIELD_BYTES:
+                                raise FormError(f"form field '{name}' is too long")
+                    elif spool is not None:
+                        if spool.name or spool.size:        # browsers send an empty part for "no file chosen"
+                            form.uploads.setdefault(name, []).append(await spool.finish())
+                        spool = None
+                    else:
+                        form.fields[name] = b"".join(value).decode("utf-8", "replace")
+                events.clear()
+            parser.finalize()
+        except BaseException:
+            if spool is not None:
+                await spool.discard()
+            raise
+        return form
+
+    def cleanup(self) -> None:
+        for item in self.files:
+            item.cleanup()
+        self.files.clear()
+
+    async def __aenter__(self) -> "UploadSession":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        if any(item.path is not None for item in self.files):
+            await asyncio.to_thread(self.cleanup)
+        else:
+            self.cleanup()
+
+
+def sweep_spool_dir(spool_dir: Optional[str] = None, max_age: float = 3600.0) -> int:
+    """Delete spooled uploads left behind by a crashed process; returns the count."""
+    root = Path(spool_dir or os.getenv("UPLOAD_DIR") or APP_DIR / "_uploads")
+    if not root.is_dir():
+        return 0
+    cutoff = time.time() - max_age
+    removed = 0
+    for p in root.glob(f"{_SPOOL_PREFIX}*"):
+        try:
+            if p.stat().st_mtime < cutoff:
+                p.unlink()
+                removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
@@ -0,0 +1,267 @@
+# workers.py
+
+import asyncio
+import logging
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache, partial
+from typing import Any, Callable, Dict, Optional
+
+from admission import PRIORITY_CLASSES, PriorityQueue, client_weights, current_client, current_priority
+from metrics import REGISTRY, collect, replay
+
+log = logging.getLogger(__name__)
+
+QUEUE_WAIT = REGISTRY.histogram("match_queue_wait_seconds", "Time a match request waited for a free worker")
+QUEUE_DEPTH = REGISTRY.gauge("match_queue_depth", "Match requests waiting for a free worker")
+IN_FLIGHT = REGISTRY.gauge("match_in_flight", "Match requests currently running on a worker")
+REJECTED = REGISTRY.counter("match_rejected_total", "Match requests rejected with 503 because the queue was full")
+ACTIVE_CLIENTS = REGISTRY.gauge("match_queue_clients", "Clients with match requests waiting for a worker")
+CLASS_QUEUE_WAIT = REGISTRY.histogram("match_class_queue_wait_seconds", "Time waited for a worker, by priority class", ["priority"])
+CLASS_LATENCY = REGISTRY.histogram("match_class_latency_seconds", "Queue wait plus run time of a pool job, by priority class", ["priority"])
+CLASS_QUEUE_DEPTH = REGISTRY.gauge("match_class_queue_depth", "Match requests waiting for a worker, by priority class", ["priority"])
+
+
+class PoolSaturated(Exception):
+    """Raised instead of queueing when the match queue is already full."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Matching queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+def _preload_models() -> None:
+    """Worker initializer: size thread pools, then load SBERT, spaCy, SkillNer and the default JDs."""
+    from cpu_layout import configure
+    configure()
+    try:
+        import matcher
+        matcher.warmup()
+    except Exception:
+        # keep the worker alive; the models will be retried on first use
+        log.exception("model preload failed in worker %s", os.getpid())
+
+
+def preload_for_fork() -> None:
+    """
+    Load every model and the memory-mapped default JD store in this process,
+    meant to run in the gunicorn master before it forks its workers. The
+    weight buffers are then shared copy-on-write; gc.freeze() keeps the
+    collector from touching (and so copying) the pages of the preloaded
+    Python objects. No inference runs here: OpenMP/torch thread pools must
+    not be started before a fork, so each worker warms up after forking.
+    """
+    import gc
+    import extractors, matcher
+    from jd_cache import default_jd_cache
+
+    matcher._lazy_models()          # spaCy and the one SBERT that jd_cache shares
+    extractors._lazy_skill_extractor()
+    default_jd_cache()
+    gc.collect()
+    gc.freeze()
+    log.info("preloaded models and JD store in pid %s for fork sharing", os.getpid())
+
+
+class MatchPool:
+    """
+    Bounded pool for CPU-bound matching.
+
+    At most `workers` jobs run at once; up to `max_queue` more wait here, in
+    the event loop, for a free worker (so the executor's own queue stays
+    empty and ordering is decided on our side). Anything beyond that is
+    rejected with PoolSaturated instead of piling up. Waiters are served by
+    weighted fair queuing over admission.current_client, and no client may
+    hold more than `max_queue_per_client` of the queue.
+
+    Work runs in the admission.current_priority class: interactive waiters go
+    ahead of batch ones (with aging, see PriorityQueue), and batch jobs never
+    hold more than `batch_max_running` workers, so an interactive call always
+    has a worker to start on as soon as the one it waits for frees up. With a
+    single worker that cap is 0: batch only borrows the worker while the pool
+    is idle and no interactive call is waiting.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        max_queue: int,
+        kind: str = "process",
+        start_method: str = "spawn",
+        max_queue_per_client: Optional[int] = None,
+        weights: Optional[Dict[str, float]] = None,
+        batch_max_running: Optional[int] = None,
+        aging_seconds: float = 10.0,
+    ):
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self.max_queue_per_client = self.max_queue if max_queue_per_client is None else max_queue_per_client
+        self.kind = kind
+        self.start_method = start_method
+        self.batch_max_running = self.workers - 1 if batch_max_running is None else max(0, batch_max_running)
+        self.running = 0
+        self.running_by_class: Dict[str, int] = {c: 0 for c in PRIORITY_CLASSES}
+        self._waiters = PriorityQueue(weights, aging_seconds)
+        self._executor: Optional[Executor] = None
+        self._service_ewma = 1.0   # seconds per job, for Retry-After
+
+    # ---------- executor ----------
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "thread":
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="match")
+            else:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(self.start_method),
+                    initializer=_preload_models,
+                )
+        return self._executor
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def warm(self, fn: Callable[[], Any]) -> None:
+        """
+        Run `fn` once per worker, outside the admission queue, so every worker
+        process is started and has its models loaded before traffic arrives.
+        """
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        await asyncio.gather(*(loop.run_in_executor(executor, fn) for _ in range(self.workers)))
+
+    # ---------- slots ----------
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def _retry_after(self) -> int:
+        return max(1, math.ceil(self._service_ewma * (self.queued + 1) / self.workers))
+
+    def _update_gauges(self) -> None:
+        QUEUE_DEPTH.set(self.queued)
+        IN_FLIGHT.set(self.running)
+        ACTIVE_CLIENTS.set(self._waiters.clients)
+        for cls in PRIORITY_CLASSES:
+            CLASS_QUEUE_DEPTH.set(self._waiters.depth(cls), priority=cls)
+
+    def _startable(self) -> list:
+        if self.running >= self.workers:
+            return []
+        return [c for c in PRIORITY_CLASSES if c != "batch" or self._batch_may_start()]
+
+    def _batch_may_start(self) -> bool:
+        if self.running_by_class["batch"] < self.batch_max_running:
+            return True
+        # over the cap batch may still borrow a worker nobody else wants
+        return self.running == 0 and self._waiters.depth("interactive") == 0
+
+    def _dispatch(self) -> None:
+        """Hand free workers to waiters, in priority/fair order."""
+        while self._waiters:
+            allowed = self._startable()
+            item = self._waiters.pop(allowed) if allowed else None
+            if item is None:
+                break
+            fut, cls = item
+            if fut.done():
+                continue
+            self.running += 1
+            self.running_by_class[cls] += 1
+            fut.set_result(None)
+        self._update_gauges()
+
+    async def _acquire(self, cls: str) -> None:
+        client = current_client.get()
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.push(client, fut, cls)
+        self._dispatch()
+        if fut.done():
+            return
+        if self.queued > self.max_queue or self._waiters.count(client) > self.max_queue_per_client:
+            self._waiters.remove(fut)
+            self._update_gauges()
+            REJECTED.inc()
+            raise PoolSaturated(self._retry_after())
+        try:
+            await fut                       # _dispatch() grants the slot
+        except asyncio.CancelledError:
+            if fut in self._waiters:
+                self._waiters.remove(fut)
+                self._update_gauges()
+            elif fut.done() and not fut.cancelled():
+                self._release(cls)          # slot was granted as we were cancelled
+            raise
+
+    def _release(self, cls: str) -> None:
+        self.running -= 1
+        self.running_by_class[cls] -= 1
+        self._dispatch()
+
+    # ---------- public API ----------
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Run fn(*args, **kwargs) on a worker; raises PoolSaturated when full.
+        A cancelled caller stops waiting, but the slot stays taken until the
+        job itself finishes, so admission always reflects the busy workers.
+        """
+        cls = current_priority.get()
+        cls = cls if cls in self.running_by_class else PRIORITY_CLASSES[0]
+        t0 = time.perf_counter()
+        await self._acquire(cls)
+        waited = time.perf_counter() - t0
+        QUEUE_WAIT.observe(waited)
+        CLASS_QUEUE_WAIT.observe(waited, priority=cls)
+        t1 = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        try:
+            # stage timings come back with the result (workers may be other processes)
+            fut = loop.run_in_executor(self._get_executor(), partial(collect, fn, *args, **kwargs))
+        except BaseException:
+            self._release(cls)
+            raise
+
+        def finished(f: asyncio.Future) -> None:
+            # the worker is busy until the job ends, even if its caller left
+            if not f.cancelled():
+                f.exception()       # retrieved: the caller may be gone
+            self._release(cls)
+        fut.add_done_callback(finished)
+        result, report = await asyncio.shield(fut)
+        self._service_ewma = 0.8 * self._service_ewma + 0.2 * (time.perf_counter() - t1)
+        replay(report)
+        CLASS_LATENCY.observe(time.perf_counter() - t0, priority=cls)
+        return result
+
+
+@lru_cache(maxsize=1)
+def get_pool() -> MatchPool:
+    """
+    Process-wide pool configured from the environment:
+      MATCH_WORKERS        worker count (default min(4, cpu count))
+      MATCH_QUEUE_LIMIT    requests allowed to wait for a worker (default 32)
+      MATCH_EXECUTOR       "process" (default) or "thread"
+      MATCH_START_METHOD   multiprocessing start method (default "spawn")
+      MATCH_CLIENT_QUEUE_LIMIT  queue slots one client may hold (default 8)
+      CLIENT_WEIGHTS       fair-queuing weights, see admission.client_weights
+      MATCH_BATCH_MAX_RUNNING   workers batch work may occupy (default workers - 1)
+      MATCH_PRIORITY_AGING_SECONDS  wait that lifts a batch job one class (default 10)
+    """
+    return MatchPool(
+        workers=int(os.getenv("MATCH_WORKERS", str(min(4, os.cpu_count() or 1)))),
+        max_queue=int(os.getenv("MATCH_QUEUE_LIMIT", "32")),
+        kind=os.getenv("MATCH_EXECUTOR", "process"),
+        start_method=os.getenv("MATCH_START_METHOD", "spawn"),
+        max_queue_per_client=int(os.getenv("MATCH_CLIENT_QUEUE_LIMIT", "8")),
+        weights=client_weights(),
+        batch_max_running=int(os.environ["MATCH_BATCH_MAX_RUNNING"]) if os.getenv("MATCH_BATCH_MAX_RUNNING") else None,
+        aging_seconds=float(os.getenv("MATCH_PRIORITY_AGING_SECONDS", "10")),
+    )